@@ -1,29 +1,89 @@
+import atexit
 import logging
 import errno
-import fnmatch
 from typing import List
 
-from pyapitester.helpers import AppLogger, Environment
+from pyapitester.collection import Collection
+from pyapitester.helpers import AppCache, AppLogger, Environment, StartupTimer
 from pyapitester.httprequest import HttpRequest
-from pyapitester.runner import Runner
+from pyapitester.httpresponse import HttpResponse
+from pyapitester.reporters import Reporters
+from pyapitester.timings import TimingsExport
+from pyapitester.transport import DnsCache, Transport
 import argparse
 import os
+import sys
 
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("command", choices=['run', 'check'], help="Command to execute")
-    parser.add_argument("path", help="Could be a folder or a single file")
+    parser.add_argument("command", choices=['run', 'check', 'load', 'merge', 'watch'], help="Command to execute")
+    parser.add_argument("path", help="Could be a folder or a single file. " +
+                                     "Merge: a results file or a folder with results files (*.json)")
     parser.add_argument("--environment", "-e", help="Path to the environment configuration file (*.env)")
     parser.add_argument("--verbose", "-v", action='store_true', help="Enable verbose mode")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="Number of folders to run in parallel, default is 1")
+    parser.add_argument("--pool-size", type=int, default=10,
+                        help="Maximum number of kept-alive connections per host, default is 10")
+    parser.add_argument("--transport", choices=Transport.NAMES, default=Transport.NAMES[0],
+                        help="HTTP implementation: requests, or the lean http.client based one, default is requests")
+    parser.add_argument("--warmup", action='store_true',
+                        help="Resolve host names and open connections to all hosts before sending any request")
+    parser.add_argument("--dns-ttl", type=float, default=DnsCache.Ttl,
+                        help=f"Keep resolved host names for this time, seconds, default is {DnsCache.Ttl:g}. " +
+                             "Zero disables the cache")
+    parser.add_argument("--record", metavar="FILE",
+                        help="Run: send the requests and write all responses to the cassette file")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="Serve the responses from the cassette file instead of sending the requests")
+    parser.add_argument("--match-body", action='store_true',
+                        help="Replay: match the request body as well as the method and the URL")
+    parser.add_argument("--cache-dir", default=AppCache.default_dir(),
+                        help=f"Folder for the on-disk caches, default is {AppCache.default_dir()}")
+    parser.add_argument("--no-cache", action='store_true', help="Disable the on-disk caches")
+    parser.add_argument("--parse-once", action='store_true',
+                        help="Parse every request file once and substitute variables into the parsed data")
+    parser.add_argument("--json-decoder", choices=['auto', 'json'] + HttpResponse.JSON_LIBRARIES, default='auto',
+                        help="JSON library for the responses, default is the fastest installed one")
+    parser.add_argument("--no-scripts", action='store_true', help="Don't execute pre- and post-request scripts")
+    parser.add_argument("--script-workers", type=int, default=0,
+                        help="Execute post-request scripts, that don't change variables, on N threads, " +
+                             "while the next requests are sent. Default is 0, scripts are executed in place")
+    parser.add_argument("--include", action='append',
+                        help="Run only requests matching the glob pattern, relative to the folder. Can be repeated")
+    parser.add_argument("--exclude", action='append',
+                        help="Skip requests and folders matching the glob pattern, relative to the folder. " +
+                             "Can be repeated")
+    parser.add_argument("--tag", action='append',
+                        help="Run only requests with the tag, see [request] tags. Can be repeated")
+    parser.add_argument("--reporter", action='append', metavar="NAME[:FILE]",
+                        help="Report format: console, " + ", ".join(f'{name}:FILE' for name in Reporters.REPORTERS) +
+                             ". Can be repeated, default is console")
+    parser.add_argument("--shard", metavar="K/N",
+                        help="Run only the K-th of N parts of the collection, folders are never split")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Run the collection in N processes, one shard per process, default is 1")
+    parser.add_argument("--timings-export", help="Write the phase timeline of every request to a CSV file")
+    parser.add_argument("--timing-startup", action='store_true', help="Report the startup time of every phase")
+    parser.add_argument("--iterations", "-n", type=int, help="Load: number of iterations")
+    parser.add_argument("--duration", "-d", type=float, help="Load: test duration, seconds")
+    parser.add_argument("--concurrency", "-c", type=int, default=1,
+                        help="Load: number of iterations running at the same time, default is 1")
     args = parser.parse_args()
 
+    StartupTimer.Enabled = args.timing_startup
+    StartupTimer.mark("Imports and arguments")
+
     if args.verbose:
         log_level = logging.DEBUG
     else:
         log_level = logging.INFO
 
     AppLogger.init_logger(level=log_level)
+    # The console output is written on a background thread, it is flushed at exit
+    AppLogger.start_output_thread()
+    atexit.register(AppLogger.stop_output_thread)
 
     if not os.path.exists(args.path):
         logging.error(f'No such file or directory: "{args.path}"')
@@ -37,42 +97,189 @@ if __name__ == '__main__':
         logging.error(f'Environment file should have *.env extension')
         exit(errno.ENOENT)
 
-    env = Environment(args.environment)
+    if args.jobs < 1:
+        logging.error(f'Number of jobs should be at least 1, found {args.jobs}')
+        exit(errno.EINVAL)
+
+    if args.script_workers < 0:
+        logging.error(f'Number of script workers should not be negative, found {args.script_workers}')
+        exit(errno.EINVAL)
+
+    if args.pool_size < 1:
+        logging.error(f'Pool size should be at least 1, found {args.pool_size}')
+        exit(errno.EINVAL)
+
+    shard_index, shard_count = 0, 1
+    if args.shard is not None:
+        from pyapitester.shards import Shards
+        try:
+            shard_index, shard_count = Shards.parse(args.shard)
+        except ValueError as ex:
+            logging.error(f'Invalid shard: {ex}')
+            exit(errno.EINVAL)
+
+    if args.dns_ttl < 0:
+        logging.error(f'DNS cache TTL should not be negative, found {args.dns_ttl}')
+        exit(errno.EINVAL)
+    DnsCache.Ttl = args.dns_ttl
+
+    if args.record is not None and args.replay is not None:
+        logging.error('--record and --replay can\'t be used together')
+        exit(errno.EINVAL)
+
+    if args.record is not None and (args.command != 'run' or args.processes > 1):
+        logging.error('--record is supported only by the run command in one process')
+        exit(errno.EINVAL)
+
+    if args.replay is not None:
+        if not os.path.isfile(args.replay):
+            logging.error(f'Cassette not found: "{args.replay}"')
+            exit(errno.ENOENT)
+        from pyapitester.cassette import Cassette
+        try:
+            Cassette.check(args.replay)
+        except (OSError, ValueError) as ex:
+            logging.error(f'Invalid cassette "{args.replay}": {ex}')
+            exit(errno.EINVAL)
+
+    if args.processes < 1:
+        logging.error(f'Number of processes should be at least 1, found {args.processes}')
+        exit(errno.EINVAL)
+
+    if (args.shard is not None or args.processes > 1) and args.command != 'run':
+        logging.error('--shard and --processes are supported only by the run command')
+        exit(errno.EINVAL)
+
+    if args.shard is not None and args.processes > 1:
+        logging.error('--shard and --processes can\'t be used together')
+        exit(errno.EINVAL)
+
+    if args.command == 'load':
+        if args.iterations is None and args.duration is None:
+            logging.error('Either --iterations or --duration should be set')
+            exit(errno.EINVAL)
+        if args.concurrency < 1:
+            logging.error(f'Concurrency should be at least 1, found {args.concurrency}')
+            exit(errno.EINVAL)
+
+    reporters = args.reporter or ['console']
+    for reporter in reporters:
+        name, _, filename = reporter.partition(':')
+        if name != 'console' and (name not in Reporters.REPORTERS or not filename):
+            logging.error(f'Unknown reporter "{reporter}", expected console, ' +
+                          ", ".join(f'{name}:FILE' for name in Reporters.REPORTERS))
+            exit(errno.EINVAL)
+
+    for reporter in reporters:
+        name, _, filename = reporter.partition(':')
+        if name != 'console':
+            Reporters.add(Reporters.REPORTERS[name](filename))
+    if 'console' not in reporters:
+        # Only errors are printed
+        AppLogger.set_console_level(logging.ERROR)
+    atexit.register(Reporters.close)
+
+    if args.command == 'merge':
+        from pyapitester.shards import Shards
+        if os.path.isdir(args.path):
+            results = sorted(os.path.join(args.path, name) for name in os.listdir(args.path)
+                             if name.endswith('.json'))
+        else:
+            results = [args.path]
+        try:
+            Shards.merge(results)
+        except (ValueError, KeyError) as ex:
+            logging.error(f'Can\'t merge the results: {ex}')
+            exit(errno.EINVAL)
+        exit(0)
+
+    if args.processes > 1:
+        from pyapitester.shards import Shards
+        # Every process reports its results to the parent, which prints and reports the merged results
+        argv = Shards.child_arguments(sys.argv[1:], ["--processes", "--shard", "--reporter", "--timings-export"])
+        if not Shards.run_processes(args.processes, argv, args.timings_export):
+            exit(errno.ECHILD)
+        exit(0)
+
+    if not args.no_cache:
+        AppCache.Dir = args.cache_dir
+
+    if not HttpResponse.use_json_library(args.json_decoder):
+        logging.error(f'JSON library "{args.json_decoder}" is not installed')
+        exit(errno.EINVAL)
+
+    # Folder env.toml files are layered over the environment, see docs/environment.md
+    env = Environment(args.environment, root=args.path if os.path.isdir(args.path) else os.path.dirname(args.path))
+    StartupTimer.mark("Environment")
 
     # Check if the path is a file or a directory
     file_list: List[str] = []
-    folder_list: List[str] = []
     if os.path.isfile(args.path):
         if not args.path.endswith(".toml"):
             logging.error(f'Expected *.toml, found "{args.path}"')
             exit(errno.EINVAL)
         file_list.append(args.path)
-        folder_list.append(os.path.dirname(args.path))
     else:
-        for root, dirnames, filenames in os.walk(args.path):
-            for filename in fnmatch.filter(filenames, '*.toml'):
-                if os.path.basename(filename) != "env.toml":
-                    # Add the file to the list
-                    full_name = os.path.join(root, filename)
-                    file_list.append(full_name)
-                    # Add the folder to the list if necessary
-                    if root not in folder_list:
-                        folder_list.append(root)
+        # All files and subfolders in the alphabetic order
+        file_list = Collection(args.path).requests(include=args.include, exclude=args.exclude, tags=args.tag)
 
     if len(file_list) == 0:
         logging.error('No requests found')
         exit(errno.ENOENT)
+    StartupTimer.mark("Discovery")
 
-    # Order ALL files and subfolders in the alphabetic order
-    file_list.sort()
+    timings_export = TimingsExport(args.timings_export) if args.timings_export else None
 
     if args.command == 'run':
+        # Heavy modules, e.g. requests, are imported only if something should be sent
+        from pyapitester.runner import Runner
         # Add all requests to the runner
-        runner = Runner(env)
-        for filename in file_list:
-            runner.add_request(HttpRequest(filename))
+        runner = Runner(env, jobs=args.jobs, pool_size=args.pool_size, scripts=not args.no_scripts,
+                        timings_export=timings_export, transport=args.transport,
+                        script_workers=args.script_workers,
+                        record=args.record, replay=args.replay, match_body=args.match_body)
+        StartupTimer.mark("Runner")
+        request_list = [HttpRequest(filename, parse_once=args.parse_once) for filename in file_list]
+        if args.shard is not None:
+            request_list = Shards.partition(request_list, shard_count)[shard_index]
+        for req in request_list:
+            runner.add_request(req)
+        StartupTimer.mark("Request files")
+        if args.warmup:
+            runner.warmup(connections=args.jobs)
+            StartupTimer.mark("Warm-up")
         # Run all requests
         runner.run()
+        StartupTimer.log_report()
+
+    if args.command == 'watch':
+        from pyapitester.runner import Runner
+        from pyapitester.watcher import Watcher
+        runner = Runner(env, jobs=args.jobs, pool_size=args.pool_size, scripts=not args.no_scripts,
+                        timings_export=timings_export, transport=args.transport,
+                        script_workers=args.script_workers,
+                        record=args.record, replay=args.replay, match_body=args.match_body)
+        Watcher(runner, args.path, args.environment, root=env.Root, include=args.include, exclude=args.exclude,
+                tags=args.tag, parse_once=args.parse_once).watch()
+
+    if args.command == 'load':
+        from pyapitester.loadgen import LoadGenerator
+        from pyapitester.runner import Runner
+        # Connections are never shared between workers, the pool should fit all of them.
+        # Every worker runs one request at a time, the same as a job of the 'run' command
+        runner = Runner(env, jobs=args.concurrency, pool_size=max(args.pool_size, args.concurrency),
+                        scripts=not args.no_scripts, timings_export=timings_export, transport=args.transport,
+                        replay=args.replay, match_body=args.match_body)
+        for filename in file_list:
+            runner.add_request(HttpRequest(filename, parse_once=args.parse_once))
+        if args.warmup:
+            runner.warmup(connections=args.concurrency)
+        LoadGenerator(runner, concurrency=args.concurrency,
+                      iterations=args.iterations, duration=args.duration).run()
+        StartupTimer.log_report()
+
+    if timings_export is not None:
+        timings_export.close()
 
     if args.command == 'check':
         # TODO: Implement requests validation
@@ -0,0 +1,368 @@
+import hashlib
+import json
+import mmap
+import struct
+import threading
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pyapitester.transport import (ConnectTimeout, InvalidSchema, InvalidURL, MissingSchema, ReadTimeout,
+                                   TooManyRedirects, Transport, TransportConnectionError, TransportResponse,
+                                   TransportSession)
+
+
+class CassetteMiss(LookupError):
+    """
+    The cassette has no response for the request, it is the result of the request in the replay mode
+    """
+
+
+class Cassette(object):
+    """
+    Recorded responses, see --record and --replay
+
+    The file starts with MAGIC, followed by the bodies of all responses as they were received,
+    then by the JSON index and the trailer: offset and size of the index, little-endian, and TRAILER.
+    Every index entry has the method, the URL, the SHA-256 of the request body, the request file, the status,
+    the headers, the elapsed time, and the offset and size of the body. A failed request has the exception name
+    instead.
+    The bodies are never parsed, they are memory-mapped on replay.
+    """
+
+    MAGIC: bytes = b"PYAPITESTER-CASSETTE\n"
+    """The first bytes of every cassette file"""
+
+    TRAILER: bytes = b"CASSIDX1"
+    """The last bytes of every complete cassette file"""
+
+    VERSION: int = 1
+    """Version of the index format"""
+
+    __TRAILER_FORMAT: str = "<QQ8s"
+
+    @staticmethod
+    def body_hash(data: Any) -> Optional[str]:
+        """
+        Get the SHA-256 of the request body, see --match-body
+
+        :param data: Request body, as passed to TransportSession.request()
+        :return: Hex digest, None if the body is streamed, e.g. a multipart or a chunked one
+        """
+        if data is None:
+            data = b""
+        elif isinstance(data, str):
+            data = data.encode()
+        if not isinstance(data, (bytes, bytearray)):
+            return None
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def key(method: str, url: str) -> str:
+        return f'{method} {url}'
+
+    @staticmethod
+    def write_index(f: Any, entries: List[Dict[str, Any]]):
+        """
+        Append the index and the trailer to the file, positioned after the last body
+        """
+        offset = f.tell()
+        index = json.dumps({"version": Cassette.VERSION, "entries": entries}, separators=(",", ":")).encode()
+        f.write(index)
+        f.write(struct.pack(Cassette.__TRAILER_FORMAT, offset, len(index), Cassette.TRAILER))
+
+    @staticmethod
+    def check(filename: str):
+        """
+        Check the header and the trailer, without reading the index
+
+        :raises OSError: If the file can't be read
+        :raises ValueError: If this is not a complete cassette file
+        """
+        size = struct.calcsize(Cassette.__TRAILER_FORMAT)
+        with open(filename, "rb") as f:
+            header = f.read(len(Cassette.MAGIC))
+            if header != Cassette.MAGIC or f.seek(0, 2) < len(Cassette.MAGIC) + size:
+                raise ValueError("not a cassette file")
+            position = f.seek(-size, 2)
+            Cassette.__trailer(f.read(size), position)
+
+    @staticmethod
+    def __trailer(data: bytes, position: int) -> Tuple[int, int]:
+        """
+        :param position: Offset of the trailer in the file
+        :return: Offset and size of the index
+        """
+        offset, length, trailer = struct.unpack(Cassette.__TRAILER_FORMAT, data)
+        if trailer != Cassette.TRAILER or offset + length > position:
+            raise ValueError("the cassette is incomplete, the recording was interrupted")
+        return offset, length
+
+    @staticmethod
+    def read_index(data: Any) -> List[Dict[str, Any]]:
+        """
+        :param data: Whole cassette, e.g. memory-mapped
+        :raises ValueError: If this is not a complete cassette file
+        """
+        size = struct.calcsize(Cassette.__TRAILER_FORMAT)
+        if len(data) < len(Cassette.MAGIC) + size or data[:len(Cassette.MAGIC)] != Cassette.MAGIC:
+            raise ValueError("not a cassette file")
+        offset, length = Cassette.__trailer(data[len(data) - size:], len(data) - size)
+        index = json.loads(bytes(data[offset:offset + length]))
+        if index.get("version") != Cassette.VERSION:
+            raise ValueError(f'unsupported cassette version {index.get("version")}')
+        return index["entries"]
+
+
+class ReplayResponse(TransportResponse):
+    """
+    Recorded response, the body is a slice of the memory-mapped cassette
+    """
+
+    __body: memoryview
+    __decoded: bool
+    """The body was received with iter_content(), i.e. it is already decompressed"""
+
+    def __init__(self, entry: Dict[str, Any], body: memoryview):
+        self.Status = entry["status"]
+        self.Headers = [(name, value) for name, value in entry["headers"]]
+        self.Elapsed = entry["elapsed"]
+        self.__body = body
+        self.__decoded = entry["decoded"]
+
+    def read(self) -> bytes:
+        return bytes(self.__body)
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        encoding = next((value.lower() for name, value in self.Headers if name.lower() == "content-encoding"), "")
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS if encoding == "gzip" else zlib.MAX_WBITS) \
+            if encoding in ("gzip", "deflate") and not self.__decoded else None
+        for start in range(0, len(self.__body), chunk_size):
+            chunk = bytes(self.__body[start:start + chunk_size])
+            yield decoder.decompress(chunk) if decoder is not None else chunk
+        if decoder is not None:
+            yield decoder.flush()
+
+    def close(self):
+        pass
+
+
+class ReplaySession(TransportSession):
+    __transport: 'ReplayTransport'
+
+    def __init__(self, transport: 'ReplayTransport'):
+        self.__transport = transport
+
+    def request(self, method: str, url: str, headers: Any, auth: Any, data: Any,
+                timeout: Optional[float]) -> TransportResponse:
+        return self.__transport.replay(method, url, data, self.Origin)
+
+    def close(self):
+        pass
+
+
+class ReplayTransport(Transport):
+    """
+    Serves the responses from the cassette, nothing is sent, see --replay
+
+    Responses recorded for the same request file are preferred, so that parallel requests to the same URL
+    get their own responses. Responses of the same request are served in the recorded order,
+    the last one is repeated.
+    Recorded failures are raised as exceptions with the same name.
+    """
+
+    EXCEPTIONS: Dict[str, type] = {"ConnectionError": TransportConnectionError, "ConnectTimeout": ConnectTimeout,
+                                   "ReadTimeout": ReadTimeout, "TooManyRedirects": TooManyRedirects,
+                                   "MissingSchema": MissingSchema, "InvalidSchema": InvalidSchema,
+                                   "InvalidURL": InvalidURL}
+    """Transport exceptions by the recorded name, see Transport.exception_name. Others are created on the fly"""
+
+    MatchBody: bool
+    """Match the SHA-256 of the request body as well, see --match-body"""
+
+    __file: Any
+    __data: mmap.mmap
+    __entries: Dict[str, List[Dict[str, Any]]]
+    """Recorded responses by method and URL, in the recorded order"""
+    __served: Dict[Tuple[str, Optional[str], Optional[str]], int]
+    """Number of served responses by key, body hash and request file"""
+    __lock: threading.Lock
+
+    def __init__(self, filename: str, match_body: bool = False):
+        """
+        :raises OSError: If the file can't be read
+        :raises ValueError: If the file is not a complete cassette
+        """
+        super().__init__()
+        self.MatchBody = match_body
+        self.__file = open(filename, "rb")
+        try:
+            self.__data = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+            entries = Cassette.read_index(self.__data)
+        except (OSError, ValueError, KeyError):
+            self.close()
+            raise
+        self.__entries = {}
+        for entry in entries:
+            self.__entries.setdefault(Cassette.key(entry["method"], entry["url"]), []).append(entry)
+        self.__served = {}
+        self.__lock = threading.Lock()
+
+    def session(self) -> ReplaySession:
+        return ReplaySession(self)
+
+    def replay(self, method: str, url: str, data: Any, origin: Optional[str] = None) -> ReplayResponse:
+        """
+        Get the recorded response
+
+        :param origin: Request file, see TransportSession.Origin
+
+        :raises CassetteMiss: If there is no recorded response
+        :raises Exception: The recorded exception of a failed request
+        """
+        key = Cassette.key(method, url)
+        entries = self.__entries.get(key, [])
+        body_hash = None
+        if self.MatchBody:
+            # Streamed bodies are never hashed, they match the recorded streamed bodies in order
+            body_hash = Cassette.body_hash(data)
+            entries = [entry for entry in entries if entry["body_sha256"] == body_hash]
+        if not entries:
+            raise CassetteMiss(f'No recorded response for {key}' + (f', body {body_hash}' if body_hash else ''))
+        own = [entry for entry in entries if entry.get("origin") == origin]
+        if own:
+            entries = own
+
+        with self.__lock:
+            served = self.__served.get((key, body_hash, origin), 0)
+            self.__served[(key, body_hash, origin)] = served + 1
+        entry = entries[min(served, len(entries) - 1)]
+
+        if entry.get("exception") is not None:
+            name = entry["exception"]
+            raise self.EXCEPTIONS.get(name, type(name, (Exception,), {}))(entry.get("details", ""))
+        body = memoryview(self.__data)[entry["offset"]:entry["offset"] + entry["length"]]
+        return ReplayResponse(entry, body)
+
+    def warmup(self, url: str, connections: int = 1, timeout: Optional[float] = None) -> int:
+        return 0
+
+    def close(self):
+        # Bodies may still be referenced by the responses, the mapping is released with them
+        self.__file.close()
+
+
+class RecordingResponse(TransportResponse):
+    """
+    Response of the real transport, the body is recorded once it is received completely
+    """
+
+    __response: TransportResponse
+    __record: Any
+
+    def __init__(self, response: TransportResponse, record: Any):
+        """
+        :param record: Called with the response, the body and the decoded flag, see ReplayResponse
+        """
+        self.__response = response
+        self.__record = record
+        self.Status = response.Status
+        self.Headers = response.Headers
+        self.Elapsed = response.Elapsed
+
+    def read(self) -> bytes:
+        data = self.__response.read()
+        self.__record(self, data, False)
+        return data
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        # The whole body is kept until it is written to the cassette
+        chunks = []
+        for chunk in self.__response.iter_content(chunk_size):
+            chunks.append(chunk)
+            yield chunk
+        self.__record(self, b"".join(chunks), True)
+
+    def close(self):
+        self.__response.close()
+
+
+class RecordingSession(TransportSession):
+    __transport: 'RecordingTransport'
+    __session: TransportSession
+
+    def __init__(self, transport: 'RecordingTransport', session: TransportSession):
+        self.__transport = transport
+        self.__session = session
+
+    def request(self, method: str, url: str, headers: Any, auth: Any, data: Any,
+                timeout: Optional[float]) -> TransportResponse:
+        entry: Dict[str, Any] = {"method": method, "url": url, "body_sha256": Cassette.body_hash(data),
+                                 "origin": self.Origin}
+        self.__session.MaxRedirects = self.MaxRedirects
+        try:
+            response = self.__session.request(method, url, headers=headers, auth=auth, data=data, timeout=timeout)
+        except Exception as ex:
+            self.__transport.record({**entry, "exception": Transport.exception_name(ex), "details": str(ex)})
+            raise
+
+        def record(res: TransportResponse, body: bytes, decoded: bool):
+            self.__transport.record({**entry, "status": res.Status, "headers": res.Headers, "elapsed": res.Elapsed,
+                                     "decoded": decoded}, body)
+
+        return RecordingResponse(response, record)
+
+    def close(self):
+        self.__session.close()
+
+
+class RecordingTransport(Transport):
+    """
+    Sends the requests with the real transport and writes the responses to the cassette, see --record
+
+    Responses are written once their body is received. Responses closed before that, e.g. the slower
+    one of hedged requests, are not recorded. The index is written when the transport is closed.
+    """
+
+    __transport: Transport
+    __file: Any
+    __entries: List[Dict[str, Any]]
+    __lock: threading.Lock
+
+    def __init__(self, transport: Transport, filename: str):
+        """
+        :param transport: Real transport
+        :raises OSError: If the file can't be written
+        """
+        super().__init__(transport.PoolSize)
+        self.__transport = transport
+        self.__file = open(filename, "wb")
+        self.__file.write(Cassette.MAGIC)
+        self.__entries = []
+        self.__lock = threading.Lock()
+
+    def session(self) -> RecordingSession:
+        return RecordingSession(self, self.__transport.session())
+
+    def record(self, entry: Dict[str, Any], body: bytes = b""):
+        """
+        Append the response to the cassette
+
+        :param entry: Index entry without the body offset and length
+        """
+        with self.__lock:
+            if self.__file.closed:
+                return
+            entry["offset"] = self.__file.tell()
+            entry["length"] = len(body)
+            self.__file.write(body)
+            self.__entries.append(entry)
+
+    def warmup(self, url: str, connections: int = 1, timeout: Optional[float] = None) -> int:
+        return self.__transport.warmup(url, connections, timeout)
+
+    def close(self):
+        self.__transport.close()
+        with self.__lock:
+            if not self.__file.closed:
+                Cassette.write_index(self.__file, self.__entries)
+                self.__file.close()
@@ -0,0 +1,217 @@
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from pyapitester.helpers import AppCache, AppLogger
+from pyapitester.httprequest import HttpRequest
+from pyapitester.template import Template
+
+
+class Collection:
+    """
+    Finds all request files in the collection folder
+
+    The folder tree is kept in an index, stored in the on-disk cache.
+    A folder is listed again only if its modification time has changed,
+    all other folders are taken from the index.
+    """
+
+    INDEX_VERSION: int = 1
+
+    RACY_INTERVAL_NS: int = 2 * 1000 * 1000 * 1000
+    """Folders modified so recently are not trusted, they might change within the same mtime tick"""
+
+    Root: str
+    """Collection folder, as given by the user"""
+
+    __index_file: Optional[str]
+    __dirs: Dict[str, Dict[str, Any]]
+    """Relative folder path and its content: modification time, request files and subfolders"""
+    __tags: Dict[str, Dict[str, Any]]
+    """Relative request path and its tags, with the file modification time and size"""
+    __order: Optional[List[str]]
+    """All relative request paths in the execution order"""
+    __modified: bool
+
+    def __init__(self, root: str):
+        self.Root = root
+        self.__dirs = {}
+        self.__tags = {}
+        self.__order = None
+        self.__modified = False
+
+        folder = AppCache.path("index")
+        if folder is None:
+            self.__index_file = None
+        else:
+            digest = hashlib.sha256(os.path.abspath(root).encode()).hexdigest()
+            self.__index_file = os.path.join(folder, f'{digest}.json')
+        self.__load_index()
+
+    def __load_index(self):
+        if self.__index_file is None or not os.path.isfile(self.__index_file):
+            return
+        try:
+            with open(self.__index_file, "r") as f:
+                index = json.load(f)
+            if index.get("version") != self.INDEX_VERSION:
+                return
+            self.__dirs = index["dirs"]
+            self.__tags = index["tags"]
+            self.__order = index["order"]
+        except (OSError, ValueError, KeyError) as ex:
+            AppLogger.log(f'Ignoring the collection index "{self.__index_file}": {ex}', logging.DEBUG)
+
+    def __save_index(self):
+        if self.__index_file is None or not self.__modified:
+            return
+        temp_file = f'{self.__index_file}.{os.getpid()}.tmp'
+        try:
+            with open(temp_file, "w") as f:
+                json.dump({
+                    "version": self.INDEX_VERSION,
+                    "dirs": self.__dirs,
+                    "tags": self.__tags,
+                    "order": self.__order
+                }, f)
+            os.replace(temp_file, self.__index_file)
+        except OSError as ex:
+            AppLogger.log(f'Couldn\'t write the collection index "{self.__index_file}": {ex}', logging.DEBUG)
+        self.__modified = False
+
+    def __path(self, relative: str) -> str:
+        return os.path.join(self.Root, *relative.split("/")) if relative else self.Root
+
+    def __scan(self, excluded: List[re.Pattern]) -> List[str]:
+        """
+        Get relative paths of all request files, unsorted
+        """
+        dirs: Dict[str, Dict[str, Any]] = {}
+        files: List[str] = []
+        changed = False
+        now = time.time_ns()
+        pending = [""]
+        while pending:
+            relative = pending.pop()
+            folder = self.__path(relative)
+            try:
+                mtime = os.stat(folder).st_mtime_ns
+            except OSError:
+                continue
+
+            entry = self.__dirs.get(relative)
+            if entry is None or entry["mtime"] != mtime:
+                entry = {"mtime": mtime if now - mtime > self.RACY_INTERVAL_NS else -1, "files": [], "dirs": []}
+                try:
+                    with os.scandir(folder) as it:
+                        for item in it:
+                            if item.is_dir():
+                                entry["dirs"].append(item.name)
+                            elif fnmatch.fnmatch(item.name, '*.toml') and item.name != "env.toml":
+                                entry["files"].append(item.name)
+                except OSError as ex:
+                    AppLogger.log(f'Couldn\'t list "{folder}": {ex}', logging.WARNING)
+                changed = self.__modified = True
+            dirs[relative] = entry
+
+            prefix = f'{relative}/' if relative else ''
+            files.extend(prefix + name for name in entry["files"])
+            for name in entry["dirs"]:
+                subfolder = prefix + name
+                # Excluded folders are not visited at all
+                if not any(pattern.match(subfolder) for pattern in excluded):
+                    pending.append(subfolder)
+
+        if excluded:
+            # Skipped folders are still valid, keep them for the next run
+            self.__dirs.update(dirs)
+            if changed:
+                # The cached order doesn't have the new files, the next full run sorts them again
+                self.__order = None
+        else:
+            if dirs.keys() != self.__dirs.keys():
+                self.__modified = True
+            self.__dirs = dirs
+        return files
+
+    def __file_tags(self, relative: str) -> List[str]:
+        """
+        Get tags of the request file, they are cached until the file is changed
+        """
+        path = self.__path(relative)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return []
+
+        entry = self.__tags.get(relative)
+        if entry is not None and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["tags"]
+
+        tags = Collection.read_tags(path)
+        self.__tags[relative] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "tags": tags}
+        self.__modified = True
+        return tags
+
+    @staticmethod
+    def read_tags(path: str) -> List[str]:
+        """
+        Read "tags" from the "request" table of the request file, variables are not substituted
+        """
+        try:
+            with open(path, "r") as f:
+                source = f.read()
+        except OSError:
+            return []
+
+        try:
+            tags = HttpRequest.read_request_table(Template(source)).get("tags", [])
+        except ValueError as ex:
+            AppLogger.log(f'Couldn\'t read tags of "{path}": {ex}', logging.WARNING)
+            return []
+        return [str(tag) for tag in tags] if isinstance(tags, list) else []
+
+    @staticmethod
+    def __compile(patterns: Optional[List[str]]) -> List[re.Pattern]:
+        return [re.compile(fnmatch.translate(pattern)) for pattern in patterns or []]
+
+    def requests(self, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                 tags: Optional[List[str]] = None) -> List[str]:
+        """
+        Get all request files in the execution order
+
+        :param include: Glob patterns, only matching requests are returned. Paths are relative to the collection.
+        :param exclude: Glob patterns, matching requests and folders are skipped
+        :param tags: Only requests with at least one of these tags are returned
+        :return: Paths of the request files, sorted
+        """
+        included = self.__compile(include)
+        excluded = self.__compile(exclude)
+
+        files = self.__scan(excluded)
+        if excluded:
+            order = sorted(files, key=self.__path)
+        else:
+            # The order is sorted again only if any folder was changed
+            if self.__modified or self.__order is None:
+                self.__order = sorted(files, key=self.__path)
+                self.__modified = True
+            order = self.__order
+
+        result: List[str] = []
+        for relative in order:
+            if included and not any(pattern.match(relative) for pattern in included):
+                continue
+            if any(pattern.match(relative) for pattern in excluded):
+                continue
+            if tags and not set(tags).intersection(self.__file_tags(relative)):
+                continue
+            result.append(self.__path(relative))
+
+        self.__save_index()
+        return result
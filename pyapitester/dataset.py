@@ -0,0 +1,53 @@
+import csv
+import json
+import os
+from typing import Any, Dict, Iterator
+
+
+class Dataset(object):
+    """
+    Rows of a CSV or JSON Lines file, see [request] dataset
+
+    Rows are read lazily, only the current row is kept in memory.
+    CSV columns are named by the header line, every JSON line should be an object.
+    """
+
+    FORMATS: Dict[str, str] = {
+        ".csv": "csv",
+        ".jsonl": "jsonl",
+        ".ndjson": "jsonl"
+    }
+    """Supported file extensions and their formats"""
+
+    Path: str
+    Format: str
+
+    def __init__(self, path: str):
+        """
+        :raises ValueError: If the file extension is not supported
+        """
+        self.Path = path
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in self.FORMATS:
+            raise ValueError(f'Unsupported dataset "{path}", expected ' + ", ".join(self.FORMATS))
+        self.Format = self.FORMATS[extension]
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the rows, the file is closed when the iteration is finished
+
+        :raises OSError: If the file can't be read
+        :raises ValueError: If a JSON line is not an object
+        """
+        with open(self.Path, "r", newline="", encoding="utf-8") as f:
+            if self.Format == "csv":
+                yield from csv.DictReader(f)
+                return
+
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError(f'{self.Path}, line {number}: expected a JSON object')
+                yield row
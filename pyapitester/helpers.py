@@ -1,8 +1,14 @@
 import os.path
-from string import Template
 from typing import Dict, Optional, Tuple, List, Any
 import sys
 import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+from pyapitester.template import Template
+from pyapitester.timings import Timings
 
 if sys.version_info < (3, 11):
     import tomli as tomllib
@@ -12,13 +18,30 @@ else:
 
 class EnvVars(object):
     """
-    TODO: Document
+    Variables visible to the request and its scripts
+
+    Variables set at runtime, e.g. by scripts, are kept in their own layer on top of the read-only scope,
+    see Environment. Several views can share the same runtime layer.
     """
 
-    __data: Dict[str, str]
+    __data: Dict[str, Any]
+    """Variables set at runtime"""
+
+    __scope: Dict[str, Any]
+    """Read-only variables below the runtime layer"""
 
-    def __init__(self, data: Optional[Dict[str, Any]] = None):
-        self.__data = {}
+    __DELETED = object()
+    """Marks a scope variable deleted at runtime"""
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None, scope: Optional[Dict[str, Any]] = None,
+                 layer: Optional[Dict[str, Any]] = None):
+        """
+        :param data: Initial variables, set in the same way as by scripts
+        :param scope: Read-only variables below the runtime layer, never modified
+        :param layer: Runtime layer, shared with other views if given
+        """
+        self.__data = layer if layer is not None else {}
+        self.__scope = scope if scope is not None else {}
 
         if data is None:
             return
@@ -26,21 +49,37 @@ class EnvVars(object):
         for key in data.keys():
             self.__setitem__(key, data[key])
 
+    @staticmethod
+    def convert(value: Any) -> Any:
+        """
+        Convert the value in the same way as it is stored, e.g. booleans become "true" and "false"
+        """
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        return value
+
     def __getitem__(self, key: str):
-        if key in self.__data.keys():
-            return self.__data[key]
-        else:
-            return None
+        return self.get(key)
 
     def __setitem__(self, key, value):
-        if isinstance(value, bool):
-            value = "true" if value else "false"
-        self.__data[key] = value
+        self.__data[key] = self.convert(value)
 
     def __delitem__(self, key: str):
-        if key in self.__data.keys():
+        if key in self.__scope:
+            self.__data[key] = self.__DELETED
+        elif key in self.__data.keys():
             del self.__data[key]
 
+    def __contains__(self, key: str) -> bool:
+        return self.__lookup(key, self.__DELETED) is not self.__DELETED
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.__lookup(key, default)
+
+    def __lookup(self, key: str, default: Any) -> Any:
+        value = self.__data.get(key, self.__scope.get(key, default))
+        return default if value is self.__DELETED else value
+
     def replace_vars(self, text: str) -> str:
         """
         Replace all placeholders in the input text with the data from the dictionary
@@ -51,37 +90,174 @@ class EnvVars(object):
         :return: Input text with all placeholders replaced whenever possible
         """
 
-        class VariableReplacer(Template):
-            delimiter = '{{'
-            pattern = r'''
-            \{\{(?:
-            (?P<escaped>\{\{)|
-            (?P<named>[_a-z][_a-z0-9]*)\}\}|
-            (?P<braced>[_a-z][_a-z0-9]*)\}\}|
-            (?P<invalid>)
-            )
-            '''
+        return Template.get(text).render(self)
+
+
+class EnvVarsOverlay(EnvVars):
+    """
+    Variables of one dataset row on top of the environment variables
+
+    Row variables hide environment variables with the same name.
+    Changes are written to the environment, so they are visible to other requests.
+    """
 
-        return VariableReplacer(text).safe_substitute(self.__data)
+    __base: EnvVars
+
+    def __init__(self, base: EnvVars, row: Dict[str, Any]):
+        super().__init__()
+        self.__base = base
+        for key, value in row.items():
+            EnvVars.__setitem__(self, key, value)
+
+    def __getitem__(self, key: str):
+        if EnvVars.__contains__(self, key):
+            return EnvVars.__getitem__(self, key)
+        return self.__base[key]
+
+    def __setitem__(self, key, value):
+        EnvVars.__delitem__(self, key)
+        self.__base[key] = value
+
+    def __delitem__(self, key: str):
+        EnvVars.__delitem__(self, key)
+        del self.__base[key]
+
+    def __contains__(self, key: str) -> bool:
+        return EnvVars.__contains__(self, key) or key in self.__base
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if EnvVars.__contains__(self, key):
+            return EnvVars.get(self, key)
+        return self.__base.get(key, default)
+
+    def replace_vars(self, text: str) -> str:
+        return Template.get(text).render(self)
 
 
 class Environment(object):
+    """
+    Environment file and per-folder env.toml files
+
+    The scope of a folder has all variables of the environment file, overridden by the variables
+    of every env.toml file from the collection root down to the folder. Scopes are merged once
+    per folder and cached. Variables set by scripts are kept in a separate runtime layer,
+    which hides the variables of all scopes.
+    """
+
+    FOLDER_FILE: str = "env.toml"
 
     env_vars: EnvVars
+    """Variables of the collection root"""
 
-    def __init__(self, filename: Optional[str]):
+    Root: Optional[str]
+    """Collection folder, env.toml files are read only inside it"""
 
-        if (filename is not None) and os.path.isfile(filename):
-            env_data: Dict[str, Any] = tomllib.load(open(filename, "rb"))
-        else:
-            env_data = {}
+    Retry: Dict[str, Any]
+    """The [retry] table of the environment file, see RetryPolicy"""
 
-        if "vars" not in env_data:
-            self.env_vars = EnvVars()
-        else:
-            self.env_vars = EnvVars(env_data["vars"])
+    __base: Dict[str, Any]
+    """Variables of the environment file"""
+
+    __scopes: Dict[str, Dict[str, Any]]
+    """Merged scope of every folder by its absolute path"""
+
+    __variables: Dict[str, Any]
+    """Runtime layer, shared by all views"""
+
+    def __init__(self, filename: Optional[str], root: Optional[str] = None):
+        """
+        :param filename: Environment file (*.env), optional
+        :param root: Collection folder, env.toml files are not used if None
+        """
+        self.__scopes = {}
+        self.__variables = {}
+        self.Root = os.path.abspath(root) if root is not None else None
+
+        env_data = self.__read(filename) if filename is not None else {}
+        self.__base = self.__vars(env_data)
+        self.Retry = env_data.get("retry", {})
+        self.env_vars = self.folder_vars(self.Root) if self.Root is not None else \
+            EnvVars(scope=self.__base, layer=self.__variables)
+
+    @staticmethod
+    def __read(filename: str) -> Dict[str, Any]:
+        if not os.path.isfile(filename):
+            return {}
+        with open(filename, "rb") as f:
+            return tomllib.load(f)
+
+    @staticmethod
+    def __vars(env_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: EnvVars.convert(value) for key, value in env_data.get("vars", {}).items()}
+
+    def scope(self, folder: str) -> Dict[str, Any]:
+        """
+        Get all variables of the folder, without the variables set at runtime
+
+        :param folder: Folder of the request
+        :return: Merged variables, should not be modified
+        """
+        folder = os.path.abspath(folder)
+        scope = self.__scopes.get(folder)
+        if scope is not None:
+            return scope
+
+        if self.Root is None or os.path.commonpath([self.Root, folder]) != self.Root:
+            return self.__base
+
+        # Computed at most once per folder, a concurrent duplicate is harmless
+        parent = self.__base if folder == self.Root else self.scope(os.path.dirname(folder))
+        own = self.__vars(self.__read(os.path.join(folder, self.FOLDER_FILE)))
+        scope = {**parent, **own} if own else parent
+        self.__scopes[folder] = scope
+        return scope
+
+    def folder_vars(self, folder: str, layer: Optional[Dict[str, Any]] = None) -> EnvVars:
+        """
+        Get a view of the variables for the request in the folder
 
-        # TODO
+        :param folder: Folder of the request
+        :param layer: Runtime layer, the shared one is used if None, see isolated_layer()
+        """
+        return EnvVars(scope=self.scope(folder), layer=self.__variables if layer is None else layer)
+
+    def isolated_layer(self) -> Dict[str, Any]:
+        """
+        Get a copy of the runtime layer, changes in the copy are not visible to other views
+        """
+        return dict(self.__variables)
+
+
+class AppCache(object):
+    """
+    Location of the on-disk caches
+    """
+
+    Dir: Optional[str] = None
+    """Cache root folder, on-disk caching is disabled if None"""
+
+    @staticmethod
+    def default_dir() -> str:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(base, "pyapitester")
+
+    @staticmethod
+    def path(name: str) -> Optional[str]:
+        """
+        Get the folder for the given cache, create it if necessary
+
+        :param name: Cache name, e.g. "scripts"
+        :return: Folder path or None if on-disk caching is disabled or not possible
+        """
+        if AppCache.Dir is None:
+            return None
+        folder = os.path.join(AppCache.Dir, name)
+        try:
+            os.makedirs(folder, exist_ok=True)
+        except OSError as ex:
+            logging.debug(f'Cache folder "{folder}" is not available: {ex}')
+            return None
+        return folder
 
 
 class CustomFormatter(logging.Formatter):
@@ -100,42 +276,161 @@ class CustomFormatter(logging.Formatter):
         logging.CRITICAL: bold_red + format + reset
     }
 
+    # One formatter per level, they are never created while logging
+    FORMATTERS = {level: logging.Formatter(log_fmt) for level, log_fmt in FORMATS.items()}
+
     def format(self, record):
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt)
+        formatter = self.FORMATTERS.get(record.levelno)
+        if formatter is None:
+            return super().format(record)
         return formatter.format(record)
 
 
+class AsyncHandler(logging.handlers.QueueHandler):
+    """
+    Passes records to the output thread as they are
+
+    Messages are already formatted by AppLogger, the console formatter runs on the output thread
+    """
+
+    def prepare(self, record):
+        return record
+
+
 class AppState(object):
+    __lock: threading.Lock = threading.Lock()
+
     RequestsTotal: int = 0
     RequestsOk: int = 0
     RequestsFailed: int = 0
+    RequestsSkipped: int = 0
 
     TestsTotal: int = 0
     TestsOk: int = 0
     TestsFailed: int = 0
 
+    ConnectionRequests: int = 0
+    ConnectionsOpened: int = 0
+    TlsHandshakes: int = 0
+
+    Retries: int = 0
+    """Attempts sent again after a failure, see RetryPolicy"""
+    Hedges: int = 0
+    """Duplicate requests sent, because the first one was too slow"""
+    HedgesWon: int = 0
+    """Duplicate requests, that answered before the first one"""
+    Wasted: float = 0.0
+    """Time spent on failed attempts and waiting between them, ms"""
+
+    TimedRequests: int = 0
+    Timings: Dict[str, float] = {}
+    """Sum of every phase duration over all requests, ms"""
+
     @staticmethod
     def add_test_result(ok: bool):
 
-        AppState.TestsTotal += 1
-        if ok:
-            AppState.TestsOk += 1
-        else:
-            AppState.TestsFailed += 1
+        with AppState.__lock:
+            AppState.TestsTotal += 1
+            if ok:
+                AppState.TestsOk += 1
+            else:
+                AppState.TestsFailed += 1
 
     @staticmethod
     def add_request_result(ok: bool):
-        AppState.RequestsTotal += 1
-        if ok:
-            AppState.RequestsOk += 1
-        else:
-            AppState.RequestsFailed += 1
+        with AppState.__lock:
+            AppState.RequestsTotal += 1
+            if ok:
+                AppState.RequestsOk += 1
+            else:
+                AppState.RequestsFailed += 1
+
+    @staticmethod
+    def add_skipped_request():
+        with AppState.__lock:
+            AppState.RequestsSkipped += 1
+
+    @staticmethod
+    def add_connection_request():
+        with AppState.__lock:
+            AppState.ConnectionRequests += 1
+
+    @staticmethod
+    def add_timings(timings: Dict[str, float]):
+        with AppState.__lock:
+            AppState.TimedRequests += 1
+            for phase, duration in timings.items():
+                AppState.Timings[phase] = AppState.Timings.get(phase, 0.0) + duration
+
+    @staticmethod
+    def add_connection(tls: bool):
+        with AppState.__lock:
+            AppState.ConnectionsOpened += 1
+            if tls:
+                AppState.TlsHandshakes += 1
+
+    @staticmethod
+    def add_attempts(retries: int, hedged: bool, hedge_won: bool, wasted: float):
+        """
+        :param retries: Number of attempts after the first one
+        :param hedged: A duplicate request was sent
+        :param hedge_won: The duplicate request answered first
+        :param wasted: Time spent on failed attempts and waiting between them, ms
+        """
+        with AppState.__lock:
+            AppState.Retries += retries
+            AppState.Hedges += hedged
+            AppState.HedgesWon += hedge_won
+            AppState.Wasted += wasted
+
+    COUNTERS: List[str] = ["RequestsTotal", "RequestsOk", "RequestsFailed", "RequestsSkipped",
+                           "TestsTotal", "TestsOk", "TestsFailed",
+                           "ConnectionRequests", "ConnectionsOpened", "TlsHandshakes",
+                           "Retries", "Hedges", "HedgesWon", "Wasted", "TimedRequests"]
+    """All counters, that can be merged"""
+
+    @staticmethod
+    def as_dict() -> Dict[str, Any]:
+        """
+        Get all counters and timings, e.g. to merge them in another process
+        """
+        with AppState.__lock:
+            result: Dict[str, Any] = {name: getattr(AppState, name) for name in AppState.COUNTERS}
+            result["Timings"] = dict(AppState.Timings)
+        return result
+
+    @staticmethod
+    def reset():
+        """
+        Start counting from scratch, e.g. before the next watch iteration
+        """
+        with AppState.__lock:
+            for name in AppState.COUNTERS:
+                setattr(AppState, name, 0)
+            AppState.Timings = {}
+
+    @staticmethod
+    def merge(state: Dict[str, Any]):
+        """
+        Add counters and timings of another run, e.g. of a shard
+
+        :param state: Result of as_dict(). Missing counters are ignored
+        """
+        with AppState.__lock:
+            for name in AppState.COUNTERS:
+                setattr(AppState, name, getattr(AppState, name) + state.get(name, 0))
+            for phase, duration in state.get("Timings", {}).items():
+                AppState.Timings[phase] = AppState.Timings.get(phase, 0.0) + duration
 
 
 class AppLogger(object):
     progress_step: int = 0
-    request_in_progress: bool = False
+
+    # Buffering state is kept per thread, so that requests processed
+    # in parallel don't mix their output
+    __local: threading.local = threading.local()
+    __output_lock: threading.Lock = threading.Lock()
+    __listener: Optional[logging.handlers.QueueListener] = None
 
     class Colors:
         HEADER = '\033[95m'
@@ -152,6 +447,7 @@ class AppLogger(object):
     COLOR_HEADER: str = f'{Colors.HEADER}'
     RESULT_OK: str = f"{Colors.OKGREEN}✓"
     RESULT_FAILED: str = f"{Colors.FAIL}✗"
+    RESULT_SKIPPED: str = f"{Colors.WARNING}-"
 
     # progress = "⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏"
     progress = [
@@ -169,8 +465,6 @@ class AppLogger(object):
         "[ O=- ]"
     ]
 
-    log_buffer: List[Tuple[int, str]] = []
-
     @staticmethod
     def init_logger(level=logging.INFO, logger=None):
         """
@@ -189,24 +483,97 @@ class AppLogger(object):
         console.setLevel(level)
 
     @staticmethod
-    def __log(message: str, level: int = logging.INFO, log_now: bool = False):
+    def start_output_thread(logger=None):
+        """
+        Write the console output on a background thread, requests never wait for the console
 
-        if AppLogger.request_in_progress and not log_now:
-            AppLogger.log_buffer.append((level, message))
+        Call stop_output_thread() to flush the output
+        """
+        if AppLogger.__listener is not None:
+            return
+        logger = logger or logging.getLogger()
+        output_queue = queue.SimpleQueue()
+        AppLogger.__listener = logging.handlers.QueueListener(output_queue, *logger.handlers,
+                                                              respect_handler_level=True)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(AsyncHandler(output_queue))
+        AppLogger.__listener.start()
+
+    @staticmethod
+    def stop_output_thread(logger=None):
+        """
+        Write all pending output and go back to the synchronous output
+        """
+        listener = AppLogger.__listener
+        if listener is None:
+            return
+        AppLogger.__listener = None
+        listener.stop()
+        logger = logger or logging.getLogger()
+        for handler in list(logger.handlers):
+            if isinstance(handler, AsyncHandler):
+                logger.removeHandler(handler)
+        for handler in listener.handlers:
+            logger.addHandler(handler)
+
+    @staticmethod
+    def set_console_level(level: int, logger=None):
+        """
+        Change the level of the console output only, e.g. if the console reporter is disabled
+        """
+        logger = logger or logging.getLogger()
+        handlers = AppLogger.__listener.handlers if AppLogger.__listener is not None else logger.handlers
+        for handler in handlers:
+            handler.setLevel(level)
+
+    @staticmethod
+    def __state() -> threading.local:
+        state = AppLogger.__local
+        if not hasattr(state, "log_buffer"):
+            state.request_in_progress = False
+            state.log_buffer = []
+            state.group = None
+        return state
+
+    @staticmethod
+    def __emit(level: int, message: str):
+        group = AppLogger.__state().group
+        if group is not None:
+            group.append((level, message))
         else:
             logging.log(level, message)
 
+    @staticmethod
+    def __log(message: str, level: int = logging.INFO, log_now: bool = False):
+        # Messages below the level are never buffered
+        if not logging.getLogger().isEnabledFor(level):
+            return
+
+        state = AppLogger.__state()
+        if state.request_in_progress and not log_now:
+            state.log_buffer.append((level, message))
+        else:
+            AppLogger.__emit(level, message)
+
     @staticmethod
     def log(message: str, level: int = logging.INFO):
         AppLogger.__log(f'    {message}', level)
 
     @staticmethod
     def log_header(ok: bool, message: str, result: str):
-        logging.log(logging.INFO,f'{AppLogger.RESULT_OK if ok else AppLogger.RESULT_FAILED} ' +
+        AppLogger.__emit(logging.INFO, f'{AppLogger.RESULT_OK if ok else AppLogger.RESULT_FAILED} ' +
                     f'{AppLogger.Colors.OKBLUE}{message} (' +
                     f'{AppLogger.Colors.OKGREEN if ok else AppLogger.Colors.FAIL}{result}' +
                     f'{AppLogger.Colors.ENDC}{AppLogger.Colors.OKBLUE}){AppLogger.Colors.ENDC}')
 
+    @staticmethod
+    def log_skipped(message: str, reason: str):
+        AppLogger.__emit(logging.INFO, f'{AppLogger.RESULT_SKIPPED} ' +
+                         f'{AppLogger.Colors.OKBLUE}{message} (' +
+                         f'{AppLogger.Colors.WARNING}{reason}' +
+                         f'{AppLogger.Colors.ENDC}{AppLogger.Colors.OKBLUE}){AppLogger.Colors.ENDC}')
+
     @staticmethod
     def log_summary():
         logging.log(logging.INFO, f'\n{AppLogger.Colors.OKCYAN}Summary:{AppLogger.Colors.ENDC}')
@@ -225,26 +592,92 @@ class AppLogger(object):
 
         AppLogger.log(f'Requests: {req_total:>{len_total}}, ' +
                       f'failed: {req_failed:>{len_failed}}, ' +
-                      f'succeeded: {req_ok:>{len_ok}}')
+                      f'succeeded: {req_ok:>{len_ok}}' +
+                      (f', skipped: {AppState.RequestsSkipped}' if AppState.RequestsSkipped > 0 else ''))
 
         AppLogger.log(f'Tests:    {tests_total:>{len_total}}, ' +
                       f'failed: {tests_failed:>{len_failed}}, ' +
                       f'succeeded: {tests_ok:>{len_ok}}')
 
+        if AppState.ConnectionRequests > 0:
+            AppLogger.log(f'Connections: {AppState.ConnectionRequests} requests, ' +
+                          f'reused: {max(AppState.ConnectionRequests - AppState.ConnectionsOpened, 0)}, ' +
+                          f'opened: {AppState.ConnectionsOpened}, ' +
+                          f'TLS handshakes: {AppState.TlsHandshakes}')
+
+        if AppState.Retries > 0 or AppState.Hedges > 0:
+            AppLogger.log(f'Retries: {AppState.Retries}, hedged: {AppState.Hedges}, ' +
+                          f'hedges won: {AppState.HedgesWon}, wasted ms: {AppState.Wasted:.1f}')
+
+        if AppState.TimedRequests > 0:
+            timings = AppState.Timings
+            phases = [phase for phase in Timings.PHASES if phase in timings]
+            AppLogger.log('Timings, mean ms: ' +
+                          ', '.join(f'{phase}: {timings[phase] / AppState.TimedRequests:.2f}' for phase in phases))
+            # Everything outside of the network exchange is the tool overhead
+            network = timings.get("send", 0.0)
+            AppLogger.log(f'Time, ms: network: {network:.1f}, ' +
+                          f'harness: {max(timings.get("total", 0.0) - network, 0.0):.1f}')
+
     @staticmethod
     def log_result(ok: bool, message: str):
         AppLogger.log(f'{AppLogger.RESULT_OK if ok else AppLogger.RESULT_FAILED} {message}{AppLogger.Colors.ENDC}')
 
     @staticmethod
     def buffering_start():
-        AppLogger.request_in_progress = True
+        AppLogger.__state().request_in_progress = True
 
     @staticmethod
     def buffering_end():
-        AppLogger.request_in_progress = False
-        for log_entry in AppLogger.log_buffer:
-            logging.log(log_entry[0], log_entry[1])
-        AppLogger.log_buffer = []
+        state = AppLogger.__state()
+        state.request_in_progress = False
+        for log_entry in state.log_buffer:
+            AppLogger.__emit(log_entry[0], log_entry[1])
+        state.log_buffer = []
+
+    @staticmethod
+    def group_start():
+        """
+        Start collecting all output of the current thread
+
+        Everything logged until group_end() is printed at once,
+        so the output of one request is never interleaved with others
+        """
+        AppLogger.__state().group = []
+
+    @staticmethod
+    def group_end(discard: bool = False):
+        """
+        Print everything collected since group_start()
+
+        :param discard: Drop the collected output instead of printing it
+        """
+        group = AppLogger.group_detach()
+        if not discard:
+            AppLogger.group_print(group)
+
+    @staticmethod
+    def group_detach() -> List[Tuple[int, str]]:
+        """
+        Stop collecting the output of the current thread, without printing it
+
+        :return: Collected level and message pairs, to be printed later with group_print()
+        """
+        state = AppLogger.__state()
+        group = state.group
+        state.group = None
+        return group or []
+
+    @staticmethod
+    def group_print(group: List[Tuple[int, str]]):
+        """
+        Print the output collected by another group at once
+        """
+        if not group:
+            return
+        with AppLogger.__output_lock:
+            for log_entry in group:
+                logging.log(log_entry[0], log_entry[1])
 
     @staticmethod
     def update_progress():
@@ -253,3 +686,38 @@ class AppLogger(object):
             AppLogger.progress_step = 0
 
         print(" " + AppLogger.progress[AppLogger.progress_step], end='\r')
+
+
+class StartupTimer(object):
+    """
+    Timings of the startup phases, see --timing-startup
+
+    Time is measured from the import of this module, CPU time is measured from the process start
+    """
+    Enabled: bool = False
+
+    __start: float = time.perf_counter()
+    __start_cpu: float = time.process_time()
+    __marks: Dict[str, Tuple[float, float]] = {}
+
+    @staticmethod
+    def mark(name: str):
+        """
+        Mark the end of the startup phase, only the first mark with this name is kept
+        """
+        if StartupTimer.Enabled and name not in StartupTimer.__marks:
+            StartupTimer.__marks.setdefault(name, (time.perf_counter(), time.process_time()))
+
+    @staticmethod
+    def log_report():
+        if not StartupTimer.Enabled:
+            return
+
+        logging.log(logging.INFO, f'\n{AppLogger.Colors.OKCYAN}Startup timing:{AppLogger.Colors.ENDC}')
+        AppLogger.log(f'Interpreter and early imports: {StartupTimer.__start_cpu * 1000:.1f} ms CPU')
+        previous = StartupTimer.__start
+        for name, (wall, cpu) in StartupTimer.__marks.items():
+            AppLogger.log(f'{name}: +{(wall - previous) * 1000:.1f} ms, ' +
+                          f'total: {(wall - StartupTimer.__start) * 1000:.1f} ms, CPU: {cpu * 1000:.1f} ms')
+            previous = wall
+        AppLogger.log(f'Modules loaded: {len(sys.modules)}')
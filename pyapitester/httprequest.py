@@ -1,19 +1,24 @@
+import copy
 import os.path
-from typing import Dict, Optional, List, Any, Union
+from typing import Dict, Optional, List, Any, Union, FrozenSet, Tuple, Callable, TYPE_CHECKING
 from enum import Enum
+import hashlib
 import sys
 import logging
 import re
-import requests
-from requests.auth import HTTPBasicAuth, HTTPDigestAuth
 
 from pyapitester.helpers import EnvVars, AppLogger
+from pyapitester.template import Template, ParsedTemplate
 
 if sys.version_info < (3, 11):
     import tomli as tomllib
 else:
     import tomllib
 
+if TYPE_CHECKING:
+    # requests is imported only when the first auth is created
+    from requests.auth import HTTPBasicAuth, HTTPDigestAuth
+
 
 class HttpRequest:
     """
@@ -43,11 +48,23 @@ class HttpRequest:
         Type: Optional['HttpRequest.BodyType']
         Text: Optional[str]
         Multipart: Optional[List['HttpRequest.MultipartField']]
+        Chunked: bool
+        """Send the body with chunked transfer encoding instead of Content-Length"""
 
         def __init__(self):
             self.Type = None
             self.Text = None
             self.Multipart = None
+            self.Chunked = False
+
+        def copy(self) -> 'HttpRequest.HttpBody':
+            """
+            Copy the body and its multipart fields, so that scripts can change them
+            """
+            body = copy.copy(self)
+            if self.Multipart is not None:
+                body.Multipart = [copy.copy(field) for field in self.Multipart]
+            return body
 
     class MultipartField:
         Name: str
@@ -79,7 +96,7 @@ class HttpRequest:
     Timeout: Optional[int]
     """Request timeout, ms. Default system timeout is used if zero."""
 
-    Auth: Optional[Union[HTTPBasicAuth, HTTPDigestAuth]] = None
+    Auth: Optional[Union['HTTPBasicAuth', 'HTTPDigestAuth']] = None
 
     Session: bool
 
@@ -94,6 +111,10 @@ class HttpRequest:
     PostRequestScript: str
     """A script that will be executed after getting the response"""
 
+    ScriptsOrdered: Optional[bool]
+    """Scripts change the shared state and wait for the deferred scripts of other requests.
+    Detected from the scripts if None, see --script-workers"""
+
     Source: str
     """Original content of the request file"""
 
@@ -103,40 +124,153 @@ class HttpRequest:
     ExpectedStatuses: Optional[List] = None
     """Expected status code or exception name. Both are in string format"""
 
-    __USER_SCRIPT_PREPEND_STRING: str = '''
-from grappa import should, expect
-import sys
-import logging
+    Stream: bool
+    """Consume the response body in chunks instead of reading it at once"""
+
+    MaxBuffer: int
+    """Streaming mode: maximum number of response bytes kept in memory"""
+
+    Spool: bool
+    """Streaming mode: spool the rest of the body to a temporary file instead of discarding it"""
+
+    SaveTo: Optional[str]
+    """Write the response body to this file, enables the streaming mode"""
+
+    Discard: bool
+    """Don't keep the response body at all, enables the streaming mode"""
+
+    Checksum: str
+    """Checksum algorithm of the streamed response body"""
+
+    Tags: List[str]
+    """Tags used to filter requests, see --tag"""
+
+    DependsOn: List[str]
+    """Paths of the requests, that should pass before this one. Relative to the request folder"""
+
+    Produces: List[str]
+    """Environment variables set by this request"""
+
+    Consumes: List[str]
+    """Environment variables, that should be set by other requests before this one"""
+
+    Dataset: Optional[str]
+    """CSV or JSON Lines file, the request is executed once per row"""
+
+    DatasetJobs: int
+    """Number of dataset rows executed at the same time"""
+
+    Row: Optional[int]
+    """Index of the dataset row, this copy of the request is executed for"""
+
+    Retry: Dict[str, Any]
+    """The [request.retry] table, overrides the global one, see RetryPolicy"""
+
+    DEFAULT_MAX_BUFFER: int = 1024 * 1024
+
+    DEFAULT_MAX_REDIRECTS: int = 30
+    """Same as requests.models.DEFAULT_REDIRECT_LIMIT"""
+
+    __template: Template
+    """Tokenized request file"""
 
-def __indent(text_in: str) -> str:
-    return '        '.join(('\\n'+text_in.lstrip()).splitlines(True))
-
-def test_case(test_name):
-    def inner_decorator(f):
-        def wrapped(*args, **kwargs):
-            # Covers all exceptions in the user code
-            try:
-                f(*args, **kwargs)
-                AppState.add_test_result(True)
-                AppLogger.log_result(True, f'Test case "{test_name}" in function {f.__name__}')
-            except Exception as ex:
-                exc_type, exc_obj, exc_tb = sys.exc_info()
-                AppState.add_test_result(False)
-                AppLogger.log_result(False, f'Test case "{test_name}" in function {f.__name__}')
-                logging.warning(f'    Failed with "{exc_type.__name__}" at line {str(exc_tb.tb_next.tb_lineno - 25)}: {__indent(str(exc_obj))}')
-
-        return wrapped
-
-    return inner_decorator
-'''
-
-    def __init__(self, filename: str):
+    __rendered_key: Optional[Tuple] = None
+    """Values of the variables used for the last parsing"""
+
+    __data: Dict[str, Any]
+    """Parsed request file"""
+
+    __parsed: Optional[ParsedTemplate] = None
+    """Request file parsed with placeholders, used only if the file is parsed once"""
+
+    __tables: Optional[Dict[str, Any]] = None
+    """Top-level tables used to build the fields below"""
+
+    __auth: Optional[Union['HTTPBasicAuth', 'HTTPDigestAuth']] = None
+    __headers: Dict[str, str]
+    __body: HttpBody
+
+    def __init__(self, filename: str, parse_once: bool = False):
+        """
+        :param filename: Request file
+        :param parse_once: Parse the file only once and substitute variables into the parsed data
+        """
         self.Path = filename
         self.FullPath = os.path.abspath(self.Path)
 
         with open(filename, "r") as f:
             self.Source = f.read()
 
+        self.__template = Template(self.Source)
+
+        if parse_once:
+            self.__parsed = ParsedTemplate(self.__template)
+            if not self.__parsed.Valid:
+                AppLogger.log(f'{self.Path} can\'t be parsed once, it will be parsed on every run: ' +
+                              f'{self.__parsed.Error}', logging.DEBUG)
+
+        # These fields are needed before the request is prepared, variables are not substituted
+        try:
+            static = HttpRequest.read_request_table(self.__template, self.__parsed)
+        except ValueError as ex:
+            # Preparing the request fails with the same error, the run goes on
+            AppLogger.log(f'{self.Path} is not a valid request file: {ex}', logging.WARNING)
+            static = {}
+        self.Tags = HttpRequest.__string_list(static.get("tags"))
+        self.DependsOn = HttpRequest.__string_list(static.get("depends_on"))
+        self.Produces = HttpRequest.__string_list(static.get("produces"))
+        self.Consumes = HttpRequest.__string_list(static.get("consumes"))
+        self.Session = static.get("session") is True
+        self.Dataset = static.get("dataset")
+        if self.Dataset is not None:
+            self.Dataset = os.path.join(os.path.dirname(self.FullPath), str(self.Dataset))
+        jobs = static.get("dataset_jobs")
+        self.DatasetJobs = jobs if isinstance(jobs, int) and jobs > 1 else 1
+        self.Row = None
+
+    @staticmethod
+    def __string_list(value: Any) -> List[str]:
+        if value is None:
+            return []
+        if isinstance(value, list):
+            return [str(item) for item in value]
+        return [str(value)]
+
+    @staticmethod
+    def read_request_table(template: Template, parsed: Optional[ParsedTemplate] = None) -> Dict[str, Any]:
+        """
+        Read the "request" table without substituting variables, placeholders are kept as they are
+
+        The file is parsed with placeholders, see ParsedTemplate. If that isn't possible,
+        e.g. a placeholder is a part of a number, every placeholder is replaced with 0.
+
+        :param template: Tokenized request file
+        :param parsed: The same file, if it is already parsed with placeholders
+        :raises ValueError: If the file is not a valid TOML document
+        """
+        if parsed is None:
+            parsed = ParsedTemplate(template)
+        if parsed.Valid:
+            # Every variable is replaced with its own placeholder
+            data = parsed.render(HttpRequest.Placeholders())
+        else:
+            data = tomllib.loads(template.render({name: 0 for name in template.Variables}))
+        table = data.get("request", {})
+        return table if isinstance(table, dict) else {}
+
+    class Placeholders:
+        """
+        Variable values, that render every placeholder as is
+        """
+
+        def get(self, name: str, default: Any = None) -> str:
+            return f'{{{{{name}}}}}'
+
+    @property
+    def Variables(self) -> FrozenSet[str]:
+        """Names of all environment variables used in the request file"""
+        return self.__template.Variables
+
     def prepare(self, env_vars: EnvVars):
         self.Headers = {}
         self.Name = self.Path
@@ -144,12 +278,18 @@ def test_case(test_name):
         self.Session = False
         self.PreRequestScript = ''
         self.PostRequestScript = ''
+        self.ScriptsOrdered = None
         self.Body = HttpRequest.HttpBody()
         self.__reload(env_vars)
 
     @staticmethod
     def __wrap_user_script(script: str) -> str:
-        before = HttpRequest.__USER_SCRIPT_PREPEND_STRING
+        """
+        Append calls of all test case functions to the script
+
+        Helpers like test_case and expect are provided by ScriptNamespace,
+        the script itself is kept as is, so line numbers stay correct.
+        """
         lines = script.splitlines(True)
         after = ''
 
@@ -173,7 +313,100 @@ def test_case(test_name):
         for function_name in function_list:
             after += f'{function_name}()\n'
 
-        return before + script + after
+        return script + after
+
+    @staticmethod
+    def __load_auth(data: Dict[str, Any]) -> Optional[Union['HTTPBasicAuth', 'HTTPDigestAuth']]:
+        auth: Optional[Union['HTTPBasicAuth', 'HTTPDigestAuth']] = None
+        if "auth" in data:
+            from requests.auth import HTTPBasicAuth, HTTPDigestAuth
+            if "basic" in data["auth"]:
+                if "username" in data["auth"]["basic"] and "password" in data["auth"]["basic"]:
+                    auth = HTTPBasicAuth(
+                        data["auth"]["basic"]["username"],
+                        data["auth"]["basic"]["password"]
+                    )
+                else:
+                    AppLogger.log("Basic auth should have username and password", logging.WARNING)
+            elif "digest" in data["auth"]:
+                if "username" in data["auth"]["digest"] and "password" in data["auth"]["digest"]:
+                    auth = HTTPDigestAuth(
+                        data["auth"]["digest"]["username"],
+                        data["auth"]["digest"]["password"]
+                    )
+                else:
+                    AppLogger.log("Digest auth should have username and password", logging.WARNING)
+            else:
+                # Auth is not basic
+                AppLogger.log("Only basic and digest auth are supported as of now", logging.WARNING)
+
+        return auth
+
+    @staticmethod
+    def __load_headers(data: Dict[str, Any]) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if "headers" in data:
+            for header in data["headers"]:
+                # Make the header name Pascal-Case. They are case-insensitive,
+                # but it is common to have them in Pascal-Case.
+                header_name = header.replace("-", " ").title().replace(" ", "-")
+                headers[header_name] = data["headers"][header]
+                AppLogger.log(f'header: "{header_name}" = "{headers[header_name]}"', logging.DEBUG)
+
+        return headers
+
+    def __load_body(self, data: Dict[str, Any]) -> 'HttpRequest.HttpBody':
+        body = HttpRequest.HttpBody()
+        if "body" in data:
+
+            if "type" not in data["body"]:
+                raise ValueError('"body.type" is missing')
+
+            body.Type = self.BodyType(data["body"]["type"].lower())
+            AppLogger.log(f'body.type = "{body.Type.name}"', logging.DEBUG)
+            body.Chunked = data["body"].get("chunked") is True
+
+            if body.Type == self.BodyType.TEXT:
+                if "text" not in data["body"]:
+                    AppLogger.log('"text" is missing in the "body" table, although "type" is set to "text"',
+                                  logging.WARNING)
+                    body.Text = ''
+                else:
+                    body.Text = data["body"]["text"]
+                    AppLogger.log(f'body.text = "{body.Text}"', logging.DEBUG)
+            elif body.Type == self.BodyType.MULTIPART:
+                multipart_keys = sorted(list(filter(lambda s: "multipart" in s, data.keys())))
+                body.Multipart = []
+                for key in multipart_keys:
+                    multipart_entry = HttpRequest.MultipartField()
+                    if "name" not in data[key]:
+                        raise KeyError(f'"name" is missing in section "{key}", file {self.Path}')
+                    multipart_entry.Name = data[key]["name"]
+                    if "data" in data[key]:
+                        multipart_entry.Data = data[key]["data"]
+                    if "filename" in data[key]:
+                        multipart_entry.FileName = data[key]["filename"]
+                        # if "data" entry is not present then a real file will be sent
+                        if multipart_entry.Data is None:
+                            # Calculate absolute path to the file if needed
+                            if not os.path.isabs(multipart_entry.FileName):
+                                multipart_entry.FileName = \
+                                    os.path.join(os.path.dirname(self.FullPath),multipart_entry.FileName)
+                    body.Multipart.append(multipart_entry)
+
+        return body
+
+    def __changed(self, data: Dict[str, Any], match: Callable[[str], bool]) -> bool:
+        """
+        Check if any of the matching top-level tables differs from the previous parsing
+
+        Unchanged tables are the same objects, no need to compare the content
+        """
+        if self.__tables is None:
+            return True
+        old_keys = [key for key in self.__tables.keys() if match(key)]
+        new_keys = [key for key in data.keys() if match(key)]
+        return old_keys != new_keys or any(data[key] is not self.__tables[key] for key in new_keys)
 
     def __reload(self, env_vars: EnvVars) -> None:
         """
@@ -183,9 +416,20 @@ def test_case(test_name):
         current variables to the file content.
         """
 
-        AppLogger.log(f'Parsing {self.Path}', logging.DEBUG)
+        if self.__parsed is not None and self.__parsed.Valid:
+            # The file is already parsed, only the values of changed variables are substituted
+            data: Dict[str, Any] = self.__parsed.render(env_vars)
+        else:
+            # Neither the file nor the variables it uses have changed, the parsed data is still valid
+            key = self.__template.key(env_vars)
+            if key != self.__rendered_key:
+                AppLogger.log(f'Parsing {self.Path}', logging.DEBUG)
+                self.__data = tomllib.loads(self.__template.render(env_vars))
+                self.__rendered_key = key
+            else:
+                AppLogger.log(f'Reusing parsed {self.Path}, variables are unchanged', logging.DEBUG)
 
-        data: Dict[str, Any] = tomllib.loads(env_vars.replace_vars(self.Source))
+            data = self.__data
 
         # Request section must be there
         if "request" not in data:
@@ -214,33 +458,11 @@ def test_case(test_name):
 
         AppLogger.log(f'request.timeout = {self.Timeout}', logging.DEBUG)
 
-        # Get the auth
-        if "auth" in data:
-            if "basic" in data["auth"]:
-                if "username" in data["auth"]["basic"] and "password" in data["auth"]["basic"]:
-                    self.Auth = HTTPBasicAuth(
-                        data["auth"]["basic"]["username"],
-                        data["auth"]["basic"]["password"]
-                    )
-                else:
-                    AppLogger.log("Basic auth should have username and password", logging.WARNING)
-            elif "digest" in data["auth"]:
-                if "username" in data["auth"]["digest"] and "password" in data["auth"]["digest"]:
-                    self.Auth = HTTPDigestAuth(
-                        data["auth"]["digest"]["username"],
-                        data["auth"]["digest"]["password"]
-                    )
-                else:
-                    AppLogger.log("Digest auth should have username and password", logging.WARNING)
-            else:
-                # Auth is not basic
-                AppLogger.log("Only basic and digest auth are supported as of now", logging.WARNING)
-
         self.MaxRedirects = data["request"].get("max_redirects")
         if self.MaxRedirects is None:
             AppLogger.log('max_redirects is not set in the "request" table, default ' +
-                          f'({requests.models.DEFAULT_REDIRECT_LIMIT}) will be used', logging.DEBUG)
-            self.MaxRedirects = requests.models.DEFAULT_REDIRECT_LIMIT
+                          f'({self.DEFAULT_MAX_REDIRECTS}) will be used', logging.DEBUG)
+            self.MaxRedirects = self.DEFAULT_MAX_REDIRECTS
 
         AppLogger.log(f'request.max_redirects = {self.MaxRedirects}', logging.DEBUG)
 
@@ -255,52 +477,54 @@ def test_case(test_name):
         self.Session = data["request"].get("session")
         AppLogger.log(f'request.session = {str(self.Session).lower()}', logging.DEBUG)
 
-        if "headers" in data:
-            for header in data["headers"]:
-                # Make the header name Pascal-Case. They are case-insensitive,
-                # but it is common to have them in Pascal-Case.
-                header_name = header.replace("-", " ").title().replace(" ", "-")
-                self.Headers[header_name] = data["headers"][header]
-                AppLogger.log(f'header: "{header_name}" = "{self.Headers[header_name]}"', logging.DEBUG)
-
-        if "body" in data:
-
-            if "type" not in data["body"]:
-                raise ValueError('"body.type" is missing')
-
-            self.Body.Type = self.BodyType(data["body"]["type"].lower())
-            AppLogger.log(f'body.type = "{self.Body.Type.name}"', logging.DEBUG)
-
-            if self.Body.Type == self.BodyType.TEXT:
-                if "text" not in data["body"]:
-                    AppLogger.log('"text" is missing in the "body" table, although "type" is set to "text"',
-                                  logging.WARNING)
-                    self.Body.Text = ''
-                else:
-                    self.Body.Text = data["body"]["text"]
-                    AppLogger.log(f'body.text = "{self.Body.Text}"', logging.DEBUG)
-            elif self.Body.Type == self.BodyType.MULTIPART:
-                multipart_keys = sorted(list(filter(lambda s: "multipart" in s, data.keys())))
-                self.Body.Multipart = []
-                for key in multipart_keys:
-                    multipart_entry = HttpRequest.MultipartField()
-                    if "name" not in data[key]:
-                        raise KeyError(f'"name" is missing in section "{key}", file {self.Path}')
-                    multipart_entry.Name = data[key]["name"]
-                    if "data" in data[key]:
-                        multipart_entry.Data = data[key]["data"]
-                    if "filename" in data[key]:
-                        multipart_entry.FileName = data[key]["filename"]
-                        # if "data" entry is not present then a real file will be sent
-                        if multipart_entry.Data is None:
-                            # Calculate absolute path to the file if needed
-                            if not os.path.isabs(multipart_entry.FileName):
-                                multipart_entry.FileName = \
-                                    os.path.join(os.path.dirname(self.FullPath),multipart_entry.FileName)
-                    self.Body.Multipart.append(multipart_entry)
+        self.Stream = data["request"].get("stream", False)
+        self.MaxBuffer = data["request"].get("max_buffer", self.DEFAULT_MAX_BUFFER)
+        self.Spool = data["request"].get("spool", True)
+        self.Retry = data["request"].get("retry", {})
+
+        # Saved and discarded bodies are always streamed
+        response = data.get("response", {})
+        self.SaveTo = response.get("save_to")
+        if self.SaveTo is not None and not os.path.isabs(self.SaveTo):
+            self.SaveTo = os.path.join(os.path.dirname(self.FullPath), self.SaveTo)
+        self.Discard = response.get("discard", False) is True
+        if self.SaveTo is not None and self.Discard:
+            raise ValueError('"save_to" and "discard" can\'t be used together in the "response" table')
+        self.Checksum = response.get("checksum", "sha256").lower()
+        if self.Checksum not in hashlib.algorithms_available:
+            raise ValueError(f'Unsupported checksum algorithm "{self.Checksum}" in the "response" table')
+        if self.SaveTo is not None or self.Discard:
+            self.Stream = True
+            AppLogger.log(f'response.save_to = "{self.SaveTo}", discard = {str(self.Discard).lower()}',
+                          logging.DEBUG)
+
+        if self.Stream:
+            AppLogger.log(f'request.stream = true, max_buffer = {self.MaxBuffer}, ' +
+                          f'spool = {str(self.Spool).lower()}', logging.DEBUG)
+
+        # Auth, headers and body are rebuilt only if their tables have changed
+        if self.__changed(data, lambda key: key == "auth"):
+            self.__auth = self.__load_auth(data)
+        self.Auth = self.__auth
+
+        if self.__changed(data, lambda key: key == "headers"):
+            self.__headers = self.__load_headers(data)
+        # Scripts and the runner may add headers, the cached ones must stay intact
+        self.Headers = dict(self.__headers)
+
+        if self.__changed(data, lambda key: key == "body" or "multipart" in key):
+            self.__body = self.__load_body(data)
+        # The same goes for the body, the cached one is shared by all rows and runs
+        self.Body = self.__body.copy()
 
         if "scripts" in data:
             if "pre-request" in data["scripts"]:
                 self.PreRequestScript = self.__wrap_user_script(data["scripts"]["pre-request"])
             if "post-request" in data["scripts"]:
                 self.PostRequestScript = self.__wrap_user_script(data["scripts"]["post-request"])
+            self.ScriptsOrdered = data["scripts"].get("ordered")
+            if self.ScriptsOrdered is not None and not isinstance(self.ScriptsOrdered, bool):
+                raise ValueError(f'"ordered" in the "scripts" table should be true or false, ' +
+                                 f'found {self.ScriptsOrdered}')
+
+        self.__tables = data
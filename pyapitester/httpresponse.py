@@ -1,4 +1,123 @@
-from typing import Dict, Optional, Union
+import hashlib
+import importlib
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union, IO
+
+from pyapitester.helpers import AppLogger
+
+
+class ResponseBody:
+    """
+    Response body received in the streaming mode
+
+    The body is consumed in chunks, size and checksum are calculated on the fly.
+    Up to MaxBuffer bytes are kept in memory, the rest is either spooled
+    to a temporary file or discarded. If SaveTo is set, the whole body is written to that file instead.
+    """
+
+    CHUNK_SIZE: int = 64 * 1024
+
+    Size: int
+    """Body size, bytes"""
+
+    MaxBuffer: int
+    """Maximum number of bytes kept in memory"""
+
+    Spool: bool
+    """Spool the body to a temporary file if it doesn't fit into the buffer, otherwise discard the rest"""
+
+    SaveTo: Optional[str]
+    """File, that keeps the whole body after the response is processed"""
+
+    __file: IO[bytes]
+    __hash: 'hashlib._Hash'
+
+    def __init__(self, max_buffer: int, spool: bool = True, save_to: Optional[str] = None,
+                 checksum: str = "sha256"):
+        """
+        :param max_buffer: Maximum number of bytes kept in memory, zero discards the whole body if not spooled
+        :param spool: Spool the rest of the body to a temporary file
+        :param save_to: Write the body to this file, max_buffer and spool are ignored
+        :param checksum: Checksum algorithm, any algorithm supported by hashlib
+        """
+        self.Size = 0
+        self.MaxBuffer = max_buffer
+        self.Spool = spool
+        self.SaveTo = save_to
+        if save_to is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(save_to)), exist_ok=True)
+            self.__file = open(save_to, "w+b")
+        elif spool:
+            self.__file = tempfile.SpooledTemporaryFile(max_size=max_buffer)
+        else:
+            self.__file = io.BytesIO()
+        self.__hash = hashlib.new(checksum)
+
+    def write(self, chunk: bytes):
+        self.__hash.update(chunk)
+        if self.Spool or self.SaveTo is not None:
+            self.__file.write(chunk)
+        elif self.Size < self.MaxBuffer:
+            self.__file.write(chunk[:self.MaxBuffer - self.Size])
+        self.Size += len(chunk)
+
+    @property
+    def Checksum(self) -> str:
+        """Checksum of the whole body, hex string"""
+        return self.__hash.hexdigest()
+
+    @property
+    def Sha256(self) -> Optional[str]:
+        """SHA-256 digest of the whole body, hex string. None if another checksum algorithm is used"""
+        return self.__hash.hexdigest() if self.__hash.name == "sha256" else None
+
+    @property
+    def Complete(self) -> bool:
+        """True if all bytes of the body are available"""
+        return self.Spool or self.SaveTo is not None or self.Size <= self.MaxBuffer
+
+    @property
+    def InMemory(self) -> bool:
+        """True if the whole body is kept in memory"""
+        return self.Size <= self.MaxBuffer
+
+    def __iter__(self) -> Iterator[bytes]:
+        """
+        Iterate over the available body bytes in chunks, nothing is loaded at once
+        """
+        self.__file.seek(0)
+        while True:
+            chunk = self.__file.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    def iter_lines(self) -> Iterator[bytes]:
+        """
+        Iterate over the available body lines, without line endings
+        """
+        pending = b''
+        for chunk in self:
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            yield from lines
+        if pending:
+            yield pending
+
+    def read(self) -> bytes:
+        """
+        Read all available bytes at once
+        """
+        self.__file.seek(0)
+        return self.__file.read()
+
+    def close(self):
+        self.__file.close()
 
 
 class HttpResponse:
@@ -20,7 +139,8 @@ class HttpResponse:
     ExceptionDetails: Optional[str]
     """Exception details, None if there is no exception"""
 
-    Json: Optional[Dict]
+    Content: Optional[bytes]
+    """Raw body, not available in the streaming mode"""
 
     Result: bool
 
@@ -29,15 +149,163 @@ class HttpResponse:
 
     Size: int
 
+    Sha256: Optional[str]
+    """SHA-256 digest of the body, available only in the streaming mode"""
+
+    Checksum: Optional[str]
+    """Checksum of the body, see [response] checksum. Available only in the streaming mode"""
+
+    Throughput: float
+    """Download speed of the body, bytes/s"""
+
+    Body: Optional[ResponseBody]
+    """Streamed body, available only in the streaming mode"""
+
     Time: int
 
+    Attempts: int
+    """Number of times the request was sent, see the "retry" table"""
+
+    Wasted: float
+    """Time spent on failed attempts and waiting between them, ms"""
+
+    Hedged: bool
+    """A duplicate request was sent, because the first one was too slow"""
+
+    HedgeWon: bool
+    """The duplicate request answered first"""
+
+    TestsFailed: int
+    """Number of failed test cases of the post-request script"""
+
+    Timings: Dict[str, float]
+    """Duration of every processing phase, ms, see Timings.PHASES. Phases, that didn't happen, are missing"""
+
+    JSON_LIBRARIES: List[str] = ["orjson", "ujson"]
+    """Fast JSON libraries, used in this order if installed"""
+
+    JsonDecoder: Callable[[Union[bytes, str]], Any] = json.loads
+    """Function used to decode JSON responses"""
+
+    __NOT_DECODED = object()
+
+    __json: Any
+
     def __init__(self):
         self.Headers = {}
         self.Status = 0
         self.Exception = None
         self.ExceptionDetails = None
         self.Size = 0
-        self.Json = None
+        self.Sha256 = None
+        self.Checksum = None
+        self.Throughput = 0.0
+        self.Body = None
+        self.Content = None
+        self.__json = self.__NOT_DECODED
         self.Time = 0
+        self.Attempts = 1
+        self.Wasted = 0.0
+        self.Hedged = False
+        self.HedgeWon = False
+        self.TestsFailed = 0
+        self.Timings = {}
         self.Result = True
         self.ResultValue = ''
+
+    def clear(self):
+        """
+        Forget the response of a failed attempt, before the request is sent again
+        """
+        if self.Body is not None:
+            self.Body.close()
+        self.Headers = {}
+        self.Status = 0
+        self.Exception = None
+        self.ExceptionDetails = None
+        self.Size = 0
+        self.Sha256 = None
+        self.Checksum = None
+        self.Throughput = 0.0
+        self.Body = None
+        self.Content = None
+        self.__json = self.__NOT_DECODED
+        self.Time = 0
+
+    @staticmethod
+    def register_json_decoder(decoder: Callable[[Union[bytes, str]], Any]):
+        """
+        Use another function to decode JSON responses, e.g. from a faster library
+
+        :param decoder: Function, that accepts bytes and returns decoded data
+        """
+        HttpResponse.JsonDecoder = decoder
+
+    @staticmethod
+    def use_json_library(name: str) -> bool:
+        """
+        Use the JSON library by name
+
+        :param name: Library name, "json", one of JSON_LIBRARIES or "auto" for the first installed one
+        :return: False if the library is not installed
+        """
+        names = HttpResponse.JSON_LIBRARIES if name == "auto" else [name]
+        for library_name in names:
+            try:
+                library = importlib.import_module(library_name)
+            except ImportError:
+                continue
+            HttpResponse.register_json_decoder(library.loads)
+            return True
+
+        HttpResponse.register_json_decoder(json.loads)
+        return name in ("auto", "json")
+
+    @property
+    def Json(self) -> Optional[Any]:
+        """
+        Response body decoded as JSON, None if it is not JSON
+
+        The body is decoded on the first access, only if Content-Type
+        is missing or mentions JSON
+        """
+        if self.__json is self.__NOT_DECODED:
+            start = time.perf_counter()
+            self.__json = self.__decode_json()
+            self.Timings["json"] = (time.perf_counter() - start) * 1000
+        return self.__json
+
+    @Json.setter
+    def Json(self, value: Optional[Any]):
+        self.__json = value
+
+    def __decode_json(self) -> Optional[Any]:
+        content_type = self.Headers.get("Content-Type")
+        if content_type is not None and "json" not in content_type.lower():
+            return None
+
+        content = self.Content
+        if content is None and self.Body is not None and self.Body.InMemory:
+            content = self.Body.read()
+        if not content:
+            return None
+
+        # Fast libraries may reject valid documents, e.g. with very big numbers
+        for decoder in dict.fromkeys([HttpResponse.JsonDecoder, json.loads]):
+            # noinspection PyBroadException
+            try:
+                return decoder(content)
+            except Exception:
+                pass
+
+        AppLogger.log("Couldn't parse the response as JSON", logging.DEBUG)
+        return None
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Get all response fields, e.g. for debugging
+        """
+        fields = {key: value for key, value in self.__dict__.items()
+                  if not key.startswith("_") and key != "Content"}
+        fields["Json"] = self.Json
+        return fields
@@ -0,0 +1,256 @@
+import copy
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, Optional
+
+from pyapitester.helpers import AppLogger
+from pyapitester.httprequest import HttpRequest
+from pyapitester.runner import Runner
+from pyapitester.transport import Transport, TransportSession
+
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram
+
+    Every power of two is split into SUB_BUCKETS buckets, so the relative
+    error of any percentile is below 1/SUB_BUCKETS. Memory usage doesn't
+    depend on the number of samples, histograms are merged by adding buckets.
+    """
+
+    SUB_BUCKETS: int = 64
+
+    Count: int
+    """Number of samples"""
+
+    Min: float
+    """Minimal value, ms"""
+
+    Max: float
+    """Maximal value, ms"""
+
+    Sum: float
+    """Sum of all values, ms"""
+
+    __buckets: Dict[int, int]
+
+    def __init__(self):
+        self.Count = 0
+        self.Min = math.inf
+        self.Max = 0.0
+        self.Sum = 0.0
+        self.__buckets = {}
+
+    @staticmethod
+    def __index(value: float) -> int:
+        # Values are bucketed in microseconds, everything below 1 us is one bucket
+        mantissa, exponent = math.frexp(max(value * 1000, 1.0))
+        return exponent * LatencyHistogram.SUB_BUCKETS + \
+            int((mantissa - 0.5) * 2 * LatencyHistogram.SUB_BUCKETS)
+
+    @staticmethod
+    def __value(index: int) -> float:
+        # Middle of the bucket, ms
+        exponent, sub_bucket = divmod(index, LatencyHistogram.SUB_BUCKETS)
+        mantissa = 0.5 + (sub_bucket + 0.5) / (2 * LatencyHistogram.SUB_BUCKETS)
+        return math.ldexp(mantissa, exponent) / 1000
+
+    def record(self, value: float):
+        """
+        Add one sample
+
+        :param value: Latency, ms
+        """
+        index = self.__index(value)
+        self.__buckets[index] = self.__buckets.get(index, 0) + 1
+        self.Count += 1
+        self.Sum += value
+        self.Min = min(self.Min, value)
+        self.Max = max(self.Max, value)
+
+    def merge(self, other: 'LatencyHistogram'):
+        """
+        Add all samples of another histogram to this one
+        """
+        for index, count in other.__buckets.items():
+            self.__buckets[index] = self.__buckets.get(index, 0) + count
+        self.Count += other.Count
+        self.Sum += other.Sum
+        self.Min = min(self.Min, other.Min)
+        self.Max = max(self.Max, other.Max)
+
+    def percentile(self, percent: float) -> float:
+        """
+        Get the value below which the given percentage of samples falls
+
+        :param percent: Percentile, 0..100
+        :return: Latency, ms. Zero if there are no samples
+        """
+        if self.Count == 0:
+            return 0.0
+
+        rank = max(math.ceil(percent / 100 * self.Count), 1)
+        seen = 0
+        for index in sorted(self.__buckets):
+            seen += self.__buckets[index]
+            if seen >= rank:
+                return min(max(self.__value(index), self.Min), self.Max)
+        return self.Max
+
+    @property
+    def Mean(self) -> float:
+        return self.Sum / self.Count if self.Count > 0 else 0.0
+
+
+class LoadStats:
+    """
+    Latency and error statistics of one request
+    """
+
+    Latency: LatencyHistogram
+    """Latency of every request, ms"""
+    Errors: int
+    """Failed requests, including failed tests and exceptions"""
+    Exception: Optional[str]
+    """The first exception raised while running the request, if any"""
+
+    def __init__(self):
+        self.Latency = LatencyHistogram()
+        self.Errors = 0
+        self.Exception = None
+
+    def merge(self, other: 'LoadStats'):
+        self.Latency.merge(other.Latency)
+        self.Errors += other.Errors
+        if self.Exception is None:
+            self.Exception = other.Exception
+
+
+class LoadGenerator:
+    """
+    Replays all requests of the runner at the given concurrency
+
+    One iteration is one pass through all requests in their normal order.
+    Every worker runs its own iterations with its own sessions.
+    """
+
+    runner: Runner
+    concurrency: int
+    iterations: Optional[int]
+    """Number of iterations to run, unlimited if None"""
+    duration: Optional[float]
+    """Time limit, seconds, unlimited if None"""
+
+    __lock: threading.Lock
+    __started: int
+    __deadline: Optional[float]
+    __stats: Dict[str, LoadStats]
+
+    def __init__(self, runner: Runner, concurrency: int = 1,
+                 iterations: Optional[int] = None, duration: Optional[float] = None):
+        if iterations is None and duration is None:
+            raise ValueError('Either the number of iterations or the duration should be set')
+        self.runner = runner
+        self.concurrency = concurrency
+        self.iterations = iterations
+        self.duration = duration
+        self.__lock = threading.Lock()
+
+    def __next_iteration(self) -> bool:
+        with self.__lock:
+            if self.iterations is not None and self.__started >= self.iterations:
+                return False
+            if self.__deadline is not None and time.perf_counter() >= self.__deadline:
+                return False
+            self.__started += 1
+            return True
+
+    def __worker(self):
+        # Requests are modified while being prepared, every worker needs its own copies
+        chain: List[HttpRequest] = [copy.copy(req) for req in self.runner.requests]
+        stats: Dict[str, LoadStats] = {req.Path: LoadStats() for req in chain}
+
+        try:
+            while self.__next_iteration():
+                sessions: Dict[str, TransportSession] = {}
+                try:
+                    for req in chain:
+                        self.__run_request(req, sessions, stats[req.Path])
+                finally:
+                    for session in sessions.values():
+                        session.close()
+        finally:
+            # Whatever has happened, the requests done so far are counted
+            with self.__lock:
+                for path, request_stats in stats.items():
+                    self.__stats[path].merge(request_stats)
+
+    def __run_request(self, req: HttpRequest, sessions: Dict[str, TransportSession], stats: LoadStats):
+        AppLogger.group_start()
+        start = time.perf_counter()
+        try:
+            res = self.runner.run_request(req, sessions)
+            if not res.Result or res.TestsFailed > 0:
+                stats.Errors += 1
+        except Exception as ex:
+            # E.g. a post-request script has raised, the output of the request is dropped anyway
+            stats.Errors += 1
+            if stats.Exception is None:
+                stats.Exception = f'{Transport.exception_name(ex)}: {ex}'
+        finally:
+            AppLogger.group_end(discard=True)
+            stats.Latency.record((time.perf_counter() - start) * 1000)
+
+    def run(self):
+        self.__started = 0
+        self.__stats = {req.Path: LoadStats() for req in self.runner.requests}
+
+        start = time.perf_counter()
+        self.__deadline = start + self.duration if self.duration is not None else None
+
+        workers = [threading.Thread(target=self.__worker) for _ in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        elapsed = time.perf_counter() - start
+        self.runner.stop_hedging()
+        self.runner.transport.close()
+
+        self.__log_summary(elapsed)
+
+    @staticmethod
+    def __format_latency(latency: LatencyHistogram) -> str:
+        return f'p50: {latency.percentile(50):.1f}, ' + \
+            f'p90: {latency.percentile(90):.1f}, ' + \
+            f'p99: {latency.percentile(99):.1f}, ' + \
+            f'max: {latency.Max:.1f}'
+
+    def __log_summary(self, elapsed: float):
+        total = LoadStats()
+        for request_stats in self.__stats.values():
+            total.merge(request_stats)
+
+        requests_total = total.Latency.Count
+        error_rate = total.Errors / requests_total * 100 if requests_total > 0 else 0.0
+        throughput = requests_total / elapsed if elapsed > 0 else 0.0
+
+        logging.log(logging.INFO, f'\n{AppLogger.Colors.OKCYAN}Load summary:{AppLogger.Colors.ENDC}')
+        AppLogger.log(f'Iterations: {self.__started}, concurrency: {self.concurrency}, ' +
+                      f'duration: {elapsed:.2f} s')
+        AppLogger.log(f'Requests: {requests_total}, errors: {total.Errors} ({error_rate:.2f}%), ' +
+                      f'throughput: {throughput:.1f} req/s')
+        AppLogger.log(f'Latency, ms: {self.__format_latency(total.Latency)}')
+
+        if len(self.__stats) > 1:
+            for path, request_stats in self.__stats.items():
+                AppLogger.log(f'{path}: {request_stats.Latency.Count} requests, ' +
+                              f'errors: {request_stats.Errors}, ' +
+                              f'latency, ms: {self.__format_latency(request_stats.Latency)}')
+
+        for path, request_stats in self.__stats.items():
+            if request_stats.Exception is not None:
+                AppLogger.log(f'{path} raised {request_stats.Exception}', logging.WARNING)
@@ -0,0 +1,92 @@
+import os
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+from pyapitester.httprequest import HttpRequest
+
+
+class MultipartEncoder(object):
+    """
+    Streaming multipart/form-data body
+
+    File parts are read in chunks while the body is sent, so the memory usage doesn't depend on the file size.
+    The length is calculated up front from the file sizes, so the body is sent with Content-Length.
+    Iterating over iter(encoder) instead of the encoder itself sends the body with chunked transfer encoding.
+    The body can be iterated again, e.g. after a redirect.
+    """
+
+    CHUNK_SIZE: int = 256 * 1024
+    """File parts are read in chunks of this size"""
+
+    Boundary: str
+    ContentType: str
+    """Value of the Content-Type header"""
+
+    __parts: List[Tuple[bytes, Union[bytes, str], int]]
+    """Part header, part content (inline data or file name) and content length"""
+    __file: Optional[BinaryIO]
+    """File of the part being sent, if any"""
+
+    def __init__(self, fields: List[HttpRequest.MultipartField], boundary: Optional[str] = None):
+        """
+        :param fields: Multipart fields of the request. Fields without both data and file name are skipped
+        :param boundary: Random if not set
+        :raises OSError: If any file doesn't exist
+        """
+        self.Boundary = boundary or os.urandom(16).hex()
+        self.ContentType = f'multipart/form-data; boundary={self.Boundary}'
+        self.__file = None
+        self.__parts = []
+        for field in fields:
+            if field.FileName and not field.Data:
+                # Real file, only its size is known in advance
+                self.__parts.append((self.__header(field.Name, os.path.basename(field.FileName)),
+                                     field.FileName, os.path.getsize(field.FileName)))
+            elif field.Data:
+                data = field.Data.encode()
+                filename = os.path.basename(field.FileName) if field.FileName else None
+                self.__parts.append((self.__header(field.Name, filename), data, len(data)))
+
+    @staticmethod
+    def __quote(value: str) -> str:
+        # Same as the HTML5 form submission and urllib3
+        return value.replace('\\', '\\\\').replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+
+    def __header(self, name: str, filename: Optional[str]) -> bytes:
+        disposition = f'form-data; name="{self.__quote(name)}"'
+        if filename is not None:
+            disposition += f'; filename="{self.__quote(filename)}"'
+        return f'--{self.Boundary}\r\nContent-Disposition: {disposition}\r\n\r\n'.encode()
+
+    def __len__(self) -> int:
+        return sum(len(header) + length + 2 for header, _, length in self.__parts) + len(self.Boundary) + 6
+
+    def __iter__(self) -> Iterator[bytes]:
+        for header, content, length in self.__parts:
+            yield header
+            if isinstance(content, bytes):
+                yield content
+            else:
+                yield from self.__read(content, length)
+            yield b'\r\n'
+        yield f'--{self.Boundary}--\r\n'.encode()
+
+    def __read(self, filename: str, length: int) -> Iterator[bytes]:
+        # Exactly "length" bytes are sent, the Content-Length is already known
+        self.__file = open(filename, 'rb')
+        try:
+            while length > 0:
+                chunk = self.__file.read(min(length, self.CHUNK_SIZE))
+                if not chunk:
+                    raise OSError(f'File "{filename}" was truncated while sending')
+                length -= len(chunk)
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Close the file being sent, e.g. if sending has failed in the middle
+        """
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
@@ -0,0 +1,81 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, List, Optional, Tuple
+
+from pyapitester.helpers import AppLogger
+
+LogEntries = List[Tuple[int, str]]
+"""Level and message pairs, see AppLogger.group_detach()"""
+
+
+class ScriptPipeline(object):
+    """
+    Post-request scripts of one chain, executed on the worker pool while the chain sends the next requests,
+    see --script-workers
+
+    Only scripts, that don't change the shared state, are submitted here. The output of every request
+    is printed after its script has finished, in the order of the requests.
+    """
+
+    __executor: ThreadPoolExecutor
+    __limit: int
+    """Maximum number of unfinished scripts, the chain waits for the oldest one if there are more"""
+    __pending: Deque[Tuple[LogEntries, Optional[Future]]]
+    """Output of the requests, that is not printed yet, and their scripts"""
+    __submitted: Optional[Future]
+    """Script of the current request"""
+
+    def __init__(self, executor: ThreadPoolExecutor, limit: int):
+        self.__executor = executor
+        self.__limit = limit
+        self.__pending = deque()
+        self.__submitted = None
+
+    @staticmethod
+    def __execute(function: Callable[[], None]) -> Tuple[LogEntries, Optional[BaseException]]:
+        AppLogger.group_start()
+        try:
+            function()
+            return AppLogger.group_detach(), None
+        except BaseException as ex:
+            return AppLogger.group_detach(), ex
+
+    def submit(self, function: Callable[[], None]):
+        """
+        Execute the script of the current request on the worker pool, its output follows the request output
+        """
+        self.__submitted = self.__executor.submit(self.__execute, function)
+
+    def output(self, entries: LogEntries):
+        """
+        Add the output of the current request, it is printed after the script of the request
+
+        :raises Exception: An exception of a finished script, as if it was executed in place
+        """
+        self.__pending.append((entries, self.__submitted))
+        self.__submitted = None
+        self.__flush(self.__limit)
+
+    def drain(self):
+        """
+        Wait for all submitted scripts and print their output, e.g. before a script that changes the variables
+
+        :raises Exception: An exception of a finished script, as if it was executed in place
+        """
+        self.__flush(0)
+
+    def __flush(self, limit: int):
+        """
+        Print the output of finished requests from the oldest one, wait until at most "limit" scripts are left
+        """
+        while self.__pending:
+            entries, future = self.__pending[0]
+            if future is not None and not future.done() and len(self.__pending) <= limit:
+                break
+            self.__pending.popleft()
+            AppLogger.group_print(entries)
+            if future is not None:
+                script_entries, error = future.result()
+                AppLogger.group_print(script_entries)
+                if error is not None:
+                    raise error
@@ -0,0 +1,248 @@
+import datetime
+import json
+import os
+import queue
+import threading
+import xml.etree.ElementTree as ElementTree
+from typing import Any, Dict, List, Optional
+
+
+class Reporter(object):
+    """
+    Consumer of the structured event stream
+
+    Every event is a dictionary with the "event" key:
+        run_start - {"time"}
+        test_case - {"request", "name", "function", "passed", "error"}
+        request   - {"path", "row", "method", "url", "passed", "result", "exception", "details", "time", "size",
+                     "attempts", "hedged", "wasted", "timings"}, "row" is the dataset row index or None
+        request_skipped - {"path", "reason"}
+        run_end   - {"time", "duration", "requests", "requests_failed", "tests", "tests_failed", "state"}
+    "state" is AppState.as_dict() at the end of the run.
+    Test case events of a request always come before its request event.
+    All methods are called from the reporting thread only.
+    """
+
+    def handle(self, event: Dict[str, Any]):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonLinesReporter(Reporter):
+    """
+    Writes every event as a JSON object on its own line
+    """
+
+    __file: Any
+
+    def __init__(self, filename: str):
+        self.__file = open(filename, "w")
+
+    def handle(self, event: Dict[str, Any]):
+        self.__file.write(json.dumps(event, default=str) + "\n")
+
+    def close(self):
+        self.__file.close()
+
+
+class JUnitReporter(Reporter):
+    """
+    Writes a JUnit XML report when the run is finished
+
+    Every folder is a test suite. Every request is a test case,
+    test cases of its scripts follow it with the request path as a class name.
+    """
+
+    __filename: str
+    __suites: Dict[str, List[ElementTree.Element]]
+    __test_cases: Dict[str, List[Dict[str, Any]]]
+    """Test case events waiting for their request event"""
+    __start_time: Optional[str]
+
+    def __init__(self, filename: str):
+        self.__filename = filename
+        self.__suites = {}
+        self.__test_cases = {}
+        self.__start_time = None
+
+    def handle(self, event: Dict[str, Any]):
+        if event["event"] == "run_start":
+            self.__start_time = event["time"]
+        elif event["event"] == "test_case":
+            self.__test_cases.setdefault(event["request"], []).append(event)
+        elif event["event"] == "request":
+            self.__add_request(event)
+        elif event["event"] == "request_skipped":
+            folder = os.path.dirname(event["path"]) or "."
+            case = ElementTree.Element("testcase", {
+                "classname": folder,
+                "name": os.path.basename(event["path"]),
+                "file": event["path"],
+                "time": "0.000"
+            })
+            ElementTree.SubElement(case, "skipped", {"message": event["reason"]})
+            self.__suites.setdefault(folder, []).append(case)
+
+    def __add_request(self, event: Dict[str, Any]):
+        folder = os.path.dirname(event["path"]) or "."
+        cases = self.__suites.setdefault(folder, [])
+
+        name = os.path.basename(event["path"])
+        if event.get("row") is not None:
+            name += f' [row {event["row"]}]'
+        case = ElementTree.Element("testcase", {
+            "classname": folder,
+            "name": name,
+            "file": event["path"],
+            "time": f'{event["timings"].get("total", 0.0) / 1000:.3f}'
+        })
+        if not event["passed"]:
+            failure = ElementTree.SubElement(case, "failure", {"message": str(event["result"])})
+            failure.text = event["details"]
+        cases.append(case)
+
+        for test_case in self.__test_cases.pop(event["path"], []):
+            case = ElementTree.Element("testcase", {
+                "classname": event["path"],
+                "name": test_case["name"],
+                "time": "0.000"
+            })
+            if not test_case["passed"]:
+                failure = ElementTree.SubElement(case, "failure", {"message": test_case["error"] or ""})
+                failure.text = test_case["error"]
+            cases.append(case)
+
+    def close(self):
+        root = ElementTree.Element("testsuites")
+        total = failures = skipped = 0
+        for folder, cases in self.__suites.items():
+            suite_failures = sum(1 for case in cases if case.find("failure") is not None)
+            suite_skipped = sum(1 for case in cases if case.find("skipped") is not None)
+            suite = ElementTree.SubElement(root, "testsuite", {
+                "name": folder,
+                "tests": str(len(cases)),
+                "failures": str(suite_failures),
+                "errors": "0",
+                "skipped": str(suite_skipped)
+            })
+            if self.__start_time is not None:
+                suite.set("timestamp", self.__start_time)
+            suite.extend(cases)
+            total += len(cases)
+            failures += suite_failures
+            skipped += suite_skipped
+        root.set("tests", str(total))
+        root.set("failures", str(failures))
+        root.set("skipped", str(skipped))
+        ElementTree.ElementTree(root).write(self.__filename, encoding="utf-8", xml_declaration=True)
+
+
+class ResultsReporter(Reporter):
+    """
+    Writes all events to a JSON file, that can be merged with results of other shards, see Shards.merge()
+    """
+
+    VERSION: int = 1
+
+    __filename: str
+    __events: List[Dict[str, Any]]
+
+    def __init__(self, filename: str):
+        self.__filename = filename
+        self.__events = []
+
+    def handle(self, event: Dict[str, Any]):
+        self.__events.append(event)
+
+    def close(self):
+        with open(self.__filename, "w") as f:
+            json.dump({"version": ResultsReporter.VERSION, "events": self.__events}, f, default=str)
+
+    @staticmethod
+    def load(filename: str) -> List[Dict[str, Any]]:
+        """
+        Read events from the results file
+
+        :raises ValueError: If the file is not a results file
+        """
+        with open(filename, "r") as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get("version") != ResultsReporter.VERSION:
+            raise ValueError(f'Unsupported results file: "{filename}"')
+        return data["events"]
+
+
+class Reporters(object):
+    """
+    Structured event stream, delivered to all reporters on a background thread
+
+    If no reporters are added, emitting an event does nothing
+    """
+
+    REPORTERS: Dict[str, type] = {
+        "junit": JUnitReporter,
+        "jsonl": JsonLinesReporter,
+        "results": ResultsReporter
+    }
+    """File reporters by name, see --reporter"""
+
+    __reporters: List[Reporter] = []
+    __queue: Optional[queue.SimpleQueue] = None
+    __thread: Optional[threading.Thread] = None
+    __STOP = object()
+
+    @staticmethod
+    def add(reporter: Reporter):
+        """
+        Add the reporter and start the reporting thread if needed
+        """
+        Reporters.__reporters.append(reporter)
+        if Reporters.__thread is None:
+            Reporters.__queue = queue.SimpleQueue()
+            Reporters.__thread = threading.Thread(target=Reporters.__worker, name="Reporters", daemon=True)
+            Reporters.__thread.start()
+
+    @staticmethod
+    def enabled() -> bool:
+        return Reporters.__thread is not None
+
+    @staticmethod
+    def emit(event: str, **fields):
+        """
+        Send the event to all reporters, the caller never waits for the output
+
+        :param event: Event type, see Reporter
+        :param fields: Event fields, values should not be modified after the call
+        """
+        if Reporters.__queue is not None:
+            Reporters.__queue.put({"event": event, **fields})
+
+    @staticmethod
+    def now() -> str:
+        return datetime.datetime.now().astimezone().isoformat(timespec="seconds")
+
+    @staticmethod
+    def __worker():
+        while True:
+            event = Reporters.__queue.get()
+            if event is Reporters.__STOP:
+                break
+            for reporter in Reporters.__reporters:
+                reporter.handle(event)
+
+    @staticmethod
+    def close():
+        """
+        Deliver all pending events and close all reporters
+        """
+        if Reporters.__thread is None:
+            return
+        Reporters.__queue.put(Reporters.__STOP)
+        Reporters.__thread.join()
+        for reporter in Reporters.__reporters:
+            reporter.close()
+        Reporters.__reporters = []
+        Reporters.__queue = None
+        Reporters.__thread = None
@@ -0,0 +1,96 @@
+import random
+from typing import Any, Dict, List, Optional, Union
+
+from pyapitester.httprequest import HttpRequest
+
+
+class RetryPolicy(object):
+    """
+    When to send the request again, see the "retry" table
+
+    The global policy is set in the environment file, the [request.retry] table overrides it key by key.
+    By default a request is sent only once.
+    """
+
+    DEFAULT_STATUSES: List[int] = [429, 502, 503, 504]
+    """Retryable status codes, if not set"""
+
+    DEFAULT_EXCEPTIONS: List[str] = ["ConnectionError", "ConnectTimeout", "ReadTimeout", "ChunkedEncodingError"]
+    """Retryable exception names, if not set"""
+
+    HEDGE_METHODS: List[HttpRequest.HttpMethod] = [HttpRequest.HttpMethod.GET, HttpRequest.HttpMethod.HEAD,
+                                                   HttpRequest.HttpMethod.OPTIONS]
+    """Only safe requests are hedged, sending them twice changes nothing on the server"""
+
+    Attempts: int
+    """Maximum number of attempts, including the first one"""
+
+    Backoff: float
+    """Delay before the second attempt, ms. Doubled before every next attempt"""
+
+    MaxBackoff: float
+    """Maximum delay between attempts, ms"""
+
+    Jitter: bool
+    """Wait a random time between zero and the delay, so that retries of parallel requests are spread out"""
+
+    Statuses: List[int]
+    """Status codes, that are retried"""
+
+    Exceptions: List[str]
+    """Exception names, that are retried"""
+
+    Hedge: Optional[float]
+    """Send a duplicate request if there is no response after this time, ms. Disabled if None"""
+
+    def __init__(self, *tables: Optional[Dict[str, Any]]):
+        """
+        :param tables: "retry" tables, later tables override earlier ones. Missing tables are skipped
+        :raises ValueError: If any value is invalid
+        """
+        data: Dict[str, Any] = {}
+        for table in tables:
+            data.update(table or {})
+
+        self.Attempts = data.get("attempts", 1)
+        if not isinstance(self.Attempts, int) or self.Attempts < 1:
+            raise ValueError(f'"attempts" in the "retry" table should be at least 1, found {self.Attempts}')
+        self.Backoff = self.__number(data, "backoff", 100)
+        self.MaxBackoff = self.__number(data, "max_backoff", 10000)
+        self.Jitter = data.get("jitter", True) is True
+        self.Statuses = [int(status) for status in data.get("statuses", self.DEFAULT_STATUSES)]
+        self.Exceptions = [str(name) for name in data.get("exceptions", self.DEFAULT_EXCEPTIONS)]
+        self.Hedge = self.__number(data, "hedge", 0) if "hedge" in data else None
+
+    @staticmethod
+    def __number(data: Dict[str, Any], key: str, default: Any) -> Any:
+        value = data.get(key, default)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f'"{key}" in the "retry" table should be a non-negative number, found {value}')
+        return value
+
+    def retryable(self, result: Union[int, str]) -> bool:
+        """
+        Check if the attempt should be repeated
+
+        :param result: Status code or exception name of the attempt
+        """
+        if isinstance(result, str):
+            return result in self.Exceptions
+        return result in self.Statuses
+
+    def delay(self, attempt: int) -> float:
+        """
+        Get the delay after the failed attempt, seconds
+
+        :param attempt: Number of the failed attempt, starting from 1
+        """
+        delay = min(self.Backoff * 2 ** (attempt - 1), self.MaxBackoff) / 1000
+        return random.uniform(0, delay) if self.Jitter else delay
+
+    def hedged(self, req: HttpRequest) -> bool:
+        """
+        Check if a duplicate of the request may be sent
+        """
+        return self.Hedge is not None and req.Method in self.HEDGE_METHODS and \
+            req.Body.Type != HttpRequest.BodyType.MULTIPART
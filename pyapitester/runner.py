@@ -1,15 +1,26 @@
-import datetime
+import copy
 import logging
-import pprint
+import threading
+import time
 
-import requests
-from typing import List, Optional
+import heapq
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+from urllib.parse import urlsplit
+from pyapitester.dataset import Dataset
 from pyapitester.httprequest import HttpRequest
-from pyapitester.httpresponse import HttpResponse
-from pyapitester.helpers import AppLogger, Environment, AppState
+from pyapitester.httpresponse import HttpResponse, ResponseBody
+from pyapitester.helpers import AppLogger, EnvVars, EnvVarsOverlay, Environment, AppState, StartupTimer
+from pyapitester.multipart import MultipartEncoder
+from pyapitester.pipeline import ScriptPipeline
+from pyapitester.reporters import Reporters
+from pyapitester.retry import RetryPolicy
+from pyapitester.scheduler import RequestGraph
+from pyapitester.scripts import ScriptCache, ScriptEffects, ScriptNamespace
+from pyapitester.timings import Timings, TimingsExport
+from pyapitester.transport import Transport, TransportResponse, TransportSession
 import os
 import sys
-import json
 
 
 class Runner:
@@ -19,148 +30,663 @@ class Runner:
 
     requests: List[HttpRequest]
     env: Environment
+    jobs: int
+    """Number of folders processed at the same time"""
+    transport: Transport
+    """Connection pool shared by all requests"""
+    scripts: bool
+    """Pre- and post-request scripts are executed only if set"""
+    timings_export: Optional[TimingsExport]
+    """Timeline of every request is written here, if set"""
+    script_workers: int
+    """Number of threads for post-request scripts, that don't change the variables. Executed in place if zero"""
 
-    def __init__(self, env: Environment):
+    DATASET_FAILURES: int = 10
+    """Number of failed dataset rows listed in the output"""
+
+    WARMUP_JOBS: int = 16
+    """Number of hosts warmed up at the same time"""
+
+    __durations: Dict[int, float]
+    """Duration of every executed request by its index, ms. Used for the critical path"""
+    __script_executor: Optional[ThreadPoolExecutor] = None
+    """Worker pool for post-request scripts, shared by all chains of the run"""
+    __sessions_lock: threading.Lock
+    """Guards the sessions of a chain, dataset rows and graph nodes share them"""
+    __hedge_executor: Optional[ThreadPoolExecutor] = None
+    """Worker pool for hedged requests, created on the first hedged request and shut down at the end of the run"""
+    __hedge_lock: threading.Lock
+    """Guards the creation of the hedged requests pool"""
+
+    def __init__(self, env: Environment, jobs: int = 1, pool_size: int = 10, scripts: bool = True,
+                 timings_export: Optional[TimingsExport] = None, transport: str = "requests",
+                 script_workers: int = 0, record: Optional[str] = None, replay: Optional[str] = None,
+                 match_body: bool = False):
+        """
+        :param transport: Transport name, see Transport.NAMES
+        :param script_workers: Number of threads for post-request scripts, see --script-workers
+        :param record: Write all responses to this cassette file, see --record
+        :param replay: Serve all responses from this cassette file, nothing is sent. See --replay
+        :param match_body: Replay: match the request body as well, see --match-body
+        :raises OSError: If the cassette can't be opened
+        :raises ValueError: If the replayed cassette is invalid
+        """
         self.requests = []
         self.env = env
+        self.jobs = jobs
+        if replay is not None:
+            from pyapitester.cassette import ReplayTransport
+            self.transport = ReplayTransport(replay, match_body)
+        else:
+            self.transport = Transport.create(transport, pool_size)
+            if record is not None:
+                from pyapitester.cassette import RecordingTransport
+                self.transport = RecordingTransport(self.transport, record)
+        self.scripts = scripts
+        self.timings_export = timings_export
+        self.script_workers = script_workers
+        self.__sessions_lock = threading.Lock()
+        self.__hedge_lock = threading.Lock()
 
     def add_request(self, request: HttpRequest):
         self.requests.append(request)
 
-    def run(self):
-        # Always start without any session
-        session: Optional[requests.Session] = None
-        last_folder = ''
+    def warmup(self, connections: int = 1):
+        """
+        Resolve host names and open connections to every host of the collection ahead of time, see --warmup
 
+        URLs are rendered with the variables known before the run. If a host depends on variables set by scripts,
+        it may be missed, the request then opens its connection as usual.
+
+        :param connections: Number of connections per host, e.g. the number of requests running at the same time
+        """
+        start = time.perf_counter()
+        # Origin and connect timeout of every host
+        hosts: Dict[str, Optional[float]] = {}
         for req in self.requests:
+            # Warnings are printed again when the request runs
+            AppLogger.group_start()
+            try:
+                req.prepare(self.env.folder_vars(os.path.dirname(req.Path)))
+            except Exception:
+                continue
+            finally:
+                AppLogger.group_end(discard=True)
+            parts = urlsplit(req.Url)
+            if parts.scheme in ("http", "https") and parts.hostname:
+                hosts.setdefault(f'{parts.scheme}://{parts.netloc}/', req.Timeout)
+
+        def warm(url: str) -> int:
+            try:
+                return self.transport.warmup(url, connections, hosts[url])
+            except Exception as ex:
+                logging.debug(f'Warm-up of {url} failed: {ex}')
+                return -1
+
+        if not hosts:
+            return
+        with ThreadPoolExecutor(max_workers=min(len(hosts), self.WARMUP_JOBS)) as executor:
+            results = list(executor.map(warm, hosts))
+        AppLogger.log(f'{AppLogger.Colors.OKCYAN}Warm-up: {len(hosts)} hosts, ' +
+                      f'{sum(count for count in results if count > 0)} connections opened, ' +
+                      f'{results.count(-1)} hosts failed, {(time.perf_counter() - start) * 1000:.1f} ms' +
+                      f'{AppLogger.Colors.ENDC}')
+
+    def __folder_chains(self) -> List[List[HttpRequest]]:
+        """
+        Split requests into folder chains
+
+        Each chain keeps the original order of requests within one folder.
+        Chains are independent of each other, sessions never cross folders.
+        """
+        chains: Dict[str, List[HttpRequest]] = {}
+        for req in self.requests:
+            chains.setdefault(os.path.dirname(req.Path), []).append(req)
+        return list(chains.values())
+
+    def run(self, keep_alive: bool = False):
+        """
+        Run all requests and print the summary
+
+        :param keep_alive: Keep the connection pool open for the next run
+        """
+        start = time.perf_counter()
+        Reporters.emit("run_start", time=Reporters.now())
+
+        graph = RequestGraph(self.requests) if len(self.requests) > 1 else None
+        if graph is not None and graph.Declared and graph.Error is not None:
+            logging.error(f'{graph.Error}, the sorted order will be used')
+
+        try:
+            if graph is not None and graph.Declared and graph.Error is None:
+                # A request passes only with its tests, so its dependents have to wait for the post-request script.
+                # Scripts are executed in place, other ready requests already run on the rest of the workers
+                self.__run_graph(graph)
+            else:
+                if self.scripts and self.script_workers > 0:
+                    self.__script_executor = ThreadPoolExecutor(max_workers=self.script_workers)
+                try:
+                    if self.jobs > 1:
+                        chains = self.__folder_chains()
+                        with ThreadPoolExecutor(max_workers=min(self.jobs, len(chains))) as executor:
+                            # Every chain gets its own copy of the variables, chains don't see each other's changes
+                            layers = [self.env.isolated_layer() for _ in chains]
+                            # Consume the results to propagate exceptions from the workers
+                            list(executor.map(self.__run_chain, chains, layers))
+                    else:
+                        self.__run_chain(self.requests)
+                finally:
+                    if self.__script_executor is not None:
+                        self.__script_executor.shutdown()
+                        self.__script_executor = None
+        finally:
+            self.stop_hedging()
+
+        if not keep_alive:
+            self.transport.close()
+
+        Reporters.emit("run_end", time=Reporters.now(), duration=time.perf_counter() - start,
+                       requests=AppState.RequestsTotal, requests_failed=AppState.RequestsFailed,
+                       tests=AppState.TestsTotal, tests_failed=AppState.TestsFailed, state=AppState.as_dict())
+        AppLogger.log_summary()
+        if graph is not None and graph.Declared and graph.Error is None:
+            total, path = graph.critical_path(self.__durations)
+            if path:
+                AppLogger.log(f'Critical path, ms: {total:.1f}: ' +
+                              ' -> '.join(f'{self.requests[index].Path} ({self.__durations[index]:.1f})'
+                                          for index in path))
+
+    def __run_node(self, req: HttpRequest, sessions: Dict[str, TransportSession]) -> HttpResponse:
+        AppLogger.group_start()
+        try:
+            return self.run_request(req, sessions)
+        finally:
+            AppLogger.group_end()
+
+    def __run_graph(self, graph: RequestGraph):
+        """
+        Run every request as soon as all its dependencies have passed, up to "jobs" requests at once
+
+        Requests depending on a failed one are skipped
+        """
+        # Requests of one folder share a session only if the folder is chained
+        sessions: Dict[str, TransportSession] = {}
+        self.__durations = {}
+
+        waiting = [len(parents) for parents in graph.Parents]
+        ready = [index for index, count in enumerate(waiting) if count == 0]
+        heapq.heapify(ready)
+        skipped: Set[int] = set()
+        running: Dict[Future, int] = {}
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while ready or running:
+                while ready and len(running) < self.jobs:
+                    index = heapq.heappop(ready)
+                    running[executor.submit(self.__run_node, graph.Requests[index], sessions)] = index
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=lambda f: running[f]):
+                    index = running.pop(future)
+                    res = future.result()
+                    self.__durations[index] = res.Timings.get("total", 0.0)
+
+                    # Failed tests fail the request as well, skipped requests release their children
+                    finished = [(index, res.Result and res.TestsFailed == 0)]
+                    while finished:
+                        parent, passed = finished.pop()
+                        for child in sorted(graph.Children[parent]):
+                            if child in skipped:
+                                continue
+                            if not passed and parent in graph.Required[child]:
+                                skipped.add(child)
+                                self.__skip(graph.Requests[child], graph.Requests[parent])
+                                finished.append((child, False))
+                                continue
+                            waiting[child] -= 1
+                            if waiting[child] == 0:
+                                heapq.heappush(ready, child)
+
+        for session in sessions.values():
+            session.close()
+
+    @staticmethod
+    def __skip(req: HttpRequest, failed: HttpRequest):
+        AppState.add_skipped_request()
+        AppLogger.log_skipped(f'Skipping {req.Path}', f'{failed.Path} failed')
+        Reporters.emit("request_skipped", path=req.Path, reason=f'{failed.Path} failed')
+
+    def __run_chain(self, chain: List[HttpRequest], variables: Optional[Dict[str, Any]] = None):
+        # Always start without any session, there is one session per folder
+        sessions: Dict[str, TransportSession] = {}
+        pipeline: Optional[ScriptPipeline] = None
+        if self.__script_executor is not None:
+            # Every chain may run ahead of its scripts, up to one script per worker
+            pipeline = ScriptPipeline(self.__script_executor, self.script_workers)
+
+        for req in chain:
+            AppLogger.group_start()
+            try:
+                self.run_request(req, sessions, variables, pipeline)
+            finally:
+                if pipeline is None:
+                    AppLogger.group_end()
+                else:
+                    pipeline.output(AppLogger.group_detach())
+        if pipeline is not None:
+            pipeline.drain()
+
+        for session in sessions.values():
+            session.close()
+
+    def run_request(self, req: HttpRequest, sessions: Dict[str, TransportSession],
+                    variables: Optional[Dict[str, Any]] = None,
+                    pipeline: Optional[ScriptPipeline] = None) -> HttpResponse:
+        """
+        Prepare and send one request, execute its scripts
+
+        A request with a dataset is executed once per row
+
+        :param req: Request to run
+        :param sessions: Open sessions of the chain, one per folder. Updated in place.
+        :param variables: Variables set by scripts, see Environment.isolated_layer(). Shared by all requests if None
+        :param pipeline: Post-request scripts, that don't change the variables, are deferred here if set.
+                         The test results of a deferred script are not in the returned response yet
+        :return: Response object. For a dataset the result of all rows, without the response data
+        """
+        env_vars = self.env.folder_vars(os.path.dirname(req.Path), variables)
+        if req.Dataset is not None and req.Row is None:
+            return self.__run_dataset(req, sessions, env_vars)
+        return self.__run_once(req, sessions, env_vars, pipeline)
+
+    def __run_dataset(self, req: HttpRequest, sessions: Dict[str, TransportSession],
+                      env_vars: EnvVars) -> HttpResponse:
+        """
+        Run the request for every dataset row, up to req.DatasetJobs rows at once
+
+        The output of the rows is dropped, only failed rows are listed
+        """
+        result = HttpResponse()
+        start = time.perf_counter()
+        rows = failed = 0
+        failures: List[Tuple[int, str]] = []
+
+        def run_row(index: int, row: Dict[str, Any]) -> HttpResponse:
+            # Requests are modified while being prepared, every row needs its own copy
+            row_req = copy.copy(req)
+            row_req.Row = index
+            AppLogger.group_start()
+            try:
+                return self.__run_once(row_req, sessions, EnvVarsOverlay(env_vars, row))
+            finally:
+                AppLogger.group_end(discard=True)
+
+        def collect(futures: Set[Future]):
+            nonlocal failed
+            for future in futures:
+                index, res = running.pop(future), future.result()
+                if res.Result and res.TestsFailed == 0:
+                    continue
+                failed += 1
+                details = f'{res.ResultValue}' + (f', {res.ExceptionDetails}' if res.ExceptionDetails else '') + \
+                    (f', failed tests: {res.TestsFailed}' if res.TestsFailed else '')
+                failures.append((index, details))
+                if len(failures) > 2 * self.DATASET_FAILURES:
+                    failures.sort()
+                    del failures[self.DATASET_FAILURES:]
 
-            res = HttpResponse()
+        running: Dict[Future, int] = {}
+        try:
+            # Rows run on worker threads even one by one, every row has its own output group
+            with ThreadPoolExecutor(max_workers=req.DatasetJobs) as executor:
+                # Rows are read only when there is a free worker, the dataset is never loaded at once
+                for index, row in enumerate(Dataset(req.Dataset).rows()):
+                    if len(running) >= 2 * req.DatasetJobs:
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    running[executor.submit(run_row, index, row)] = index
+                    rows += 1
+                collect(wait(running).done)
+        except (OSError, ValueError) as ex:
+            collect(wait(running).done)
+            result.Exception = type(ex).__name__
+            result.ExceptionDetails = str(ex)
 
+        result.Result = failed == 0 and result.Exception is None
+        result.ResultValue = result.Exception or f'{rows} rows, failed: {failed}'
+        result.Timings["total"] = (time.perf_counter() - start) * 1000
+
+        AppLogger.log_header(result.Result, f'Processing {req.Path}', str(result.ResultValue))
+        if result.ExceptionDetails is not None:
+            AppLogger.log(message=result.ExceptionDetails, level=logging.ERROR)
+        failures.sort()
+        for index, details in failures[:self.DATASET_FAILURES]:
+            AppLogger.log(f'Row {index}: {details}', logging.WARNING)
+        if failed > self.DATASET_FAILURES:
+            AppLogger.log(f'... and {failed - self.DATASET_FAILURES} more failed rows', logging.WARNING)
+        return result
+
+    @staticmethod
+    def __retry(req: HttpRequest, policy: RetryPolicy, attempt: int, failure: Union[int, str]) -> bool:
+        """
+        Check if the request should be sent again after the attempt
+
+        Expected statuses and exceptions are never retried
+        """
+        expected = req.ExpectedStatuses is not None and failure in req.ExpectedStatuses
+        return attempt < policy.Attempts and policy.retryable(failure) and not expected
+
+    @staticmethod
+    def __request(req: HttpRequest, rq: TransportSession) -> TransportResponse:
+        """
+        Send the request, the body is not downloaded yet
+        """
+        encoder: Optional[MultipartEncoder] = None
+
+        headers = req.Headers
+        body = req.Body.Text
+        if req.Body.Type == HttpRequest.BodyType.MULTIPART:
+            for entry in req.Body.Multipart:
+                if not entry.Data and not entry.FileName:
+                    AppLogger.log(f'Neither "data" nor "filename" are specified for {req.Path}, section {entry.Name}')
+            # Files are streamed from the disk while sending
+            encoder = MultipartEncoder(req.Body.Multipart)
+            if not any(name.lower() == "content-type" for name in headers):
+                headers = {**headers, "Content-Type": encoder.ContentType}
+            body = iter(encoder) if req.Body.Chunked else encoder
+        elif req.Body.Chunked and body is not None:
+            body = iter([body.encode()])
+
+        try:
+            return rq.request(req.Method.value, req.Url, headers=headers, auth=req.Auth, data=body,
+                              timeout=req.Timeout)
+        finally:
+            if encoder is not None:
+                encoder.close()
+
+    def __hedging(self) -> ThreadPoolExecutor:
+        """
+        Worker pool for hedged requests, every request running at the same time may need two workers
+        """
+        with self.__hedge_lock:
+            if self.__hedge_executor is None:
+                dataset_jobs = max([req.DatasetJobs for req in self.requests], default=1)
+                self.__hedge_executor = ThreadPoolExecutor(max_workers=2 * self.jobs * dataset_jobs,
+                                                           thread_name_prefix="hedge")
+            return self.__hedge_executor
+
+    def stop_hedging(self):
+        """
+        Shut the worker pool for hedged requests down, it is created again by the next hedged request
+
+        Waits for the duplicate requests that have lost the race
+        """
+        with self.__hedge_lock:
+            if self.__hedge_executor is not None:
+                self.__hedge_executor.shutdown()
+                self.__hedge_executor = None
+
+    def __hedge(self, req: HttpRequest, rq: TransportSession, policy: RetryPolicy,
+                res: HttpResponse) -> TransportResponse:
+        """
+        Send the request and a duplicate one, if there is no response after policy.Hedge ms
+
+        The first response wins, the other one is closed as soon as it arrives
+        """
+        def send(timings: Dict[str, float]) -> TransportResponse:
+            # Both requests have their own timeline, only the winner's phases are added to res.Timings
+            Timings.start(timings)
             try:
-                req.prepare(self.env.env_vars)
+                return self.__request(req, rq)
+            finally:
+                Timings.stop()
+
+        def close(future: Future):
+            if future.exception() is None:
+                future.result().close()
+
+        executor = self.__hedging()
+        # Timeline of every request, the duplicate is the last one
+        running: Dict[Future, Dict[str, float]] = {}
+        timings: Dict[str, float] = {}
+        running[executor.submit(send, timings)] = timings
+        done, _ = wait(running, timeout=policy.Hedge / 1000)
+        if not done:
+            res.Hedged = True
+            timings = {}
+            running[executor.submit(send, timings)] = timings
+        futures = list(running)
+
+        error: Optional[BaseException] = None
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=futures.index):
+                timings = running.pop(future)
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                for pending in running:
+                    pending.add_done_callback(close)
+                for phase, duration in timings.items():
+                    Timings.add(phase, duration / 1000)
+                res.HedgeWon = futures.index(future) > 0
+                return future.result()
+        raise error
+
+    def __send(self, req: HttpRequest, rq: TransportSession, res: HttpResponse, policy: RetryPolicy):
+        """
+        Send one attempt of the request and download the response
+
+        :raises Exception: Any exception of the transport
+        """
+        if policy.hedged(req):
+            r = self.__hedge(req, rq, policy, res)
+        else:
+            r = self.__request(req, rq)
+
+        res.Status = r.Status
+        for k, v in r.Headers:
+            res.Headers[k.replace("-", " ").title().replace(" ", "-")] = v
+
+        download_start = time.perf_counter()
+        if req.Stream:
+            # The body is never loaded at once, only MaxBuffer bytes are kept in memory
+            if req.Discard:
+                res.Body = ResponseBody(0, spool=False, checksum=req.Checksum)
+            else:
+                res.Body = ResponseBody(req.MaxBuffer, req.Spool, save_to=req.SaveTo, checksum=req.Checksum)
+            for chunk in r.iter_content(ResponseBody.CHUNK_SIZE):
+                res.Body.write(chunk)
+            res.Size = res.Body.Size
+            res.Sha256 = res.Body.Sha256
+            res.Checksum = res.Body.Checksum
+        else:
+            res.Content = r.read()
+            res.Size = len(res.Content)
+        download_time = Timings.since("download", download_start) - download_start
+        res.Throughput = res.Size / download_time if download_time > 0 else 0.0
+
+        res.Time = round(r.Elapsed * 1000)
+
+    @staticmethod
+    def __ordered(req: HttpRequest, script: str) -> bool:
+        """
+        Check if the script should wait for all deferred scripts, see [scripts] ordered
+        """
+        if req.ScriptsOrdered is not None:
+            return req.ScriptsOrdered
+        # Declared variables, see [request] produces
+        return len(req.Produces) > 0 or ScriptEffects.mutates(script)
+
+    def __run_once(self, req: HttpRequest, sessions: Dict[str, TransportSession], env_vars: EnvVars,
+                   pipeline: Optional[ScriptPipeline] = None) -> HttpResponse:
+        res = HttpResponse()
+        # All layers add their phases to res.Timings
+        Timings.start(res.Timings)
+        start = timestamp = time.perf_counter()
 
-                AppLogger.buffering_start()
+        try:
+            req.prepare(env_vars)
+            timestamp = Timings.since("prepare", timestamp)
 
-                folder = os.path.dirname(req.Path)
+            AppLogger.buffering_start()
 
-                # Put our user-agent if missing
-                if "User-Agent" not in req.Headers:
-                    req.Headers["User-Agent"] = "PyApiTester/0.1"
+            folder = os.path.dirname(req.Path)
 
-                if len(req.PreRequestScript) > 0:
-                    AppLogger.log('Executing a pre-request script')
+            # Put our user-agent if missing
+            if "User-Agent" not in req.Headers:
+                req.Headers["User-Agent"] = "PyApiTester/0.1"
 
-                exec(req.PreRequestScript, {
-                    "req": req,
-                    "EnvVars": self.env.env_vars,
-                    "AppLogger": AppLogger,
-                    "AppState": AppState
-                }, None)
+            if self.scripts and len(req.PreRequestScript) > 0:
+                if pipeline is not None and self.__ordered(req, req.PreRequestScript):
+                    pipeline.drain()
+                AppLogger.log('Executing a pre-request script')
 
-                # If session is needed
+                exec(ScriptCache.compile(req.PreRequestScript, f'{req.Path} [pre-request]'),
+                     ScriptNamespace.create(req=req, EnvVars=env_vars), None)
+                timestamp = Timings.since("pre_script", timestamp)
+
+            # If session is needed
+            with self.__sessions_lock:
                 if req.Session:
                     # If session doesn't exist - initialize a new one
+                    session = sessions.get(folder)
                     if session is None:
-                        session = requests.Session()
-                    rq = session
+                        session = self.transport.session()
+                        sessions[folder] = session
                 else:
                     # Session is not needed, close if there is one
-                    if session is not None:
-                        session.close()
-                        session = None
-                    rq = requests.Session()
-
-                rq.max_redirects = req.MaxRedirects
-
-                if req.Body.Type == HttpRequest.BodyType.MULTIPART:
-                    multipart_fields = {}
-                    for entry in req.Body.Multipart:
-                        if entry.Data and not entry.FileName:
-                            multipart_fields[entry.Name] = (None, entry.Data)
-                        elif entry.FileName and not entry.Data:
-                            multipart_fields[entry.Name] = (os.path.basename(entry.FileName), open(entry.FileName, 'rb+'))
-                        elif entry.FileName and entry.Data:
-                            multipart_fields[entry.Name] = (os.path.basename(entry.FileName), entry.Data)
-                        else:
-                            AppLogger.log(f'Neither "data" nor "filename" are specified for {req.Path}, section {entry.Name}')
-                            continue
-                else:
-                    multipart_fields = None
-
-                r = rq.request(
-                    method=req.Method.value,
-                    url=req.Url,
-                    headers=req.Headers,
-                    auth=req.Auth,
-                    data=req.Body.Text,
-                    files=multipart_fields,
-                    timeout=req.Timeout,
-                    stream=True
-                )
-                res.Status = r.raw.status
-                for k, v in r.raw.headers.items():
-                    res.Headers[k.replace("-", " ").title().replace(" ", "-")] = v
-
-                res.Size = len(r.raw.data)
-
-                res.Time = round(r.elapsed / datetime.timedelta(milliseconds=1))
-
-                # Try to parse as JSON. If it doesn't parse - simply ignore
-                # noinspection PyBroadException
-                try:
-                    res.Json = json.loads(r.raw.data)
-                except Exception as ex:
-                    AppLogger.log("Couldn't parse the response as JSON", logging.DEBUG)
-                    pass
+                    session = sessions.pop(folder, None)
+            if req.Session:
+                rq = session
+            else:
+                # Closed outside of the lock, other rows and requests don't wait for it
+                if session is not None:
+                    session.close()
+                # A fresh session has no cookies, but reuses pooled connections
+                rq = self.transport.session()
 
-            except Exception as ex:
-                res.Exception = type(ex).__name__
-                res.ExceptionDetails = str(sys.exc_info()[1])
-
-            # Go through expected statuses to check if response is OK
-            # TODO: By default the response is considered to be OK
-            if req.ExpectedStatuses is not None:
-                if res.Exception is not None:
-                    if res.Exception not in req.ExpectedStatuses:
-                        res.Result = False
-                        res.ResultValue = res.Exception
-                    else:
-                        res.ResultValue = res.Exception
-                else:
-                    if res.Status not in req.ExpectedStatuses:
-                        res.Result = False
-                        res.ResultValue = res.Status
+            try:
+                rq.MaxRedirects = req.MaxRedirects
+                rq.Origin = req.Path
+                policy = RetryPolicy(self.env.Retry, req.Retry)
+
+                for attempt in range(1, policy.Attempts + 1):
+                    res.Attempts = attempt
+                    attempt_start = time.perf_counter()
+                    try:
+                        self.__send(req, rq, res, policy)
+                        failure: Union[int, str] = res.Status
+                    except Exception as ex:
+                        failure = Transport.exception_name(ex)
+                        if not self.__retry(req, policy, attempt, failure):
+                            raise
                     else:
-                        res.ResultValue = res.Status
-            else: # There are no expectation, assume any valid response is fine
-                if res.Exception is not None:
+                        if not self.__retry(req, policy, attempt, failure):
+                            break
+
+                    delay = policy.delay(attempt)
+                    AppLogger.log(f'Attempt {attempt} failed with {failure}, retrying in {delay * 1000:.0f} ms',
+                                  logging.WARNING)
+                    res.clear()
+                    time.sleep(delay)
+                    res.Wasted += (time.perf_counter() - attempt_start) * 1000
+            finally:
+                # The session of this request only, closed even if the request has failed
+                if not req.Session:
+                    rq.close()
+
+            Timings.since("send", timestamp)
+
+        except Exception as ex:
+            res.Exception = Transport.exception_name(ex)
+            res.ExceptionDetails = str(sys.exc_info()[1])
+
+        StartupTimer.mark("First response")
+
+        # Go through expected statuses to check if response is OK
+        # TODO: By default the response is considered to be OK
+        if req.ExpectedStatuses is not None:
+            if res.Exception is not None:
+                if res.Exception not in req.ExpectedStatuses:
                     res.Result = False
                     res.ResultValue = res.Exception
+                else:
+                    res.ResultValue = res.Exception
+            else:
+                if res.Status not in req.ExpectedStatuses:
+                    res.Result = False
+                    res.ResultValue = res.Status
                 else:
                     res.ResultValue = res.Status
+        else: # There are no expectation, assume any valid response is fine
+            if res.Exception is not None:
+                res.Result = False
+                res.ResultValue = res.Exception
+            else:
+                res.ResultValue = res.Status
 
-            AppLogger.log_header(res.Result, f'Processing {req.Path}', str(res.ResultValue))
-            if res.ExceptionDetails is not None:
-                AppLogger.log(message=res.ExceptionDetails,level=logging.ERROR)
+        AppLogger.log_header(res.Result, f'Processing {req.Path}', str(res.ResultValue))
+        if res.ExceptionDetails is not None:
+            AppLogger.log(message=res.ExceptionDetails,level=logging.ERROR)
 
-            AppState.add_request_result(res.Result)
+        AppState.add_request_result(res.Result)
 
-            AppLogger.buffering_end()
+        AppLogger.buffering_end()
 
+        # Formatting the response is expensive, JSON is decoded only for debugging
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            import pprint
             AppLogger.log("Response object:", logging.DEBUG)
-            res_text = pprint.pformat(res.__dict__)
+            res_text = pprint.pformat(res.as_dict())
             for line in res_text.splitlines():
                 AppLogger.log(line, logging.DEBUG)
 
-            if len(req.PostRequestScript) > 0:
+        if self.scripts and len(req.PostRequestScript) > 0 and pipeline is not None:
+            if not self.__ordered(req, req.PostRequestScript):
+                # The chain goes on, the script and the rest are done by a worker
+                Timings.stop()
+
+                def deferred():
+                    Timings.start(res.Timings)
+                    self.__finish(req, res, env_vars, start)
+
+                pipeline.submit(deferred)
+                return res
+            pipeline.drain()
+
+        self.__finish(req, res, env_vars, start)
+        return res
+
+    def __finish(self, req: HttpRequest, res: HttpResponse, env_vars: EnvVars, start: float):
+        """
+        Execute the post-request script and report the request, the timeline of res should be started
+        """
+        try:
+            if self.scripts and len(req.PostRequestScript) > 0:
                 AppLogger.log('Executing a post-request script')
 
-            exec(req.PostRequestScript, {
-                "req": req,
-                "res": res,
-                "EnvVars": self.env.env_vars,
-                "AppLogger": AppLogger,
-                "AppState": AppState
-            }, None)
+                timestamp = time.perf_counter()
+                exec(ScriptCache.compile(req.PostRequestScript, f'{req.Path} [post-request]'),
+                     ScriptNamespace.create(req=req, res=res, EnvVars=env_vars), None)
+                Timings.since("post_script", timestamp)
+        finally:
+            # The streamed body may be spooled to a temporary file
+            if res.Body is not None:
+                res.Body.close()
 
-        AppLogger.log_summary()
\ No newline at end of file
+            Timings.since("total", start)
+            Timings.stop()
+            AppState.add_timings(res.Timings)
+            if res.Attempts > 1 or res.Hedged:
+                AppState.add_attempts(res.Attempts - 1, res.Hedged, res.HedgeWon, res.Wasted)
+            if self.timings_export is not None:
+                self.timings_export.write(req.Path, res.Result, str(res.ResultValue), res.Timings)
+            if Reporters.enabled():
+                method = getattr(req, "Method", None)
+                Reporters.emit("request", path=req.Path, row=req.Row,
+                               method=method.value if method is not None else None, url=getattr(req, "Url", None),
+                               passed=res.Result, result=res.ResultValue,
+                               exception=res.Exception, details=res.ExceptionDetails, time=res.Time,
+                               size=res.Size, attempts=res.Attempts, hedged=res.Hedged, wasted=res.Wasted,
+                               timings=res.Timings)
@@ -0,0 +1,157 @@
+import heapq
+import logging
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+from pyapitester.helpers import AppLogger
+from pyapitester.httprequest import HttpRequest
+
+
+class RequestGraph:
+    """
+    Dependencies between requests
+
+    A request depends on:
+    - every request from its "depends_on" list
+    - every request, that produces a variable from its "consumes" list
+    - the previous request in the same folder, if any request in the folder uses sessions.
+      This dependency only keeps the order, the request is executed even if the previous one has failed
+
+    Nodes are request indices, ties between ready requests are resolved in the original (sorted) order.
+    """
+
+    Requests: List[HttpRequest]
+
+    Parents: List[Set[int]]
+    """Requests, that should pass before this one"""
+
+    Children: List[Set[int]]
+    """Requests, that wait for this one"""
+
+    Required: List[Set[int]]
+    """Parents, that should pass. Other parents should just be executed before"""
+
+    Declared: bool
+    """True if any request declares its dependencies, otherwise the sorted order should be used"""
+
+    Error: Optional[str]
+    """Why the graph can't be used, e.g. a dependency cycle"""
+
+    def __init__(self, requests: List[HttpRequest]):
+        self.Requests = requests
+        self.Parents = [set() for _ in requests]
+        self.Children = [set() for _ in requests]
+        self.Required = [set() for _ in requests]
+        self.Declared = any(req.DependsOn or req.Produces or req.Consumes for req in requests)
+        self.Error = None
+
+        if not self.Declared:
+            return
+
+        self.__add_explicit()
+        self.__add_variables()
+        self.__add_sessions()
+        ordered = set(self.__sort())
+        if len(ordered) != len(requests):
+            self.Error = 'Dependency cycle between ' + \
+                ', '.join(req.Path for index, req in enumerate(requests) if index not in ordered)
+
+    @staticmethod
+    def __key(path: str) -> str:
+        path = os.path.normcase(os.path.normpath(path))
+        return path[:-len('.toml')] if path.endswith('.toml') else path
+
+    def __add_edge(self, parent: int, child: int, required: bool = True):
+        if parent != child:
+            self.Parents[child].add(parent)
+            self.Children[parent].add(child)
+            if required:
+                self.Required[child].add(parent)
+
+    def __add_explicit(self):
+        indices = {self.__key(req.Path): index for index, req in enumerate(self.Requests)}
+        for index, req in enumerate(self.Requests):
+            for dependency in req.DependsOn:
+                parent = indices.get(self.__key(os.path.join(os.path.dirname(req.Path), dependency)))
+                if parent is None:
+                    AppLogger.log(f'{req.Path}: unknown dependency "{dependency}", ignored', logging.WARNING)
+                    continue
+                self.__add_edge(parent, index)
+
+    def __add_variables(self):
+        producers: Dict[str, List[int]] = {}
+        for index, req in enumerate(self.Requests):
+            for name in req.Produces:
+                producers.setdefault(name, []).append(index)
+
+        for index, req in enumerate(self.Requests):
+            for name in req.Consumes:
+                if name not in producers:
+                    AppLogger.log(f'{req.Path}: variable "{name}" is not produced by any request', logging.DEBUG)
+                for parent in producers.get(name, []):
+                    self.__add_edge(parent, index)
+
+    def __add_sessions(self):
+        folders: Dict[str, List[int]] = {}
+        for index, req in enumerate(self.Requests):
+            folders.setdefault(os.path.dirname(req.Path), []).append(index)
+
+        # Session state is shared by the whole folder, so such folders keep their order
+        for indices in folders.values():
+            if any(self.Requests[index].Session for index in indices):
+                for parent, child in zip(indices, indices[1:]):
+                    self.__add_edge(parent, child, required=False)
+
+    def __sort(self) -> List[int]:
+        """
+        Topological sort, requests in a cycle are missing in the result
+        """
+        waiting = [len(parents) for parents in self.Parents]
+        ready = [index for index, count in enumerate(waiting) if count == 0]
+        heapq.heapify(ready)
+        result = []
+        while ready:
+            index = heapq.heappop(ready)
+            result.append(index)
+            for child in self.Children[index]:
+                waiting[child] -= 1
+                if waiting[child] == 0:
+                    heapq.heappush(ready, child)
+        return result
+
+    def order(self) -> Optional[List[int]]:
+        """
+        Get the execution order, if the requests are executed one by one
+
+        :return: Request indices, None if there is a dependency cycle
+        """
+        result = self.__sort()
+        return result if len(result) == len(self.Requests) else None
+
+    def critical_path(self, durations: Dict[int, float]) -> Tuple[float, List[int]]:
+        """
+        Find the longest chain of dependent requests
+
+        :param durations: Duration of every executed request, ms. Requests without duration are ignored
+        :return: Total duration of the chain and its request indices
+        """
+        best: Dict[int, Tuple[float, Optional[int]]] = {}
+        for index in self.order() or []:
+            if index not in durations:
+                continue
+            parent_time, parent = 0.0, None
+            for candidate in self.Parents[index]:
+                if candidate in best and best[candidate][0] > parent_time:
+                    parent_time, parent = best[candidate][0], candidate
+            best[index] = (parent_time + durations[index], parent)
+
+        if not best:
+            return 0.0, []
+        last = max(best, key=lambda index: best[index][0])
+        total = best[last][0]
+        path = []
+        node: Optional[int] = last
+        while node is not None:
+            path.append(node)
+            node = best[node][1]
+        return total, path[::-1]
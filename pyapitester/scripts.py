@@ -0,0 +1,313 @@
+import ast
+import hashlib
+import importlib.util
+import logging
+import marshal
+import os
+import sys
+import threading
+from types import CodeType
+from typing import Any, Dict, Optional, Tuple
+
+from pyapitester.helpers import AppCache, AppLogger, AppState
+from pyapitester.reporters import Reporters
+
+
+def _indent(text_in: str) -> str:
+    return '        '.join(('\n' + text_in.lstrip()).splitlines(True))
+
+
+def test_case(test_name):
+    """
+    Decorator for the test case functions in user scripts
+    """
+    def inner_decorator(f):
+        def wrapped(*args, **kwargs):
+            # Covers all exceptions in the user code
+            error = None
+            try:
+                f(*args, **kwargs)
+                AppState.add_test_result(True)
+                AppLogger.log_result(True, f'Test case "{test_name}" in function {f.__name__}')
+            except Exception:
+                exc_type, exc_obj, exc_tb = sys.exc_info()
+                AppState.add_test_result(False)
+                AppLogger.log_result(False, f'Test case "{test_name}" in function {f.__name__}')
+                # User scripts are compiled without any prelude, so line numbers are exact
+                error = f'Failed with "{exc_type.__name__}" at line {str(exc_tb.tb_next.tb_lineno)}: {exc_obj}'
+                AppLogger.log(f'Failed with "{exc_type.__name__}" at line {str(exc_tb.tb_next.tb_lineno)}: ' +
+                              f'{_indent(str(exc_obj))}', logging.WARNING)
+
+            # The request and the response are globals of the user script
+            res = f.__globals__.get("res")
+            if error is not None and res is not None:
+                res.TestsFailed += 1
+
+            if Reporters.enabled():
+                req = f.__globals__.get("req")
+                Reporters.emit("test_case", request=getattr(req, "Path", None), name=test_name,
+                               function=f.__name__, passed=error is None, error=error)
+
+        return wrapped
+
+    return inner_decorator
+
+
+class ScriptNamespace(object):
+    """
+    Globals available in every user script
+    """
+
+    __base: Optional[Dict[str, Any]] = None
+    __lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def __build() -> Dict[str, Any]:
+        # grappa is heavy, it is imported only when the first script is executed
+        from grappa import should, expect
+        return {
+            "should": should,
+            "expect": expect,
+            "sys": sys,
+            "logging": logging,
+            "test_case": test_case,
+            "AppLogger": AppLogger,
+            "AppState": AppState
+        }
+
+    @staticmethod
+    def create(**variables) -> Dict[str, Any]:
+        """
+        Create globals for one script execution
+
+        :param variables: Script-specific objects, e.g. req, res and EnvVars
+        :return: A fresh dictionary, scripts can't affect each other
+        """
+        if ScriptNamespace.__base is None:
+            with ScriptNamespace.__lock:
+                if ScriptNamespace.__base is None:
+                    ScriptNamespace.__base = ScriptNamespace.__build()
+        namespace = ScriptNamespace.__base.copy()
+        namespace.update(variables)
+        return namespace
+
+
+class ScriptCache(object):
+    """
+    Compiles user scripts and keeps the code objects
+
+    Every distinct script is compiled once per run. If the on-disk cache is enabled,
+    code objects are also stored there, keyed by a hash of the script, similar to __pycache__.
+    """
+
+    __code: Dict[Tuple[str, str], CodeType] = {}
+    __lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def compile(source: str, filename: str) -> CodeType:
+        """
+        Get the code object for the script
+
+        :param source: Script source
+        :param filename: Name shown in tracebacks, e.g. request path
+        :return: Compiled code object
+        """
+        key = (filename, source)
+        code = ScriptCache.__code.get(key)
+        if code is not None:
+            return code
+
+        digest = hashlib.sha256(f'{filename}\0{source}'.encode()).hexdigest()
+        code = ScriptCache.__load(digest)
+        if code is None:
+            code = compile(source, filename, 'exec')
+            ScriptCache.__store(digest, code)
+
+        with ScriptCache.__lock:
+            ScriptCache.__code[key] = code
+        return code
+
+    @staticmethod
+    def clear():
+        """
+        Forget the compiled scripts, the on-disk cache is kept
+        """
+        with ScriptCache.__lock:
+            ScriptCache.__code.clear()
+
+    @staticmethod
+    def __cache_file(digest: str) -> Optional[str]:
+        folder = AppCache.path("scripts")
+        if folder is None:
+            return None
+        return os.path.join(folder, f'{digest}.{sys.implementation.cache_tag}.pyc')
+
+    @staticmethod
+    def __load(digest: str) -> Optional[CodeType]:
+        cache_file = ScriptCache.__cache_file(digest)
+        if cache_file is None or not os.path.isfile(cache_file):
+            return None
+        try:
+            with open(cache_file, "rb") as f:
+                data = f.read()
+            if not data.startswith(importlib.util.MAGIC_NUMBER):
+                return None
+            return marshal.loads(data[len(importlib.util.MAGIC_NUMBER):])
+        except (OSError, ValueError, EOFError, TypeError) as ex:
+            AppLogger.log(f'Ignoring the script cache "{cache_file}": {ex}', logging.DEBUG)
+            return None
+
+    @staticmethod
+    def __store(digest: str, code: CodeType):
+        cache_file = ScriptCache.__cache_file(digest)
+        if cache_file is None:
+            return
+        # Write to a temporary file first, parallel runs never see partial files
+        temp_file = f'{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_file, "wb") as f:
+                f.write(importlib.util.MAGIC_NUMBER + marshal.dumps(code))
+            os.replace(temp_file, cache_file)
+        except OSError as ex:
+            AppLogger.log(f'Couldn\'t write the script cache "{cache_file}": {ex}', logging.DEBUG)
+
+
+class ScriptEffects(object):
+    """
+    Finds out if a script may change the variables shared with other requests, see --script-workers
+
+    EnvVars may be read by key, with "in" and with its reading methods, any other use, e.g. assigning
+    a key or passing EnvVars to a function, counts as a change. A value read from EnvVars may be used
+    in comparisons, operators, f-strings and assertions; stored in a name or passed to another function
+    it may be changed in place, so that counts as a change too. Scripts using exec(), eval(), globals()
+    or vars() may change anything.
+    """
+
+    READERS: frozenset = frozenset(["get", "replace_vars", "convert"])
+    """EnvVars methods, that never change it"""
+
+    MUTATORS: frozenset = frozenset(["append", "extend", "insert", "pop", "popitem", "remove", "clear", "update",
+                                     "setdefault", "add", "discard", "sort", "reverse"])
+    """Methods, that change a list, dictionary or set stored in a variable"""
+
+    DYNAMIC: frozenset = frozenset(["exec", "eval", "globals", "vars", "setattr", "delattr", "__import__"])
+    """Built-ins, that may reach EnvVars without naming it"""
+
+    SAFE_CALLS: frozenset = frozenset(["expect", "str", "int", "float", "bool", "len", "repr", "print", "format",
+                                       "isinstance", "sorted", "hash"])
+    """Functions, that never change their arguments or keep them after the call"""
+
+    __SAFE_USES = (ast.Compare, ast.BinOp, ast.UnaryOp, ast.FormattedValue, ast.Expr, ast.If, ast.IfExp, ast.While,
+                   ast.Assert)
+    """Expressions and statements, that use a value without keeping it. Conditions only, for ast.IfExp"""
+
+    __results: Dict[str, bool] = {}
+    __lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def mutates(source: str) -> bool:
+        """
+        Check if the script may change EnvVars
+
+        :param source: Script source, the result is cached by it
+        :return: True if the script changes EnvVars or if it can't be parsed
+        """
+        result = ScriptEffects.__results.get(source)
+        if result is None:
+            try:
+                result = ScriptEffects.__analyze(ast.parse(source))
+            except (SyntaxError, ValueError):
+                # The error is reported, when the script is executed in order
+                result = True
+            with ScriptEffects.__lock:
+                ScriptEffects.__results[source] = result
+        return result
+
+    @staticmethod
+    def __analyze(tree: ast.AST) -> bool:
+        parents: Dict[ast.AST, ast.AST] = {}
+        for node in ast.walk(tree):
+            for child in ast.iter_child_nodes(node):
+                parents[child] = node
+
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.Global, ast.Nonlocal)) and "EnvVars" in node.names:
+                return True
+            if not isinstance(node, ast.Name):
+                continue
+            if node.id in ScriptEffects.DYNAMIC:
+                return True
+            if node.id == "EnvVars" and ScriptEffects.__changes(node, parents):
+                return True
+        return False
+
+    @staticmethod
+    def __changes(node: ast.Name, parents: Dict[ast.AST, ast.AST]) -> bool:
+        """
+        Check if this use of EnvVars may change it
+        """
+        if not isinstance(node.ctx, ast.Load):
+            return True
+        parent = parents.get(node)
+
+        # "key" in EnvVars
+        if isinstance(parent, ast.Compare) and node in parent.comparators:
+            return not isinstance(parent.ops[parent.comparators.index(node)], (ast.In, ast.NotIn))
+
+        # EnvVars.get("key")
+        if isinstance(parent, ast.Attribute):
+            if parent.attr not in ScriptEffects.READERS or \
+                    not isinstance(parents.get(parent), ast.Call) or parents[parent].func is not parent:
+                return True
+            return parent.attr != "replace_vars" and ScriptEffects.__escapes(parents[parent], parents)
+
+        # EnvVars["key"]
+        if not isinstance(parent, ast.Subscript) or parent.value is not node:
+            return True
+        return ScriptEffects.__escapes(node, parents)
+
+    @staticmethod
+    def __escapes(value: ast.AST, parents: Dict[ast.AST, ast.AST]) -> bool:
+        """
+        Check if the value read from EnvVars may be changed in place, kept or passed on
+        """
+        while True:
+            parent = parents.get(value)
+            if isinstance(parent, (ast.Subscript, ast.Attribute)):
+                if parent.value is not value:
+                    # The value is the index of another subscript
+                    return False
+                if not isinstance(parent.ctx, ast.Load):
+                    return True
+                if isinstance(parent, ast.Attribute):
+                    if parent.attr in ScriptEffects.MUTATORS:
+                        return True
+                    call = parents.get(parent)
+                    if isinstance(call, ast.Call) and call.func is parent:
+                        # The result of a method may be a part of the value, e.g. dict.get()
+                        parent = call
+            elif isinstance(parent, ast.BoolOp) or (isinstance(parent, ast.IfExp) and parent.test is not value):
+                # "a or b" and "a if test else b" give one of the values
+                pass
+            elif isinstance(parent, ast.keyword):
+                pass
+            else:
+                break
+            value = parent
+
+        if isinstance(parent, ScriptEffects.__SAFE_USES):
+            return False
+        if isinstance(parent, ast.Call) and parent.func is not value:
+            return not ScriptEffects.__safe_call(parent)
+        return True
+
+    @staticmethod
+    def __safe_call(call: ast.Call) -> bool:
+        """
+        Check if the call is one of SAFE_CALLS or an assertion, e.g. expect(value).to.equal(expected)
+        """
+        func = call.func
+        while isinstance(func, (ast.Attribute, ast.Call)):
+            func = func.value if isinstance(func, ast.Attribute) else func.func
+        return isinstance(func, ast.Name) and func.id in ScriptEffects.SAFE_CALLS and \
+            (func is call.func or func.id == "expect")
@@ -0,0 +1,201 @@
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+from pyapitester.helpers import AppLogger, AppState
+from pyapitester.httprequest import HttpRequest
+from pyapitester.reporters import Reporters, ResultsReporter
+from pyapitester.scheduler import RequestGraph
+
+
+class Shards(object):
+    """
+    Splits the collection into independent parts, executed by several processes or machines
+
+    The partitioning is deterministic, every shard computes it from the same sorted request list.
+    Folders are never split, folders connected by dependencies always get into the same shard.
+    """
+
+    @staticmethod
+    def parse(text: str) -> Tuple[int, int]:
+        """
+        Parse the shard specification
+
+        :param text: "K/N", K is the 1-based shard number, N is the number of shards
+        :return: Zero-based shard index and number of shards
+        :raises ValueError: If the specification is invalid
+        """
+        index, _, count = text.partition('/')
+        try:
+            index, count = int(index), int(count)
+        except ValueError:
+            raise ValueError(f'Expected K/N, found "{text}"')
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f'Expected K/N with 1 <= K <= N, found "{text}"')
+        return index - 1, count
+
+    @staticmethod
+    def partition(requests: List[HttpRequest], count: int) -> List[List[HttpRequest]]:
+        """
+        Split requests into shards with about the same number of requests
+
+        Folders are assigned greedily, the largest one goes to the least loaded shard.
+        Requests keep their original order within every shard.
+
+        :param requests: All requests in the execution order
+        :param count: Number of shards
+        :return: Requests of every shard, some shards can be empty
+        """
+        # Folders connected by dependencies are merged into one unit
+        units: Dict[str, str] = {}
+
+        def find(folder: str) -> str:
+            while units[folder] != folder:
+                units[folder] = units[units[folder]]
+                folder = units[folder]
+            return folder
+
+        for req in requests:
+            units.setdefault(os.path.dirname(req.Path), os.path.dirname(req.Path))
+
+        graph = RequestGraph(requests)
+        if graph.Declared:
+            for child, parents in enumerate(graph.Parents):
+                for parent in parents:
+                    first = find(os.path.dirname(requests[parent].Path))
+                    second = find(os.path.dirname(requests[child].Path))
+                    if first != second:
+                        units[max(first, second)] = min(first, second)
+
+        sizes: Dict[str, int] = {}
+        for req in requests:
+            unit = find(os.path.dirname(req.Path))
+            sizes[unit] = sizes.get(unit, 0) + 1
+
+        loads = [0] * count
+        shard_of: Dict[str, int] = {}
+        for unit in sorted(sizes, key=lambda name: (-sizes[name], name)):
+            shard = min(range(count), key=lambda index: (loads[index], index))
+            shard_of[unit] = shard
+            loads[shard] += sizes[unit]
+
+        result: List[List[HttpRequest]] = [[] for _ in range(count)]
+        for req in requests:
+            result[shard_of[find(os.path.dirname(req.Path))]].append(req)
+        return result
+
+    @staticmethod
+    def child_arguments(argv: List[str], drop: List[str]) -> List[str]:
+        """
+        Remove options with their values from the command line
+
+        :param argv: Command line arguments without the program name
+        :param drop: Long option names, e.g. "--processes"
+        """
+        result = []
+        skip = False
+        for argument in argv:
+            if skip:
+                skip = False
+            elif argument in drop:
+                skip = True
+            elif argument.split('=', 1)[0] not in drop:
+                result.append(argument)
+        return result
+
+    @staticmethod
+    def run_processes(count: int, argv: List[str], timings_export: Optional[str] = None) -> bool:
+        """
+        Run every shard in its own process and merge the results
+
+        :param count: Number of processes
+        :param argv: Command line arguments of every process, without sharding and reporting options
+        :param timings_export: Combined CSV file with timelines of all shards, if set
+        :return: False if any process has failed without results
+        """
+        with tempfile.TemporaryDirectory(prefix="pyapitester-") as folder:
+            results = [os.path.join(folder, f'{index + 1}.json') for index in range(count)]
+            exports = [os.path.join(folder, f'{index + 1}.csv') for index in range(count)]
+            processes = []
+            for index in range(count):
+                command = [sys.executable, sys.argv[0]] + argv + \
+                          ["--shard", f'{index + 1}/{count}', "--reporter", f'results:{results[index]}']
+                if timings_export is not None:
+                    command += ["--timings-export", exports[index]]
+                processes.append(subprocess.Popen(command))
+
+            finished = True
+            for index, process in enumerate(processes):
+                process.wait()
+                # A shard without requests writes nothing
+                if not os.path.isfile(results[index]) and process.returncode != 0:
+                    logging.error(f'Shard {index + 1}/{count} exited with code {process.returncode}')
+                    finished = False
+            Shards.merge([result for result in results if os.path.isfile(result)])
+
+            if timings_export is not None:
+                with open(timings_export, "w", newline="") as output:
+                    header_written = False
+                    for export in exports:
+                        if not os.path.isfile(export):
+                            continue
+                        with open(export, "r", newline="") as f:
+                            header = f.readline()
+                            if not header_written:
+                                output.write(header)
+                                header_written = True
+                            output.write(f.read())
+        return finished
+
+    @staticmethod
+    def merge(files: List[str]):
+        """
+        Print the combined results of several shards and send them to all reporters
+
+        :param files: Results files, see ResultsReporter
+        :raises ValueError: If any file is not a results file
+        """
+        requests: List[Dict[str, Any]] = []
+        test_cases: Dict[str, List[Dict[str, Any]]] = {}
+        start_time: Optional[str] = None
+        duration = 0.0
+        for filename in files:
+            for event in ResultsReporter.load(filename):
+                if event["event"] == "run_start":
+                    start_time = min(start_time or event["time"], event["time"])
+                elif event["event"] == "run_end":
+                    # Shards run at the same time, the slowest one defines the duration
+                    duration = max(duration, event["duration"])
+                    AppState.merge(event.get("state", {}))
+                elif event["event"] == "test_case":
+                    test_cases.setdefault(event["request"], []).append(event)
+                elif event["event"] in ("request", "request_skipped"):
+                    requests.append(event)
+
+        # Requests of one folder keep their order, folders are sorted
+        requests.sort(key=lambda event: os.path.dirname(event["path"]))
+
+        Reporters.emit("run_start", time=start_time or Reporters.now())
+        for event in requests:
+            fields = {key: value for key, value in event.items() if key != "event"}
+            if event["event"] == "request_skipped":
+                AppLogger.log_skipped(f'Skipping {event["path"]}', event["reason"])
+                Reporters.emit(event["event"], **fields)
+                continue
+
+            AppLogger.log_header(event["passed"], f'Processing {event["path"]}', str(event["result"]))
+            if event["details"] is not None:
+                AppLogger.log(event["details"])
+            for test_case in test_cases.pop(event["path"], []):
+                AppLogger.log_result(test_case["passed"],
+                                     f'Test case "{test_case["name"]}" in function {test_case["function"]}')
+                Reporters.emit("test_case", **{key: value for key, value in test_case.items() if key != "event"})
+            Reporters.emit(event["event"], **fields)
+
+        Reporters.emit("run_end", time=Reporters.now(), duration=duration,
+                       requests=AppState.RequestsTotal, requests_failed=AppState.RequestsFailed,
+                       tests=AppState.TestsTotal, tests_failed=AppState.TestsFailed, state=AppState.as_dict())
+        AppLogger.log_summary()
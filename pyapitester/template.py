@@ -0,0 +1,338 @@
+import functools
+import re
+import sys
+from typing import Any, Dict, FrozenSet, Iterator, List, Mapping, Optional, Set, Tuple
+
+if sys.version_info < (3, 11):
+    import tomli as tomllib
+else:
+    import tomllib
+
+
+class Template:
+    """
+    Text with {{var_name}} placeholders
+
+    The text is split into literal and placeholder segments once,
+    rendering is just a join. Placeholders without a value remain untouched,
+    "{{{{" is an escaped "{{".
+    """
+
+    PATTERN = re.compile(r'''
+    \{\{(?:
+    (?P<escaped>\{\{)|
+    (?P<named>[_a-z][_a-z0-9]*)\}\}|
+    (?P<braced>[_a-z][_a-z0-9]*)\}\}|
+    (?P<invalid>)
+    )
+    ''', re.IGNORECASE | re.VERBOSE)
+
+    __MISSING = object()
+
+    Source: str
+    """Original text"""
+
+    Variables: FrozenSet[str]
+    """Names of all variables used in the text"""
+
+    __parts: List[str]
+    """Literal segments, placeholders are stored in their original form"""
+
+    __slots: Tuple[Tuple[int, str], ...]
+    """Part index and variable name for every placeholder"""
+
+    __names: Tuple[str, ...]
+    """Sorted variable names"""
+
+    def __init__(self, source: str):
+        self.Source = source
+        self.__parts = []
+        slots = []
+
+        literal = []
+        position = 0
+        for match in self.PATTERN.finditer(source):
+            literal.append(source[position:match.start()])
+            position = match.end()
+            name = match.group("named") or match.group("braced")
+            if name is not None:
+                self.__parts.append(''.join(literal))
+                literal = []
+                slots.append((len(self.__parts), name))
+                self.__parts.append(match.group())
+            elif match.group("escaped") is not None:
+                literal.append('{{')
+            else:
+                # Not a placeholder, keep as is
+                literal.append(match.group())
+        literal.append(source[position:])
+        self.__parts.append(''.join(literal))
+
+        self.__slots = tuple(slots)
+        self.Variables = frozenset(name for _, name in slots)
+        self.__names = tuple(sorted(self.Variables))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def get(source: str) -> 'Template':
+        """
+        Get the tokenized template for the text, every text is tokenized only once
+        """
+        return Template(source)
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        """
+        Replace all placeholders with values
+
+        :param values: Variable values, anything with get() method
+        :return: Text with all placeholders replaced whenever possible
+        """
+        if not self.__slots:
+            return self.__parts[0]
+
+        parts = self.__parts.copy()
+        for index, name in self.__slots:
+            value = values.get(name, self.__MISSING)
+            if value is not self.__MISSING:
+                parts[index] = str(value)
+        return ''.join(parts)
+
+    def segments(self) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Iterate over the text segments
+
+        :return: (text, None) for literals, (placeholder, variable name) for placeholders
+        """
+        names = dict(self.__slots)
+        for index, part in enumerate(self.__parts):
+            yield part, names.get(index)
+
+    def key(self, values: Mapping[str, Any]) -> Tuple:
+        """
+        Get the values of all variables used in the template
+
+        Two renderings with equal keys produce the same text
+        """
+        return tuple(values.get(name, self.__MISSING) for name in self.__names)
+
+
+class TomlScanner:
+    """
+    Minimal TOML lexer, tells if the current position is inside a string
+    """
+
+    BARE = 'bare'
+    COMMENT = 'comment'
+    BASIC = '"'
+    LITERAL = "'"
+    ML_BASIC = '"""'
+    ML_LITERAL = "'''"
+
+    State: str
+    __escape: bool
+
+    def __init__(self):
+        self.State = self.BARE
+        self.__escape = False
+
+    @property
+    def InString(self) -> bool:
+        return self.State not in (self.BARE, self.COMMENT)
+
+    def feed(self, text: str):
+        """
+        Advance the scanner over the text
+        """
+        i = 0
+        length = len(text)
+        while i < length:
+            char = text[i]
+            if self.__escape:
+                self.__escape = False
+            elif self.State == self.BARE:
+                if char == '#':
+                    self.State = self.COMMENT
+                elif char in '"\'':
+                    if text.startswith(char * 3, i):
+                        self.State = char * 3
+                        i += 2
+                    else:
+                        self.State = char
+            elif self.State == self.COMMENT:
+                if char == '\n':
+                    self.State = self.BARE
+            elif char == '\\' and self.State in (self.BASIC, self.ML_BASIC):
+                self.__escape = True
+            elif self.State in (self.BASIC, self.LITERAL):
+                if char == self.State or char == '\n':
+                    self.State = self.BARE
+            elif char == self.State[0] and text.startswith(self.State, i):
+                # Up to two extra quotes before the closing delimiter belong to the string
+                run = 3
+                while i + run < length and text[i + run] == char:
+                    run += 1
+                self.State = self.BARE
+                i += run - 1
+            i += 1
+
+    def placeholder(self):
+        """
+        Skip a placeholder, it never changes the state
+        """
+        self.__escape = False
+
+
+class ParsedTemplate:
+    """
+    TOML document with {{var_name}} placeholders, parsed only once
+
+    Placeholders inside strings are substituted as text. A placeholder
+    used as a value, e.g. timeout = {{base_timeout}}, is typed: the variable
+    value is parsed as a TOML value, if that fails it is used as a string.
+
+    Only the top-level tables using changed variables are rebuilt, all other
+    tables are returned as the same objects as during the previous rendering.
+
+    If the document can't be parsed this way (e.g. a placeholder is a part
+    of a bare value), Valid is False and the text should be rendered instead.
+    """
+
+    __MISSING = object()
+    __SENTINEL = re.compile('\ue000(\\d+)\ue001')
+
+    Template: Template
+
+    Valid: bool
+    """True if the document was parsed with placeholders"""
+
+    Error: Optional[str]
+    """Why the document couldn't be parsed with placeholders"""
+
+    __slots: List[Tuple[str, str, bool]]
+    """Variable name, original placeholder and a "typed" flag for every slot"""
+
+    __tables: List[Tuple[str, Any, Tuple[str, ...]]]
+    """Key, compiled node and sorted variable names for every top-level entry"""
+
+    __rendered: Dict[str, Tuple[Tuple, Any]]
+    """Variable values and the result of the last rendering of every top-level entry"""
+
+    def __init__(self, template: Template):
+        self.Template = template
+        self.Valid = False
+        self.Error = None
+        self.__slots = []
+        self.__tables = []
+        self.__rendered = {}
+
+        scanner = TomlScanner()
+        source: List[str] = []
+        for text, name in template.segments():
+            if name is None:
+                source.append(text)
+                scanner.feed(text)
+                continue
+            if scanner.State == TomlScanner.COMMENT:
+                source.append(text)
+                continue
+            scanner.placeholder()
+            sentinel = f'\ue000{len(self.__slots)}\ue001'
+            self.__slots.append((name, text, not scanner.InString))
+            source.append(sentinel if scanner.InString else f'"{sentinel}"')
+
+        try:
+            data = tomllib.loads(''.join(source))
+        except tomllib.TOMLDecodeError as ex:
+            self.Error = str(ex)
+            return
+
+        for key, value in data.items():
+            if self.__SENTINEL.search(key):
+                self.Error = 'Placeholder in a top-level key'
+                return
+            names: Set[str] = set()
+            self.__tables.append((key, self.__compile(value, names), tuple(sorted(names))))
+
+        self.Valid = True
+
+    def __compile(self, value: Any, names: Set[str]) -> Tuple:
+        """
+        Convert the parsed value to a node: ('const', value), ('str', parts), ('typed', slot),
+        ('dict', [(key_node, value_node)]) or ('list', [value_node])
+        """
+        if isinstance(value, str):
+            parts = self.__SENTINEL.split(value)
+            if len(parts) == 1:
+                return 'const', value
+            slots = [int(slot) for slot in parts[1::2]]
+            names.update(self.__slots[slot][0] for slot in slots)
+            if len(parts) == 3 and parts[0] == '' and parts[2] == '' and self.__slots[slots[0]][2]:
+                return 'typed', slots[0]
+            for index in range(1, len(parts), 2):
+                parts[index] = int(parts[index])
+            return 'str', parts
+
+        if isinstance(value, dict):
+            items = [(self.__compile(k, names), self.__compile(v, names)) for k, v in value.items()]
+            if all(k[0] == 'const' and v[0] == 'const' for k, v in items):
+                return 'const', value
+            return 'dict', items
+
+        if isinstance(value, list):
+            items = [self.__compile(v, names) for v in value]
+            if all(v[0] == 'const' for v in items):
+                return 'const', value
+            return 'list', items
+
+        return 'const', value
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def __typed_value(text: str) -> Any:
+        try:
+            return tomllib.loads(f'value = {text}')["value"]
+        except tomllib.TOMLDecodeError:
+            return text
+
+    def __substitute(self, node: Tuple, values: Mapping[str, Any]) -> Any:
+        kind = node[0]
+        if kind == 'const':
+            return node[1]
+        if kind == 'str':
+            parts = node[1].copy()
+            for index in range(1, len(parts), 2):
+                name, placeholder, _ = self.__slots[parts[index]]
+                value = values.get(name, self.__MISSING)
+                parts[index] = placeholder if value is self.__MISSING else str(value)
+            return ''.join(parts)
+        if kind == 'typed':
+            name = self.__slots[node[1]][0]
+            value = values.get(name, self.__MISSING)
+            if value is self.__MISSING:
+                raise ValueError(f'Variable "{name}" is used as a value, but it is not defined')
+            if isinstance(value, str):
+                return self.__typed_value(value)
+            return value
+        if kind == 'dict':
+            return {self.__substitute(k, values): self.__substitute(v, values) for k, v in node[1]}
+        return [self.__substitute(v, values) for v in node[1]]
+
+    def render(self, values: Mapping[str, Any]) -> Dict[str, Any]:
+        """
+        Substitute variables into the parsed document
+
+        :param values: Variable values, anything with get() method
+        :return: Parsed document, unchanged top-level tables are the same objects as before
+        """
+        data: Dict[str, Any] = {}
+        for key, node, names in self.__tables:
+            if not names:
+                data[key] = node[1]
+                continue
+            values_key = tuple(values.get(name, self.__MISSING) for name in names)
+            rendered = self.__rendered.get(key)
+            if rendered is None or rendered[0] != values_key:
+                rendered = (values_key, self.__substitute(node, values))
+                self.__rendered[key] = rendered
+            data[key] = rendered[1]
+        return data
@@ -0,0 +1,98 @@
+import csv
+import threading
+import time
+from typing import Any, Dict, IO, List, Optional
+
+
+class Timings(object):
+    """
+    Phase timeline of the request processed in the current thread
+
+    The runner starts the timeline, lower layers (e.g. the transport) add
+    their phases without knowing which request they are processing.
+    """
+
+    PHASES: List[str] = [
+        "prepare",      # Variable substitution and TOML parsing
+        "pre_script",   # Pre-request script
+        "dns",          # Name resolution, only for new connections
+        "connect",      # TCP connection, only for new connections
+        "tls",          # TLS handshake, only for new HTTPS connections
+        "ttfb",         # Waiting for the response headers, after the request is sent
+        "download",     # Receiving the response body
+        "send",         # Whole exchange, including all phases above, starting from "dns"
+        "json",         # Decoding the response as JSON
+        "post_script",  # Post-request script, including the JSON decoding, if the script triggered it
+        "total"         # Everything above
+    ]
+    """All phases in the order of execution"""
+
+    __local: threading.local = threading.local()
+
+    @staticmethod
+    def start(timings: Dict[str, float]):
+        """
+        Collect all phases of the current thread into the dictionary
+
+        :param timings: Phase durations, ms. Usually res.Timings
+        """
+        Timings.__local.current = timings
+
+    @staticmethod
+    def stop():
+        Timings.__local.current = None
+
+    @staticmethod
+    def add(phase: str, duration: float):
+        """
+        Add the phase duration to the current timeline, nothing is done if there is no timeline
+
+        :param phase: One of PHASES. Phases are summed up, e.g. after redirects
+        :param duration: Duration, seconds
+        """
+        current: Optional[Dict[str, float]] = getattr(Timings.__local, "current", None)
+        if current is not None:
+            current[phase] = current.get(phase, 0.0) + duration * 1000
+
+    @staticmethod
+    def since(phase: str, start: float) -> float:
+        """
+        Add the phase, that started at the given time and ends now
+
+        :param start: time.perf_counter() at the phase start
+        :return: time.perf_counter() at the phase end
+        """
+        end = time.perf_counter()
+        Timings.add(phase, end - start)
+        return end
+
+
+class TimingsExport(object):
+    """
+    Writes the timeline of every request to a CSV file, see --timings-export
+    """
+
+    __file: IO
+    __writer: Any
+    __lock: threading.Lock
+
+    def __init__(self, filename: str):
+        self.__file = open(filename, "w", newline="")
+        self.__writer = csv.writer(self.__file)
+        self.__writer.writerow(["path", "result", "status"] + Timings.PHASES)
+        self.__lock = threading.Lock()
+
+    def write(self, path: str, result: bool, status: str, timings: Dict[str, float]):
+        """
+        :param path: Request path
+        :param result: True if the request passed
+        :param status: Status code or exception name
+        :param timings: Phase durations, ms. Missing phases are left empty
+        """
+        row = [path, "passed" if result else "failed", status] + \
+            [f'{timings[phase]:.3f}' if phase in timings else '' for phase in Timings.PHASES]
+        with self.__lock:
+            self.__writer.writerow(row)
+
+    def close(self):
+        self.__file.close()
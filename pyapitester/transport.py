@@ -0,0 +1,237 @@
+import socket
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pyapitester.timings import Timings
+
+
+class DnsCache(object):
+    """
+    Process-local cache of resolved host names, shared by all connections and transports
+
+    socket.getaddrinfo() doesn't report the TTL of the DNS records, so every entry is kept for Ttl seconds.
+    Failed lookups are not cached.
+    """
+
+    Ttl: float = 60.0
+    """Lifetime of every entry, seconds. Nothing is cached if zero, see --dns-ttl"""
+
+    __entries: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+    """Expiration time (time.monotonic()) and addresses by host and port"""
+    __lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def get(host: str, port: int) -> Optional[List[str]]:
+        """
+        :return: Cached addresses, None if there are none or they have expired
+        """
+        with DnsCache.__lock:
+            entry = DnsCache.__entries.get((host, port))
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    @staticmethod
+    def put(host: str, port: int, addresses: List[str]):
+        if DnsCache.Ttl <= 0:
+            return
+        with DnsCache.__lock:
+            DnsCache.__entries[(host, port)] = (time.monotonic() + DnsCache.Ttl, addresses)
+
+    @staticmethod
+    def clear():
+        with DnsCache.__lock:
+            DnsCache.__entries = {}
+
+
+def _resolve(host: str, port: int) -> Optional[List[str]]:
+    """
+    Resolve the host name, the time is added to the "dns" phase
+
+    :return: IP addresses in the order of preference, None if the name can't be resolved
+    """
+    start = time.perf_counter()
+    try:
+        addresses = DnsCache.get(host, port)
+        if addresses is None:
+            infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+            addresses = list(dict.fromkeys(info[4][0] for info in infos))
+            DnsCache.put(host, port, addresses)
+        return addresses
+    except (socket.gaierror, UnicodeError):
+        return None
+    finally:
+        Timings.since("dns", start)
+
+
+class TransportResponse(object):
+    """
+    Response of any transport, the body is not received yet
+    """
+
+    Status: int
+    """Status code of the final response, after all redirects"""
+
+    Headers: List[Tuple[str, str]]
+    """Response headers in the received order, a header may repeat"""
+
+    Elapsed: float
+    """Time from sending the request until the response headers were received, seconds"""
+
+    def read(self) -> bytes:
+        """
+        Receive the whole body at once, as it was sent
+        """
+        raise NotImplementedError
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        """
+        Receive the body in chunks, compressed bodies are decompressed
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Release the connection, the rest of the body is dropped
+        """
+        raise NotImplementedError
+
+
+class TransportSession(object):
+    """
+    Cookies and other state shared by the requests of one session
+    """
+
+    MaxRedirects: int = 30
+    """Maximum number of redirects followed by request()"""
+
+    Origin: Optional[str] = None
+    """Request file of the next request, e.g. to tell apart the responses recorded in a cassette"""
+
+    def request(self, method: str, url: str, headers: Any, auth: Any, data: Any,
+                timeout: Optional[float]) -> TransportResponse:
+        """
+        Send the request and receive the response headers, redirects are followed
+
+        :param headers: Request headers, dictionary
+        :param auth: HTTPBasicAuth, HTTPDigestAuth or None
+        :param data: Body: a string, an object with __len__ and __iter__ returning bytes
+                     (sent with Content-Length), an iterator of bytes (sent chunked) or None
+        :param timeout: Connect and read timeout, seconds. No timeout if None
+        :raises Exception: On any failure, its Transport.exception_name() is the result, e.g. "ConnectionError"
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Forget the session state, connections stay in the pool
+        """
+        raise NotImplementedError
+
+
+class Transport(object):
+    """
+    Keep-alive connection pool shared by all requests of the run, see --transport
+
+    Connection state is kept here, cookie state is kept in sessions.
+    That's why requests without a session still reuse warm connections.
+    """
+
+    NAMES: List[str] = ["requests", "httpclient"]
+    """Available transports, the first one is the default"""
+
+    PoolSize: int
+    """Maximum number of kept-alive connections per host"""
+
+    def __init__(self, pool_size: int = 10):
+        self.PoolSize = pool_size
+
+    @staticmethod
+    def create(name: str = "requests", pool_size: int = 10) -> 'Transport':
+        """
+        Create the transport, its dependencies are imported only here
+
+        :param name: One of NAMES
+        :raises ValueError: If the name is unknown
+        """
+        if name == "requests":
+            from pyapitester.transport_requests import RequestsTransport
+            return RequestsTransport(pool_size)
+        if name == "httpclient":
+            from pyapitester.transport_httpclient import HttpClientTransport
+            return HttpClientTransport(pool_size)
+        raise ValueError(f'Unknown transport "{name}", expected ' + ", ".join(Transport.NAMES))
+
+    @staticmethod
+    def exception_name(ex: BaseException) -> str:
+        """
+        Name of the exception as the result of the request, the same for all transports
+
+        TransportConnectionError is reported as "ConnectionError", the same as in requests
+        """
+        return "ConnectionError" if type(ex) is TransportConnectionError else type(ex).__name__
+
+    def session(self) -> TransportSession:
+        """
+        Create a new session, that uses the shared connection pool
+        """
+        raise NotImplementedError
+
+    def warmup(self, url: str, connections: int = 1, timeout: Optional[float] = None) -> int:
+        """
+        Open connections to the host of the URL ahead of time and keep them in the pool
+
+        Connections already in the pool are counted, so warming up twice opens nothing new.
+
+        :param connections: Number of connections, at most PoolSize
+        :param timeout: Connect timeout, seconds. No timeout if None
+        :return: Number of opened connections
+        :raises Exception: If the URL is invalid or the host can't be reached
+        """
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+
+class TransportConnectionError(OSError):
+    """
+    The connection can't be established or was broken, reported as "ConnectionError", see Transport.exception_name
+    """
+
+
+class ConnectTimeout(TransportConnectionError):
+    """
+    The connection wasn't established in time
+    """
+
+
+class ReadTimeout(OSError):
+    """
+    The server didn't answer in time
+    """
+
+
+class TooManyRedirects(Exception):
+    """
+    More than TransportSession.MaxRedirects redirects
+    """
+
+
+class MissingSchema(ValueError):
+    """
+    The URL has no scheme, e.g. it is empty
+    """
+
+
+class InvalidSchema(ValueError):
+    """
+    The URL scheme is neither http nor https
+    """
+
+
+class InvalidURL(ValueError):
+    """
+    The URL has no host or an invalid port
+    """
@@ -0,0 +1,428 @@
+import base64
+import hashlib
+import http.client
+import http.cookiejar
+import os
+import select
+import socket
+import ssl
+import threading
+import time
+import urllib.request
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from pyapitester.helpers import AppState
+from pyapitester.timings import Timings
+from pyapitester.transport import ConnectTimeout, InvalidSchema, InvalidURL, MissingSchema, ReadTimeout, \
+    TooManyRedirects, Transport, TransportConnectionError, TransportResponse, TransportSession, _resolve
+
+PoolKey = Tuple[str, str, int]
+"""Scheme, host and port"""
+
+
+def _pool_key(url: str) -> PoolKey:
+    """
+    :raises ValueError: If the URL is not a valid http or https URL
+    """
+    parts = urlsplit(url)
+    if not parts.scheme:
+        raise MissingSchema(f'Invalid URL {url!r}: no scheme supplied')
+    if parts.scheme not in ("http", "https"):
+        raise InvalidSchema(f'No connection adapters were found for {url!r}')
+    try:
+        key = (parts.scheme, parts.hostname or "", parts.port or (443 if parts.scheme == "https" else 80))
+    except ValueError as ex:
+        raise InvalidURL(f'Invalid URL {url!r}: {ex}') from ex
+    if not key[1]:
+        raise InvalidURL(f'Invalid URL {url!r}: no host supplied')
+    return key
+
+
+def _connect(host: str, port: int, timeout: Optional[float]) -> socket.socket:
+    """
+    Open a TCP connection, the time is added to the "dns" and "connect" phases
+
+    Resolved addresses are tried one by one, the error of the last one is raised
+    """
+    addresses = _resolve(host, port)
+    if not addresses:
+        raise TransportConnectionError(f'Failed to resolve "{host}"')
+
+    start = time.perf_counter()
+    try:
+        for index, address in enumerate(addresses):
+            try:
+                return socket.create_connection((address, port), timeout)
+            except OSError as ex:
+                if index < len(addresses) - 1:
+                    continue
+                if isinstance(ex, socket.timeout):
+                    raise ConnectTimeout(f'{host}:{port}: connection timed out') from ex
+                raise TransportConnectionError(f'{host}:{port}: {ex}') from ex
+    finally:
+        Timings.since("connect", start)
+
+
+class TimedHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection, that reports every new TCP connection to the AppState
+    """
+
+    def connect(self):
+        AppState.add_connection(tls=False)
+        self.sock = _connect(self.host, self.port, self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class TimedHTTPSConnection(http.client.HTTPSConnection):
+    """
+    HTTPS connection, that reports every new TCP connection and TLS handshake to the AppState
+    """
+
+    def connect(self):
+        AppState.add_connection(tls=True)
+        sock = _connect(self.host, self.port, self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        start = time.perf_counter()
+        try:
+            self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+        except OSError:
+            sock.close()
+            raise
+        finally:
+            Timings.since("tls", start)
+
+
+class HttpClientResponse(TransportResponse):
+    """
+    Response, that returns its connection to the pool once the body is received
+    """
+
+    __response: http.client.HTTPResponse
+    __connection: Optional[http.client.HTTPConnection]
+    __release: Any
+
+    def __init__(self, response: http.client.HTTPResponse, connection: http.client.HTTPConnection, release: Any):
+        """
+        :param release: Called with the connection, once the body is received
+        """
+        self.__response = response
+        self.__connection = connection
+        self.__release = release
+        self.Status = response.status
+        self.Headers = response.getheaders()
+        self.Elapsed = 0.0
+
+    def header(self, name: str) -> Optional[str]:
+        return self.__response.getheader(name)
+
+    def read(self) -> bytes:
+        try:
+            data = self.__response.read()
+        except (OSError, http.client.HTTPException) as ex:
+            self.close()
+            raise TransportConnectionError(f'Response body is incomplete: {ex!r}') from ex
+        self.__done()
+        return data
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        encoding = (self.__response.getheader("Content-Encoding") or "").lower()
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS if encoding == "gzip" else zlib.MAX_WBITS) \
+            if encoding in ("gzip", "deflate") else None
+        try:
+            while True:
+                chunk = self.__response.read(chunk_size)
+                if not chunk:
+                    break
+                yield decoder.decompress(chunk) if decoder is not None else chunk
+            if decoder is not None:
+                yield decoder.flush()
+        except (OSError, http.client.HTTPException, zlib.error) as ex:
+            self.close()
+            raise TransportConnectionError(f'Response body is incomplete: {ex!r}') from ex
+        self.__done()
+
+    def __done(self):
+        if self.__connection is not None:
+            self.__release(self.__connection)
+            self.__connection = None
+
+    def close(self):
+        # The connection can't be reused if the body wasn't received completely
+        if self.__connection is not None:
+            self.__connection.close()
+            self.__connection = None
+        self.__response.close()
+
+
+class HttpClientSession(TransportSession):
+    """
+    Session with its own cookies, but with connections from the shared pool
+    """
+
+    REDIRECTS: List[int] = [301, 302, 303, 307, 308]
+
+    NO_BODY_METHODS: List[str] = ["GET", "HEAD", "DELETE", "OPTIONS"]
+    """Methods sent without Content-Length if there is no body, same as urllib3"""
+
+    __transport: 'HttpClientTransport'
+    __cookies: http.cookiejar.CookieJar
+
+    def __init__(self, transport: 'HttpClientTransport'):
+        self.__transport = transport
+        self.__cookies = http.cookiejar.CookieJar()
+
+    def request(self, method: str, url: str, headers: Any, auth: Any, data: Any,
+                timeout: Optional[float]) -> TransportResponse:
+        start = time.perf_counter()
+        headers = dict(headers or {})
+        redirects = 0
+        while True:
+            res = self.__send(method, url, headers, auth, data, timeout)
+            location = res.header("Location")
+            if res.Status not in self.REDIRECTS or location is None:
+                res.Elapsed = time.perf_counter() - start
+                return res
+
+            # The body is received, so that the connection can be reused
+            res.read()
+            if redirects >= self.MaxRedirects:
+                raise TooManyRedirects(f'Exceeded {self.MaxRedirects} redirects.')
+            redirects += 1
+
+            target = urljoin(url, location)
+            if urlsplit(target).netloc != urlsplit(url).netloc:
+                # Credentials are never sent to another host
+                auth = None
+                headers = {name: value for name, value in headers.items() if name.lower() != "authorization"}
+            url = target
+            if (res.Status == 303 and method != "HEAD") or (res.Status in (301, 302) and method == "POST"):
+                method, data = "GET", None
+                headers = {name: value for name, value in headers.items()
+                           if name.lower() not in ("content-type", "content-length", "transfer-encoding")}
+
+    def __send(self, method: str, url: str, headers: Dict[str, str], auth: Any, data: Any,
+               timeout: Optional[float]) -> HttpClientResponse:
+        auth_type = type(auth).__name__
+        if auth_type == "HTTPBasicAuth":
+            credentials = f'{auth.username}:{auth.password}'.encode("latin1")
+            headers = {**headers, "Authorization": "Basic " + base64.b64encode(credentials).decode()}
+
+        res = self.__exchange(method, url, headers, data, timeout)
+        challenge = res.header("WWW-Authenticate") or ""
+        if auth_type == "HTTPDigestAuth" and res.Status == 401 and challenge.lower().startswith("digest "):
+            res.read()
+            headers = {**headers, "Authorization": self.__digest(auth, method, url, challenge)}
+            res = self.__exchange(method, url, headers, data, timeout)
+        return res
+
+    def __exchange(self, method: str, url: str, headers: Dict[str, str], data: Any,
+                   timeout: Optional[float]) -> HttpClientResponse:
+        parts = urlsplit(url)
+        key = _pool_key(url)
+
+        # Cookie handling is skipped, unless the server has set any
+        if len(self.__cookies) > 0:
+            cookie_request = urllib.request.Request(url, method=method)
+            self.__cookies.add_cookie_header(cookie_request)
+            cookie = cookie_request.unredirected_hdrs.get("Cookie")
+            if cookie is not None:
+                headers = {**headers, "Cookie": cookie}
+
+        connection = self.__transport.acquire(key, timeout)
+        try:
+            self.__write(connection, method, parts.path or "/", parts.query, headers, data)
+            start = time.perf_counter()
+            try:
+                response = connection.getresponse()
+            finally:
+                Timings.since("ttfb", start)
+        except socket.timeout as ex:
+            connection.close()
+            raise ReadTimeout(f'{key[1]}:{key[2]}: read timed out') from ex
+        except (TransportConnectionError, TooManyRedirects):
+            connection.close()
+            raise
+        except (OSError, http.client.HTTPException) as ex:
+            connection.close()
+            raise TransportConnectionError(f'{key[1]}:{key[2]}: {ex!r}') from ex
+
+        if response.getheader("Set-Cookie") is not None:
+            self.__cookies.extract_cookies(response, urllib.request.Request(url, method=method))
+        return HttpClientResponse(response, connection, lambda conn: self.__transport.release(key, conn))
+
+    def __write(self, connection: http.client.HTTPConnection, method: str, path: str, query: str,
+                headers: Dict[str, str], data: Any):
+        names = {name.lower() for name in headers}
+        connection.putrequest(method, path + ("?" + query if query else ""), skip_host="host" in names,
+                              skip_accept_encoding="accept-encoding" in names)
+        for name, value in headers.items():
+            connection.putheader(name, value)
+        if "accept" not in names:
+            connection.putheader("Accept", "*/*")
+
+        length, chunks = self.__chunks(data)
+        if length is None:
+            connection.putheader("Transfer-Encoding", "chunked")
+        elif length > 0 or method not in self.NO_BODY_METHODS:
+            connection.putheader("Content-Length", str(length))
+
+        if isinstance(chunks, tuple) and len(chunks) == 1:
+            # Headers and a small body are sent in one packet
+            connection.endheaders(chunks[0])
+            return
+        connection.endheaders()
+        for chunk in chunks:
+            if length is None:
+                if not chunk:
+                    continue
+                chunk = f'{len(chunk):X}\r\n'.encode() + chunk + b'\r\n'
+            connection.send(chunk)
+        if length is None:
+            connection.send(b'0\r\n\r\n')
+
+    @staticmethod
+    def __chunks(data: Any) -> Tuple[Optional[int], Iterable[bytes]]:
+        """
+        :return: Content length (None if the body should be sent chunked) and the chunks
+        """
+        if data is None:
+            return 0, ()
+        if isinstance(data, str):
+            data = data.encode()
+        if isinstance(data, bytes):
+            return len(data), (data,)
+        if hasattr(data, "__len__"):
+            return len(data), data
+        return None, data
+
+    @staticmethod
+    def __digest(auth: Any, method: str, url: str, challenge: str) -> str:
+        """
+        Build the Authorization header for the digest challenge, RFC 7616
+        """
+        fields = urllib.request.parse_keqv_list(urllib.request.parse_http_list(challenge[len("digest "):]))
+        algorithm = fields.get("algorithm", "MD5").upper()
+        hash_name = {"MD5": "md5", "MD5-SESS": "md5", "SHA-256": "sha256", "SHA-256-SESS": "sha256"}.get(algorithm)
+        if hash_name is None:
+            raise ValueError(f'Unsupported digest algorithm "{algorithm}"')
+
+        def digest(text: str) -> str:
+            return hashlib.new(hash_name, text.encode()).hexdigest()
+
+        parts = urlsplit(url)
+        uri = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+        realm, nonce = fields.get("realm", ""), fields.get("nonce", "")
+        cnonce, nc = os.urandom(8).hex(), "00000001"
+        ha1 = digest(f'{auth.username}:{realm}:{auth.password}')
+        if algorithm.endswith("-SESS"):
+            ha1 = digest(f'{ha1}:{nonce}:{cnonce}')
+        ha2 = digest(f'{method}:{uri}')
+        qop = "auth" in [value.strip() for value in fields.get("qop", "").split(",")]
+        response = digest(f'{ha1}:{nonce}:{nc}:{cnonce}:auth:{ha2}' if qop else f'{ha1}:{nonce}:{ha2}')
+
+        header = f'Digest username="{auth.username}", realm="{realm}", nonce="{nonce}", uri="{uri}", ' + \
+            f'response="{response}", algorithm="{algorithm}"'
+        if "opaque" in fields:
+            header += f', opaque="{fields["opaque"]}"'
+        if qop:
+            header += f', qop="auth", nc={nc}, cnonce="{cnonce}"'
+        return header
+
+    def close(self):
+        self.__cookies.clear()
+
+
+class HttpClientTransport(Transport):
+    """
+    Lean transport based on http.client with its own keep-alive pool
+
+    Does much less work per request than requests and urllib3, but supports less: proxies from the environment
+    are not used, compressed responses are not requested, TLS certificates are verified with the system CA store.
+    """
+
+    __idle: Dict[PoolKey, List[http.client.HTTPConnection]]
+    """Kept-alive connections, that are not used at the moment"""
+    __lock: threading.Lock
+    __context: Optional[ssl.SSLContext]
+
+    def __init__(self, pool_size: int = 10):
+        super().__init__(pool_size)
+        self.__idle = {}
+        self.__lock = threading.Lock()
+        self.__context = None
+
+    def session(self) -> HttpClientSession:
+        return HttpClientSession(self)
+
+    @staticmethod
+    def __dropped(connection: http.client.HTTPConnection) -> bool:
+        """
+        Check if the server has closed the idle connection, same as urllib3 does before reusing it
+        """
+        if connection.sock is None:
+            return False
+        try:
+            return bool(select.select([connection.sock], [], [], 0)[0])
+        except (OSError, ValueError):
+            return True
+
+    def acquire(self, key: PoolKey, timeout: Optional[float]) -> http.client.HTTPConnection:
+        """
+        Get an idle connection or create a new one, it is connected when the request is sent
+        """
+        AppState.add_connection_request()
+        while True:
+            with self.__lock:
+                idle = self.__idle.get(key)
+                connection = idle.pop() if idle else None
+            if connection is None or not self.__dropped(connection):
+                break
+            connection.close()
+
+        if connection is None:
+            return self.__new(key, timeout)
+
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection
+
+    def __new(self, key: PoolKey, timeout: Optional[float]) -> http.client.HTTPConnection:
+        if key[0] == "https":
+            if self.__context is None:
+                self.__context = ssl.create_default_context()
+            return TimedHTTPSConnection(key[1], key[2], timeout=timeout, context=self.__context)
+        return TimedHTTPConnection(key[1], key[2], timeout=timeout)
+
+    def warmup(self, url: str, connections: int = 1, timeout: Optional[float] = None) -> int:
+        key = _pool_key(url)
+        with self.__lock:
+            idle = len(self.__idle.get(key, []))
+        opened = 0
+        for _ in range(min(connections, self.PoolSize) - idle):
+            connection = self.__new(key, timeout)
+            connection.connect()
+            self.release(key, connection)
+            opened += 1
+        return opened
+
+    def release(self, key: PoolKey, connection: http.client.HTTPConnection):
+        """
+        Keep the connection for the next request, unless the pool is full
+        """
+        with self.__lock:
+            idle = self.__idle.setdefault(key, [])
+            if len(idle) < self.PoolSize:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self.__lock:
+            idle, self.__idle = self.__idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
@@ -0,0 +1,214 @@
+import socket
+import time
+from typing import Any, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+from pyapitester.helpers import AppState
+from pyapitester.timings import Timings
+from pyapitester.transport import Transport, TransportResponse, TransportSession, _resolve
+
+
+class TimedConnectionMixin(object):
+    """
+    Adds "dns", "connect" and "ttfb" phases to the timeline of the current request
+    """
+
+    _connected_at: float = 0.0
+    """time.perf_counter() when the TCP connection was established"""
+
+    def _new_conn(self) -> socket.socket:
+        host = self._dns_host
+        addresses = _resolve(host, self.port)
+        if not addresses:
+            # Let urllib3 report the resolution error in its usual way
+            return super()._new_conn()
+
+        start = time.perf_counter()
+        try:
+            # The host name is still used for TLS and the Host header,
+            # only the socket is connected to the resolved address
+            for index, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except NewConnectionError:
+                    if index == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+            self._connected_at = Timings.since("connect", start)
+
+    def getresponse(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().getresponse(*args, **kwargs)
+        finally:
+            Timings.since("ttfb", start)
+
+
+class CountingHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    """
+    HTTP connection, that reports every new TCP connection to the AppState
+    """
+
+    def connect(self):
+        AppState.add_connection(tls=False)
+        super().connect()
+
+
+class CountingHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    """
+    HTTPS connection, that reports every new TCP connection and TLS handshake to the AppState
+    """
+
+    def connect(self):
+        AppState.add_connection(tls=True)
+        super().connect()
+        # Everything after the TCP connection is the TLS handshake
+        Timings.since("tls", self._connected_at)
+
+
+class CountingPoolMixin(object):
+    """
+    Reports every connection request to the AppState, connections may be opened ahead of time
+    """
+
+    def _get_conn(self, timeout=None):
+        AppState.add_connection_request()
+        return super()._get_conn(timeout)
+
+    def warmup(self, count: int, timeout: Optional[float] = None) -> int:
+        """
+        Make sure the pool has at least "count" open connections, these are not connection requests
+
+        :return: Number of opened connections
+        """
+        connections = []
+        opened = 0
+        try:
+            for _ in range(count):
+                connection = super()._get_conn()
+                connections.append(connection)
+                if connection.is_closed:
+                    connection.timeout = timeout
+                    connection.connect()
+                    opened += 1
+        finally:
+            for connection in connections:
+                self._put_conn(connection)
+        return opened
+
+
+class CountingHTTPConnectionPool(CountingPoolMixin, HTTPConnectionPool):
+    ConnectionCls = CountingHTTPConnection
+
+
+class CountingHTTPSConnectionPool(CountingPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = CountingHTTPSConnection
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    Transport adapter with connection statistics
+
+    One adapter is shared by all sessions of the run
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool
+        }
+
+
+class PooledSession(requests.Session):
+    """
+    Session with its own cookies, but with connections from the shared pool
+    """
+
+    def __init__(self, adapter: PooledAdapter):
+        super().__init__()
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def close(self):
+        # Connections belong to the shared pool and stay open,
+        # the session just forgets its own state
+        self.cookies.clear()
+
+
+class RequestsResponse(TransportResponse):
+    __response: requests.Response
+
+    def __init__(self, response: requests.Response):
+        self.__response = response
+        self.Status = response.raw.status
+        self.Headers = list(response.raw.headers.items())
+        self.Elapsed = response.elapsed.total_seconds()
+
+    def read(self) -> bytes:
+        return self.__response.raw.data
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        return self.__response.iter_content(chunk_size=chunk_size)
+
+    def close(self):
+        self.__response.close()
+
+
+class RequestsSession(TransportSession):
+    """
+    Transport session on top of PooledSession
+    """
+
+    __session: PooledSession
+
+    def __init__(self, adapter: PooledAdapter):
+        self.__session = PooledSession(adapter)
+
+    def request(self, method: str, url: str, headers: Any, auth: Any, data: Any,
+                timeout: Optional[float]) -> TransportResponse:
+        self.__session.max_redirects = self.MaxRedirects
+        return RequestsResponse(self.__session.request(method=method, url=url, headers=headers, auth=auth,
+                                                       data=data, timeout=timeout, stream=True))
+
+    def close(self):
+        self.__session.close()
+
+
+class RequestsTransport(Transport):
+    """
+    Transport based on requests and urllib3, the default one
+
+    Supports everything requests does, e.g. proxies from the environment and compressed responses
+    """
+
+    __adapter: PooledAdapter
+
+    def __init__(self, pool_size: int = 10):
+        super().__init__(pool_size)
+        self.__adapter = PooledAdapter(pool_maxsize=pool_size)
+
+    def session(self) -> RequestsSession:
+        return RequestsSession(self.__adapter)
+
+    def warmup(self, url: str, connections: int = 1, timeout: Optional[float] = None) -> int:
+        # The same pool as the one used for the requests, the pool key depends on the TLS settings
+        # and the proxies, requests takes both from the environment, e.g. REQUESTS_CA_BUNDLE
+        settings = PooledSession(self.__adapter).merge_environment_settings(url, {}, None, None, None)
+        if hasattr(self.__adapter, "get_connection_with_tls_context"):
+            pool = self.__adapter.get_connection_with_tls_context(
+                requests.Request("GET", url).prepare(), settings["verify"], settings["proxies"], settings["cert"])
+        else:
+            # requests < 2.32.2
+            pool = self.__adapter.get_connection(url, settings["proxies"])
+        return pool.warmup(min(connections, self.PoolSize), timeout)
+
+    def close(self):
+        self.__adapter.close()
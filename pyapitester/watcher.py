@@ -0,0 +1,166 @@
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from pyapitester.collection import Collection
+from pyapitester.helpers import AppLogger, AppState, Environment
+from pyapitester.httprequest import HttpRequest
+from pyapitester.runner import Runner
+
+
+class Watcher:
+    """
+    Runs the collection again every time its files are changed, see the watch command
+
+    Everything stays warm between iterations: the connection pool, compiled scripts,
+    parsed request files and the environment variables set by scripts.
+    Only changed requests are executed again. If a changed request belongs to a session chain,
+    the whole folder is executed. If the environment file or any env.toml file is changed, everything is executed.
+    """
+
+    INTERVAL: float = 0.2
+    """Polling interval, seconds"""
+
+    runner: Runner
+    path: str
+    """Collection folder or a single request file"""
+    environment: Optional[str]
+    """Environment file, if any"""
+    root: Optional[str]
+    """Collection folder with env.toml files, if any"""
+
+    __collection: Optional[Collection]
+    __filters: Dict[str, Optional[List[str]]]
+    __parse_once: bool
+    __requests: Dict[str, HttpRequest]
+    """Request files in the execution order and their parsed requests"""
+    __stamps: Dict[str, Tuple[int, int]]
+    """Modification time and size of every watched file"""
+
+    def __init__(self, runner: Runner, path: str, environment: Optional[str] = None, root: Optional[str] = None,
+                 include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                 tags: Optional[List[str]] = None, parse_once: bool = False):
+        self.runner = runner
+        self.path = path
+        self.environment = environment
+        self.root = root
+        self.__collection = Collection(path) if os.path.isdir(path) else None
+        self.__filters = {"include": include, "exclude": exclude, "tags": tags}
+        self.__parse_once = parse_once
+        self.__requests = {}
+        self.__stamps = {}
+
+    @staticmethod
+    def __stamp(path: str) -> Tuple[int, int]:
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return -1, -1
+
+    def __changes(self) -> Tuple[List[str], bool]:
+        """
+        Find new and changed request files, forget deleted ones
+
+        :return: Changed request files, sorted, and True if the environment file or an env.toml file was changed
+        """
+        if self.__collection is not None:
+            files = self.__collection.requests(**self.__filters)
+        else:
+            files = [self.path]
+
+        changed = []
+        for path in files:
+            stamp = self.__stamp(path)
+            if self.__stamps.get(path) != stamp:
+                self.__stamps[path] = stamp
+                changed.append(path)
+        for path in set(self.__requests) - set(files):
+            del self.__requests[path]
+            del self.__stamps[path]
+
+        env_changed = False
+        for path in self.__environment_files(files):
+            stamp = self.__stamp(path)
+            env_changed |= self.__stamps.get(path) != stamp
+            self.__stamps[path] = stamp
+
+        # Keep the execution order
+        requests: Dict[str, Optional[HttpRequest]] = {path: self.__requests.get(path) for path in files}
+        for path in changed:
+            requests[path] = None
+        self.__requests = requests
+        return changed, env_changed
+
+    def __environment_files(self, files: List[str]) -> List[str]:
+        """
+        Get the environment file and the env.toml files of all request folders and their parents
+        """
+        result = [self.environment] if self.environment is not None else []
+        if self.root is None:
+            return result
+
+        folders: Set[str] = set()
+        for path in files:
+            folder = os.path.dirname(os.path.abspath(path))
+            while folder not in folders and os.path.commonpath([self.root, folder]) == self.root:
+                folders.add(folder)
+                folder = os.path.dirname(folder)
+        return result + [os.path.join(folder, Environment.FOLDER_FILE) for folder in sorted(folders)]
+
+    def __select(self, changed: List[str], everything: bool) -> List[HttpRequest]:
+        """
+        Parse changed requests and get all requests to execute, in the execution order
+
+        :param everything: Execute all requests, not only the changed ones
+        """
+        for path in changed:
+            self.__requests[path] = HttpRequest(path, parse_once=self.__parse_once)
+        if everything:
+            return list(self.__requests.values())
+
+        # Session state is built by the whole folder, so the folder is executed again
+        folders: Set[str] = set()
+        for path in changed:
+            folder = os.path.dirname(path)
+            if any(req.Session for other, req in self.__requests.items() if os.path.dirname(other) == folder):
+                folders.add(folder)
+
+        selected = set(changed)
+        return [req for path, req in self.__requests.items()
+                if path in selected or os.path.dirname(path) in folders]
+
+    def iterate(self) -> int:
+        """
+        Execute all changed requests once
+
+        :return: Number of executed requests
+        """
+        changed, env_changed = self.__changes()
+        if not changed and not env_changed:
+            return 0
+        if env_changed:
+            # New environment, everything is executed from scratch
+            self.runner.env = Environment(self.environment, root=self.root)
+
+        requests = self.__select(changed, everything=env_changed)
+        AppState.reset()
+        self.runner.requests = requests
+        self.runner.run(keep_alive=True)
+        return len(requests)
+
+    def watch(self):
+        """
+        Execute the collection and wait for changes, until interrupted with Ctrl+C
+        """
+        try:
+            while True:
+                if self.iterate() > 0:
+                    AppLogger.log(f'{AppLogger.Colors.OKCYAN}Watching {len(self.__requests)} requests, ' +
+                                  f'press Ctrl+C to stop{AppLogger.Colors.ENDC}')
+                time.sleep(self.INTERVAL)
+        except KeyboardInterrupt:
+            logging.info('Stopped')
+        finally:
+            self.runner.transport.close()
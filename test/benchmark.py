@@ -0,0 +1,249 @@
+"""
+Offline benchmark of the request processing overhead
+
+Synthetic collections are sent to a local httpbin stand-in, see httpbin_stub.py.
+Per-request time is split into phases:
+    parse    - reading and tokenizing request files
+    template - variable substitution and TOML parsing
+    script   - pre- and post-request scripts
+    send     - sending the request and receiving the response
+
+Usage:
+    python test/benchmark.py                      # compare with the baseline
+    python test/benchmark.py --sizes 10 1000      # smaller collections only
+    python test/benchmark.py --update-baseline    # store the results as a new baseline
+    python test/benchmark.py --transports httpclient  # only the http.client based transport
+
+Results of the default transport are named "<variant>-<size>", others "<variant>-<size>-<transport>".
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from httpbin_stub import HttpbinStub
+from pyapitester.helpers import AppLogger, AppState, Environment
+from pyapitester.httprequest import HttpRequest
+from pyapitester.runner import Runner
+from pyapitester.transport import Transport
+
+SIZES: List[int] = [10, 1000, 10000]
+VARIANTS: List[str] = ["plain", "scripts", "multipart"]
+PHASES: List[str] = ["parse", "template", "script", "send"]
+FOLDER_SIZE: int = 100
+"""Number of requests per folder"""
+
+BASELINE_FILE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+PLAIN_REQUEST = '''[request]
+url = '{{base_url}}post?index=%(index)d'
+method = 'POST'
+timeout = 5000
+expected_status = [200]
+
+[headers]
+Content-Type = "application/json"
+X-Request-Index = "%(index)d"
+
+[body]
+type = "text"
+text = \'\'\'{
+    "name": "{{test_str}}",
+    "index": %(index)d
+}\'\'\'
+'''
+
+MULTIPART_REQUEST = '''[request]
+url = '{{base_url}}post'
+method = 'POST'
+timeout = 5000
+expected_status = [200]
+
+[body]
+type = "multipart"
+
+[multipart-1]
+name = "json_data"
+data = '{"name": "{{test_str}}", "index": %(index)d}'
+
+[multipart-2]
+name = "file_data"
+filename = "../upload.txt"
+
+[multipart-3]
+name = "virtual_file"
+filename = "virtual.txt"
+data = "Lorem ipsum dolor sit amet"
+'''
+
+SCRIPTS = '''
+[scripts]
+pre-request = \'\'\'
+EnvVars["last_index"] = %(index)d
+\'\'\'
+post-request = \'\'\'
+@test_case("Status")
+def validate_status():
+    expect(res.Status).to.equal(200)
+
+@test_case("Body")
+def validate_body():
+    expect(res.Json).to.have.key("json")
+    expect(res.Json["json"]["index"]).to.equal(%(index)d)
+\'\'\'
+'''
+
+
+def make_collection(root: str, size: int, variant: str, base_url: str) -> List[str]:
+    """
+    Create a synthetic collection
+
+    :return: Request files in the execution order
+    """
+    with open(os.path.join(root, "bench.env"), "w") as f:
+        f.write(f"[vars]\nbase_url = '{base_url}'\ntest_str = 'This Is A String'\n")
+    with open(os.path.join(root, "upload.txt"), "w") as f:
+        f.write("Lorem ipsum dolor sit amet")
+
+    template = MULTIPART_REQUEST if variant == "multipart" else PLAIN_REQUEST
+    if variant == "scripts":
+        template += SCRIPTS
+
+    files = []
+    for index in range(size):
+        folder = os.path.join(root, f"{index // FOLDER_SIZE:04d}")
+        os.makedirs(folder, exist_ok=True)
+        filename = os.path.join(folder, f"{index:05d}.toml")
+        with open(filename, "w") as f:
+            f.write(template % {"index": index})
+        files.append(filename)
+    return files
+
+
+def run_benchmark(size: int, variant: str, base_url: str, transport: str = Transport.NAMES[0]) -> Dict[str, float]:
+    """
+    Run one synthetic collection
+
+    :param transport: See Transport.NAMES
+    :return: Mean duration of every phase per request, us. "failed" is the number of failed requests and tests
+    """
+    with tempfile.TemporaryDirectory() as root:
+        files = make_collection(root, size, variant, base_url)
+        env = Environment(os.path.join(root, "bench.env"))
+        runner = Runner(env, scripts=(variant == "scripts"), transport=transport)
+
+        start = time.perf_counter()
+        request_list = [HttpRequest(filename) for filename in files]
+        totals = {phase: 0.0 for phase in PHASES}
+        totals["parse"] = (time.perf_counter() - start) * 1000
+
+        requests_failed = AppState.RequestsFailed
+        tests_failed = AppState.TestsFailed
+        sessions = {}
+        for req in request_list:
+            AppLogger.group_start()
+            try:
+                res = runner.run_request(req, sessions)
+            finally:
+                AppLogger.group_end(discard=True)
+            totals["template"] += res.Timings.get("prepare", 0.0)
+            totals["script"] += res.Timings.get("pre_script", 0.0) + res.Timings.get("post_script", 0.0)
+            totals["send"] += res.Timings.get("send", 0.0)
+        runner.transport.close()
+
+    result = {phase: totals[phase] * 1000 / size for phase in PHASES}
+    result["total"] = sum(result.values())
+    result["failed"] = (AppState.RequestsFailed - requests_failed) + (AppState.TestsFailed - tests_failed)
+    return result
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[str]:
+    """
+    Find phases slower than the baseline
+
+    :param tolerance: Allowed slowdown, e.g. 0.5 is 50%
+    :return: Descriptions of all regressions
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for phase in PHASES + ["total"]:
+            expected = baseline[name].get(phase)
+            if expected is not None and result[phase] > expected * (1 + tolerance):
+                regressions.append(f'{name} {phase}: {result[phase]:.1f} us, baseline: {expected:.1f} us')
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the request processing overhead")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Collection sizes")
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=VARIANTS, help="Collection variants")
+    parser.add_argument("--transports", nargs="+", choices=Transport.NAMES, default=Transport.NAMES,
+                        help="Transports to compare, default is all")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline file")
+    parser.add_argument("--update-baseline", action='store_true', help="Store the results as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Allowed slowdown compared to the baseline, default is 0.5 (50%%)")
+    args = parser.parse_args(argv)
+
+    # Only the benchmark report is printed
+    AppLogger.init_logger(level=logging.WARNING)
+
+    results: Dict[str, Dict[str, float]] = {}
+    with HttpbinStub() as stub:
+        for variant in args.variants:
+            for size in args.sizes:
+                for transport in args.transports:
+                    name = f'{variant}-{size}' + (f'-{transport}' if transport != Transport.NAMES[0] else '')
+                    results[name] = run_benchmark(size, variant, stub.Url, transport)
+                    print(f'{name:>27}: ' +
+                          ', '.join(f'{phase} {results[name][phase]:8.1f}' for phase in PHASES + ["total"]) +
+                          f' us/request, failed: {results[name]["failed"]}')
+
+    # Per-request cost of every transport compared to the default one
+    default = Transport.NAMES[0]
+    for name, result in results.items():
+        base = name.rsplit('-', 1)[0]
+        if name.count('-') == 2 and base in results:
+            print(f'{name:>27}: send {result["send"] - results[base]["send"]:+8.1f} us/request, ' +
+                  f'total {result["total"] - results[base]["total"]:+8.1f} us/request compared to {default}')
+
+    failed = [name for name, result in results.items() if result["failed"] > 0]
+    if failed:
+        print(f'Failed requests or tests in: {", ".join(failed)}')
+        return 1
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline, "r") as f:
+                baseline = json.load(f)
+        baseline.update({name: {key: round(value, 1) for key, value in result.items() if key != "failed"}
+                         for name, result in results.items()})
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=4, sort_keys=True)
+            f.write("\n")
+        print(f'Baseline updated: {args.baseline}')
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print(f'No baseline found: {args.baseline}')
+        return 0
+
+    with open(args.baseline, "r") as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print(f'Regression: {regression}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
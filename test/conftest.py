@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from pyapitester.helpers import Environment
+from pyapitester.httprequest import HttpRequest
+from pyapitester.runner import Runner
+
+
+@pytest.fixture
+def write(tmp_path):
+    """
+    write(path, text): write a text file, missing folders are created
+
+    Relative paths are relative to tmp_path, the full path is returned
+    """
+    def write_file(path, text='[request]\nurl = "http://localhost"\n'):
+        path = os.path.join(str(tmp_path), path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    return write_file
+
+
+@pytest.fixture
+def write_request(write):
+    """
+    write_request(path, url, extra='', method='GET'): write a request file
+
+    The extra text follows the url in the "request" table, it may add other tables as well
+    """
+    def write_request_file(path, url, extra='', method='GET'):
+        return write(path, f"[request]\nmethod = '{method}'\nurl = '{url}'\n{extra}\n")
+
+    return write_request_file
+
+
+@pytest.fixture
+def run_request(write_request):
+    """
+    run_request(path, url, extra='', method='GET', runner=None): write a request file and run it
+
+    Without a runner a new one is created, its connections are closed afterwards
+    """
+    def run(path, url, extra='', method='GET', runner=None):
+        request = HttpRequest(write_request(path, url, extra, method))
+        if runner is not None:
+            return runner.run_request(request, {})
+        runner = Runner(Environment(None))
+        try:
+            return runner.run_request(request, {})
+        finally:
+            runner.transport.close()
+
+    return run
@@ -0,0 +1,189 @@
+"""
+Local stand-in for httpbin.org, so that tests and benchmarks can run offline
+"""
+import base64
+from email.parser import BytesParser
+from email.policy import HTTP
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+class HttpbinHandler(BaseHTTPRequestHandler):
+    """
+    Mimics the httpbin.org endpoints used by the playground
+    """
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, don't wait for ACKs between them
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload=None, headers=None, body=None):
+        if body is None:
+            body = json.dumps(payload).encode() if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for k, v in (headers.items() if isinstance(headers, dict) else headers or []):
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _headers(self):
+        return {k.replace('-', ' ').title().replace(' ', '-'): v for k, v in self.headers.items()}
+
+    def _body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                chunks.append(self.rfile.read(size + 2)[:size])
+                if size == 0:
+                    # Trailers are not supported
+                    return b''.join(chunks)
+        n = int(self.headers.get('Content-Length', 0) or 0)
+        return self.rfile.read(n) if n else b''
+
+    def _echo(self):
+        url = urlsplit(self.path)
+        raw = self._body()
+        result = {'args': {k: v[0] for k, v in parse_qs(url.query).items()}, 'headers': self._headers(),
+                  'origin': self.client_address[0], 'url': self.path, 'data': '', 'files': {}, 'form': {}, 'json': None}
+        ctype = self.headers.get('Content-Type', '')
+        if ctype.startswith('multipart/form-data'):
+            message = BytesParser(policy=HTTP).parsebytes(
+                b'Content-Type: ' + ctype.encode() + b'\r\n\r\n' + raw)
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                value = part.get_payload(decode=True).decode(errors='replace')
+                if part.get_filename():
+                    result['files'][name] = value
+                else:
+                    result['form'][name] = value
+        else:
+            result['data'] = raw.decode(errors='replace')
+            try:
+                result['json'] = json.loads(raw)
+            except ValueError:
+                pass
+        return result
+
+    def _route(self):
+        path = urlsplit(self.path).path
+        parts = [p for p in path.split('/') if p]
+        if self.command == 'OPTIONS':
+            self._body()
+            return self._send(200, None, {'Allow': 'GET, HEAD, POST, PUT, PATCH, DELETE, OPTIONS'})
+        if not parts:
+            return self._send(200, {}, body=b'<html></html>')
+        if parts[0] in ('get', 'post', 'put', 'patch', 'delete', 'anything'):
+            return self._send(200, self._echo())
+        if parts[0] == 'headers':
+            return self._send(200, {'headers': self._headers()})
+        if parts[0] == 'bytes' and len(parts) == 2:
+            return self._send(200, None, body=os.urandom(int(parts[1])))
+        if parts[0] == 'redirect' and len(parts) == 2:
+            count = int(parts[1])
+            return self._send(302, None, {'Location': f'/redirect/{count - 1}' if count > 1 else '/get'})
+        if parts[0] == 'cookies':
+            if len(parts) == 2 and parts[1] == 'set':
+                query = parse_qs(urlsplit(self.path).query)
+                return self._send(302, None, [('Location', '/cookies')] +
+                                  [('Set-Cookie', f'{k}={v[0]}; Path=/') for k, v in query.items()])
+            cookies = dict(item.strip().split('=', 1) for item in self.headers.get('Cookie', '').split(';') if item)
+            return self._send(200, {'cookies': cookies})
+        if parts[0] == 'status' and len(parts) == 2:
+            self._body()
+            return self._send(int(parts[1]))
+        if parts[0] == 'delay' and len(parts) == 2:
+            time.sleep(float(parts[1]))
+            return self._send(200, self._echo())
+        if parts[0] == 'basic-auth' and len(parts) == 3:
+            expected = 'Basic ' + base64.b64encode(f'{parts[1]}:{parts[2]}'.encode()).decode()
+            if self.headers.get('Authorization') == expected:
+                return self._send(200, {'authenticated': True, 'user': parts[1]})
+            return self._send(401, None, {'WWW-Authenticate': 'Basic realm="Fake Realm"'})
+        if parts[0] == 'digest-auth' and len(parts) == 4:
+            return self._digest(parts[2], parts[3])
+        return self._send(404, {'error': 'not found'})
+
+    def _digest(self, user, passwd):
+        auth = self.headers.get('Authorization', '')
+        realm, nonce = 'me@kennethreitz.com', 'abcdef0123456789'
+        if auth.startswith('Digest '):
+            fields = {}
+            for item in auth[7:].split(','):
+                k, _, v = item.strip().partition('=')
+                fields[k] = v.strip('"')
+            ha1 = hashlib.md5(f'{user}:{realm}:{passwd}'.encode()).hexdigest()
+            ha2 = hashlib.md5(f'{self.command}:{fields.get("uri")}'.encode()).hexdigest()
+            expected = hashlib.md5(
+                f'{ha1}:{fields.get("nonce")}:{fields.get("nc")}:{fields.get("cnonce")}:{fields.get("qop")}:{ha2}'
+                .encode()).hexdigest()
+            if fields.get('username') == user and fields.get('response') == expected:
+                return self._send(200, {'authenticated': True, 'user': user})
+        return self._send(401, None, {
+            'WWW-Authenticate': f'Digest realm="{realm}", qop="auth", nonce="{nonce}", opaque="0123", algorithm=MD5'})
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = do_HEAD = _route
+
+
+class HttpbinStub:
+    """
+    In-process HTTP server, running in a background thread
+
+    Usage:
+        with HttpbinStub() as stub:
+            base_url = stub.Url
+    """
+
+    Url: str
+    """Base URL with a trailing slash, e.g. http://127.0.0.1:12345/"""
+
+    __server: ThreadingHTTPServer
+    __thread: threading.Thread
+
+    def __init__(self, port: int = 0):
+        """
+        :param port: TCP port, any free port is used by default
+        """
+        self.__server = ThreadingHTTPServer(('127.0.0.1', port), HttpbinHandler)
+        self.__server.daemon_threads = True
+        self.Url = f'http://127.0.0.1:{self.__server.server_address[1]}/'
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+
+    def start(self) -> 'HttpbinStub':
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+        self.__thread.join()
+
+    def __enter__(self) -> 'HttpbinStub':
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+if __name__ == '__main__':
+    # Standalone mode, e.g. to run the playground offline:
+    # python test/httpbin_stub.py 8080
+    stub = HttpbinStub(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    print(f'Serving on {stub.Url}')
+    stub.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,20 @@
+from benchmark import VARIANTS, compare, run_benchmark
+from httpbin_stub import HttpbinStub
+
+
+def test_benchmark_collections():
+    # Every synthetic collection should pass against the local stand-in
+    with HttpbinStub() as stub:
+        for variant in VARIANTS:
+            result = run_benchmark(10, variant, stub.Url)
+            assert result["failed"] == 0, variant
+            assert result["send"] > 0, variant
+
+
+def test_benchmark_compare():
+    baseline = {"plain-10": {"parse": 10.0, "send": 100.0}}
+    results = {
+        "plain-10": {"parse": 16.0, "template": 1.0, "script": 0.0, "send": 120.0, "total": 137.0},
+        "plain-1000": {"parse": 100.0, "template": 1.0, "script": 0.0, "send": 100.0, "total": 201.0}
+    }
+    assert compare(results, baseline, 0.5) == ['plain-10 parse: 16.0 us, baseline: 10.0 us']
@@ -0,0 +1,48 @@
+import pytest
+
+from httpbin_stub import HttpbinStub
+from pyapitester.cassette import Cassette
+from pyapitester.helpers import Environment
+from pyapitester.runner import Runner
+
+
+def test_record_and_replay(tmp_path, run_request):
+    cassette = str(tmp_path / "responses.cassette")
+    post = "[body]\ntype = 'text'\ntext = '{text}'"
+
+    with HttpbinStub() as stub:
+        runner = Runner(Environment(None), record=cassette)
+        try:
+            run_request("first.toml", f"{stub.Url}post", post.format(text="first"), "POST", runner)
+            run_request("second.toml", f"{stub.Url}post", post.format(text="second"), "POST", runner)
+            run_request("stream.toml", f"{stub.Url}status/404", "stream = true", runner=runner)
+        finally:
+            runner.transport.close()
+    Cassette.check(cassette)
+
+    # The server is gone, responses of the same request file come first, then the recorded order
+    runner = Runner(Environment(None), replay=cassette)
+    res = run_request("second.toml", f"{stub.Url}post", post.format(text="second"), "POST", runner)
+    assert res.Status == 200 and res.Json["data"] == "second"
+    res = run_request("other.toml", f"{stub.Url}post", post.format(text="other"), "POST", runner)
+    assert res.Json["data"] == "first"
+    res = run_request("stream.toml", f"{stub.Url}status/404", "stream = true", runner=runner)
+    assert res.Status == 404 and res.Headers["Content-Type"] == "application/json"
+    res = run_request("missing.toml", f"{stub.Url}get", runner=runner)
+    assert res.Exception == "CassetteMiss"
+
+    # Matched by the body hash, regardless of the order
+    runner = Runner(Environment(None), replay=cassette, match_body=True)
+    res = run_request("other.toml", f"{stub.Url}post", post.format(text="second"), "POST", runner)
+    assert res.Json["data"] == "second"
+    res = run_request("other.toml", f"{stub.Url}post", post.format(text="third"), "POST", runner)
+    assert res.Exception == "CassetteMiss"
+
+
+def test_invalid_cassette(tmp_path):
+    with open(tmp_path / "broken.cassette", "wb") as f:
+        f.write(Cassette.MAGIC + b"interrupted recording, there is no index")
+    with pytest.raises(ValueError):
+        Cassette.check(str(tmp_path / "broken.cassette"))
+    with pytest.raises(ValueError):
+        Runner(Environment(None), replay=str(tmp_path / "broken.cassette"))
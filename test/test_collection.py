@@ -0,0 +1,62 @@
+import os
+
+from pyapitester.collection import Collection
+from pyapitester.helpers import AppCache
+
+
+def test_collection_index(tmp_path, write):
+    AppCache.Dir = str(tmp_path / "cache")
+    root = str(tmp_path / "collection")
+    write(os.path.join(root, "b", "01_get.toml"))
+    write(os.path.join(root, "a", "00_get.toml"))
+    write(os.path.join(root, "a", "env.toml"), '')
+    write(os.path.join(root, "a", "readme.md"), '')
+
+    expected = [os.path.join(root, "a", "00_get.toml"), os.path.join(root, "b", "01_get.toml")]
+    assert Collection(root).requests() == expected
+    # Second run uses the index
+    assert Collection(root).requests() == expected
+
+    write(os.path.join(root, "a", "sub", "02_get.toml"))
+    os.remove(os.path.join(root, "b", "01_get.toml"))
+    assert Collection(root).requests() == [os.path.join(root, "a", "00_get.toml"),
+                                           os.path.join(root, "a", "sub", "02_get.toml")]
+    AppCache.Dir = None
+
+
+def test_collection_index_after_exclude(tmp_path, write):
+    AppCache.Dir = str(tmp_path / "cache")
+    root = str(tmp_path / "collection")
+
+    def settle(*folders):
+        # Folders changed just now are always listed again, make them look older
+        for folder in folders:
+            path = os.path.join(root, folder)
+            os.utime(path, ns=(0, os.stat(path).st_mtime_ns - 10 ** 10))
+
+    write(os.path.join(root, "a", "0.toml"))
+    write(os.path.join(root, "b", "0.toml"))
+    settle("", "a", "b")
+    Collection(root).requests()
+
+    write(os.path.join(root, "c", "0.toml"))
+    settle("", "c")
+    assert Collection(root).requests(exclude=["b"]) == [os.path.join(root, "a", "0.toml"),
+                                                        os.path.join(root, "c", "0.toml")]
+    assert Collection(root).requests() == [os.path.join(root, "a", "0.toml"), os.path.join(root, "b", "0.toml"),
+                                           os.path.join(root, "c", "0.toml")]
+    AppCache.Dir = None
+
+
+def test_collection_filters(tmp_path, write):
+    root = str(tmp_path)
+    write(os.path.join(root, "a", "00_get.toml"), '[request]\ntags = ["smoke"]\n')
+    write(os.path.join(root, "a", "01_get.toml"), '[request]\ntags = ["{{tag}}"]\nurl = {{url}}\n')
+    write(os.path.join(root, "b", "00_get.toml"))
+
+    collection = Collection(root)
+    assert collection.requests(include=["a/*"]) == [os.path.join(root, "a", "00_get.toml"),
+                                                    os.path.join(root, "a", "01_get.toml")]
+    assert collection.requests(exclude=["a"]) == [os.path.join(root, "b", "00_get.toml")]
+    assert collection.requests(tags=["smoke"]) == [os.path.join(root, "a", "00_get.toml")]
+    assert collection.requests(tags=["{{tag}}"]) == [os.path.join(root, "a", "01_get.toml")]
@@ -0,0 +1,66 @@
+import json
+import time
+
+from httpbin_stub import HttpbinStub
+from pyapitester.dataset import Dataset
+from pyapitester.helpers import AppState, Environment, EnvVars, EnvVarsOverlay
+from pyapitester.httprequest import HttpRequest
+from pyapitester.runner import Runner
+
+
+def test_dataset_rows(write):
+    csv_file = write("rows.csv", "user,code\nalice,200\nbob,404\n")
+    jsonl_file = write("rows.jsonl", '{"user": "alice", "active": true}\n\n{"user": "bob", "active": false}\n')
+
+    assert list(Dataset(csv_file).rows()) == [{"user": "alice", "code": "200"}, {"user": "bob", "code": "404"}]
+    rows = Dataset(jsonl_file).rows()
+    assert next(rows) == {"user": "alice", "active": True}
+
+    base = EnvVars({"user": "admin", "token": "1"})
+    overlay = EnvVarsOverlay(base, {"user": "alice", "active": True})
+    assert overlay["user"] == "alice" and overlay["token"] == "1" and overlay["active"] == "true"
+    assert overlay.replace_vars("{{user}}:{{token}}") == "alice:1"
+    overlay["token"] = "2"
+    assert base["token"] == "2"
+
+
+def test_dataset_request(write, write_request):
+    write("rows.jsonl", ''.join(json.dumps({"user": f"user{index}", "path": "get" if index % 7 else "missing"}) + "\n"
+                                for index in range(20)))
+
+    with HttpbinStub() as stub:
+        path = write_request("request.toml", f"{stub.Url}{{{{path}}}}?user={{{{user}}}}",
+                             "dataset = 'rows.jsonl'\ndataset_jobs = 4\nexpected_status = [200]")
+        total = AppState.RequestsTotal
+        runner = Runner(Environment(None))
+        res = runner.run_request(HttpRequest(path), {})
+        runner.transport.close()
+
+    assert AppState.RequestsTotal - total == 20
+    assert not res.Result
+    assert res.ResultValue == "20 rows, failed: 3"
+
+
+def test_dataset_session(write, write_request):
+    write("rows.jsonl", ''.join(json.dumps({"user": f"user{index}"}) + "\n" for index in range(8)))
+
+    with HttpbinStub() as stub:
+        path = write_request("request.toml", f"{stub.Url}get?user={{{{user}}}}",
+                             "session = true\ndataset = 'rows.jsonl'\ndataset_jobs = 4")
+        runner = Runner(Environment(None))
+        created = []
+        session = runner.transport.session
+
+        def slow_session():
+            # Rows starting at the same time would all create their own session
+            time.sleep(0.05)
+            created.append(session())
+            return created[-1]
+
+        runner.transport.session = slow_session
+        sessions = {}
+        res = runner.run_request(HttpRequest(path), sessions)
+        runner.transport.close()
+
+    assert res.Result
+    assert len(created) == 1 and list(sessions.values()) == created
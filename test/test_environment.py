@@ -0,0 +1,40 @@
+import os
+
+from pyapitester.helpers import Environment, EnvVars
+
+
+def test_folder_scopes(tmp_path, write):
+    root = str(tmp_path)
+    write(os.path.join(root, "test.env"), "[vars]\nhost = 'global'\nuser = 'admin'\ndebug = true\n")
+    write(os.path.join(root, "users", "env.toml"), "[vars]\nuser = 'guest'\n")
+    write(os.path.join(root, "users", "admin", "env.toml"), "[vars]\nuser = 'root'\n")
+    os.makedirs(os.path.join(root, "users", "list"))
+
+    env = Environment(os.path.join(root, "test.env"), root=root)
+    assert env.env_vars["user"] == "admin"
+    assert env.env_vars["debug"] == "true"
+    assert env.folder_vars(os.path.join(root, "users"))["user"] == "guest"
+    assert env.folder_vars(os.path.join(root, "users", "admin"))["user"] == "root"
+    assert env.folder_vars(os.path.join(root, "users", "admin"))["host"] == "global"
+
+    # Folders without env.toml share the scope of the parent, scopes are cached
+    assert env.scope(os.path.join(root, "users", "list")) is env.scope(os.path.join(root, "users"))
+    assert env.scope(os.path.join(root, "users")) is env.scope(os.path.join(root, "users"))
+
+    # Variables set at runtime hide all scopes and are visible in every folder
+    env.folder_vars(os.path.join(root, "users"))["user"] = "changed"
+    assert env.env_vars["user"] == "changed"
+    del env.env_vars["user"]
+    assert "user" not in env.folder_vars(os.path.join(root, "users", "admin"))
+    assert env.scope(os.path.join(root, "users", "admin"))["user"] == "root"
+
+
+def test_isolated_layer(tmp_path):
+    env = Environment(None, root=str(tmp_path))
+    env.env_vars["token"] = "shared"
+
+    isolated = env.folder_vars(str(tmp_path), env.isolated_layer())
+    isolated["token"] = "own"
+    assert isolated["token"] == "own"
+    assert env.env_vars["token"] == "shared"
+    assert EnvVars({"flag": False}).replace_vars("{{flag}}") == "false"
@@ -0,0 +1,58 @@
+import logging
+import random
+
+from httpbin_stub import HttpbinStub
+from pyapitester.helpers import Environment
+from pyapitester.httprequest import HttpRequest
+from pyapitester.loadgen import LatencyHistogram, LoadGenerator
+from pyapitester.runner import Runner
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for value in range(1, 1001):
+        histogram.record(value)
+    assert histogram.Count == 1000
+    assert histogram.Min == 1
+    assert histogram.Max == 1000
+    for percent in (50, 90, 99):
+        assert abs(histogram.percentile(percent) - percent * 10) <= percent * 10 / 64
+    assert histogram.percentile(100) == 1000
+
+
+def test_histogram_merge():
+    values = [random.uniform(0.1, 5000) for _ in range(10000)]
+    merged = LatencyHistogram()
+    for chunk in range(0, len(values), 1000):
+        part = LatencyHistogram()
+        for value in values[chunk:chunk + 1000]:
+            part.record(value)
+        merged.merge(part)
+
+    single = LatencyHistogram()
+    for value in values:
+        single.record(value)
+
+    assert merged.Count == single.Count
+    assert merged.Max == single.Max
+    for percent in (50, 90, 99):
+        assert merged.percentile(percent) == single.percentile(percent)
+
+
+def test_load_errors(write_request, caplog):
+    files = [
+        ("01_raises.toml", "[scripts]\npost-request = 'raise RuntimeError(\"boom\")'\n"),
+        ("02_fails.toml", "[scripts]\npost-request = '''\n@test_case(\"Created\")\ndef created():\n" +
+         "    expect(res.Status).to.equal(201)\n'''\n"),
+        ("03_passes.toml", ""),
+    ]
+    with HttpbinStub() as stub:
+        runner = Runner(Environment(None))
+        for name, extra in files:
+            runner.add_request(HttpRequest(write_request(name, f"{stub.Url}get", extra)))
+        with caplog.at_level(logging.INFO):
+            LoadGenerator(runner, concurrency=2, iterations=4).run()
+
+    # Workers go on after an exception, every request is counted
+    assert "Requests: 12, errors: 8 (66.67%)" in caplog.text
+    assert "01_raises.toml raised RuntimeError: boom" in caplog.text
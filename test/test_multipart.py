@@ -0,0 +1,44 @@
+import os
+from email.parser import BytesParser
+from email.policy import HTTP
+
+from httpbin_stub import HttpbinStub
+from pyapitester.httprequest import HttpRequest
+from pyapitester.multipart import MultipartEncoder
+
+
+def field(name, filename=None, data=None):
+    result = HttpRequest.MultipartField()
+    result.Name, result.FileName, result.Data = name, filename, data
+    return result
+
+
+def test_multipart_encoder(tmp_path):
+    upload = str(tmp_path / "upload.bin")
+    content = os.urandom(MultipartEncoder.CHUNK_SIZE * 2 + 100)
+    with open(upload, "wb") as f:
+        f.write(content)
+
+    encoder = MultipartEncoder([field("text", data="Lorem ipsum"), field("file", filename=upload),
+                                field("virtual", filename="virtual.txt", data='Quoted "name"')])
+    body = b''.join(encoder)
+    assert len(body) == len(encoder)
+    # The body can be sent again, e.g. after a redirect
+    assert b''.join(encoder) == body
+
+    message = BytesParser(policy=HTTP).parsebytes(
+        b'Content-Type: ' + encoder.ContentType.encode() + b'\r\n\r\n' + body)
+    parts = list(message.iter_parts())
+    assert [part.get_param('name', header='content-disposition') for part in parts] == ["text", "file", "virtual"]
+    assert [part.get_filename() for part in parts] == [None, "upload.bin", "virtual.txt"]
+    assert parts[1].get_payload(decode=True) == content
+
+
+def test_multipart_chunked(write, run_request):
+    write("upload.txt", "Lorem ipsum dolor sit amet")
+    with HttpbinStub() as stub:
+        res = run_request("request.toml", f"{stub.Url}post", "[body]\ntype = 'multipart'\nchunked = true\n" +
+                          "[multipart-1]\nname = 'file'\nfilename = 'upload.txt'", "POST")
+    assert res.Status == 200
+    assert res.Json["headers"]["Transfer-Encoding"] == "chunked"
+    assert res.Json["files"] == {"file": "Lorem ipsum dolor sit amet"}
@@ -0,0 +1,50 @@
+import time
+
+from httpbin_stub import HttpbinStub
+from pyapitester.helpers import AppState, Environment
+from pyapitester.httprequest import HttpRequest
+from pyapitester.runner import Runner
+from pyapitester.scripts import ScriptEffects
+
+
+def test_script_effects():
+    assert not ScriptEffects.mutates('expect(res.Json["id"]).to.equal(EnvVars["id"])\nif "a" in EnvVars: pass')
+    assert not ScriptEffects.mutates('if EnvVars.get("a", "") == "b": pass\ny = res.Json[EnvVars["key"]]')
+    assert not ScriptEffects.mutates('print(f"{EnvVars[\'a\']}", len(EnvVars["b"]))\nx = EnvVars["c"] + [1]')
+    assert not ScriptEffects.mutates('expect(EnvVars["a"]).to.equal(1)\nx = EnvVars.replace_vars("{{a}}")')
+    assert ScriptEffects.mutates('@test_case("Save")\ndef save():\n    EnvVars["token"] = res.Json["token"]\n')
+    assert ScriptEffects.mutates('del EnvVars["token"]')
+    assert ScriptEffects.mutates('EnvVars["items"].append(1)')
+    # The value may be changed through another name
+    assert ScriptEffects.mutates('v = EnvVars["items"]\nv.append(1)')
+    assert ScriptEffects.mutates('v = EnvVars.get("items") or []\nv.append(1)')
+    assert ScriptEffects.mutates('v = EnvVars["config"].get("items")')
+    assert ScriptEffects.mutates('store(EnvVars["items"])')
+    assert ScriptEffects.mutates('store(items=EnvVars["items"])')
+    assert ScriptEffects.mutates('store(EnvVars)')
+    assert ScriptEffects.mutates('globals()["EnvVars"]["token"] = 1')
+
+
+def test_script_workers(write_request):
+    slow = "[scripts]\npost-request = '''\n@test_case(\"Slow\")\ndef slow():\n    import time\n" + \
+           "    time.sleep(0.3)\n    expect(res.Status).to.equal(200)\n'''"
+    with HttpbinStub() as stub:
+        files = [
+            ("01_first.toml", f"{stub.Url}get", slow),
+            ("02_second.toml", f"{stub.Url}get", slow),
+            # Waits for both slow scripts, the next request sees the variable
+            ("03_set.toml", f"{stub.Url}get", "[scripts]\npost-request = 'EnvVars[\"done\"] = \"yes\"'"),
+            ("04_use.toml", f"{stub.Url}get?done={{{{done}}}}", "[scripts]\npost-request = '''\n" +
+             "@test_case(\"Variable\")\ndef variable():\n    expect(res.Json[\"args\"][\"done\"]).to.equal(\"yes\")\n" +
+             "'''"),
+        ]
+        runner = Runner(Environment(None), script_workers=2)
+        for name, url, extra in files:
+            runner.add_request(HttpRequest(write_request(name, url, extra)))
+
+        AppState.reset()
+        start = time.perf_counter()
+        runner.run()
+        # Both slow scripts were executed at the same time
+        assert time.perf_counter() - start < 0.55
+        assert AppState.RequestsOk == 4 and AppState.TestsOk == 3 and AppState.TestsFailed == 0
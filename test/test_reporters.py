@@ -0,0 +1,40 @@
+import json
+import xml.etree.ElementTree as ElementTree
+
+from pyapitester.reporters import JsonLinesReporter, JUnitReporter, Reporters
+
+
+def request_event(path, passed):
+    return {"event": "request", "path": path, "method": "GET", "url": "http://localhost/", "passed": passed,
+            "result": 200 if passed else "ConnectionError", "exception": None if passed else "ConnectionError",
+            "details": None if passed else "Connection refused", "time": 1, "size": 0, "timings": {"total": 12.0}}
+
+
+def test_reporters(tmp_path):
+    junit_file = str(tmp_path / "report.xml")
+    jsonl_file = str(tmp_path / "report.jsonl")
+    Reporters.add(JUnitReporter(junit_file))
+    Reporters.add(JsonLinesReporter(jsonl_file))
+
+    Reporters.emit("run_start", time=Reporters.now())
+    Reporters.emit("test_case", request="a/00.toml", name="Status", function="status", passed=False, error="Oops")
+    event = request_event("a/00.toml", True)
+    Reporters.emit(event.pop("event"), **event)
+    event = request_event("b/00.toml", False)
+    Reporters.emit(event.pop("event"), **event)
+    Reporters.close()
+    assert not Reporters.enabled()
+
+    with open(jsonl_file) as f:
+        events = [json.loads(line) for line in f]
+    assert [event["event"] for event in events] == ["run_start", "test_case", "request", "request"]
+
+    root = ElementTree.parse(junit_file).getroot()
+    assert root.get("tests") == "3"
+    assert root.get("failures") == "2"
+    suites = root.findall("testsuite")
+    assert [suite.get("name") for suite in suites] == ["a", "b"]
+    cases = suites[0].findall("testcase")
+    assert [case.get("classname") for case in cases] == ["a", "a/00.toml"]
+    assert cases[0].get("time") == "0.012"
+    assert cases[1].find("failure").get("message") == "Oops"
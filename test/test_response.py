@@ -0,0 +1,99 @@
+import hashlib
+import json
+
+from httpbin_stub import HttpbinStub
+from pyapitester.helpers import AppState
+from pyapitester.httpresponse import HttpResponse
+
+
+def test_response_save_to(tmp_path, run_request):
+    with HttpbinStub() as stub:
+        res = run_request("save.toml", f"{stub.Url}bytes/300000", "[response]\nsave_to = 'out/body.bin'")
+        assert res.Status == 200 and res.Size == 300000 and res.Throughput > 0
+        with open(str(tmp_path / "out" / "body.bin"), "rb") as f:
+            assert hashlib.sha256(f.read()).hexdigest() == res.Checksum == res.Sha256
+
+        res = run_request("discard.toml", f"{stub.Url}bytes/1000", "[response]\ndiscard = true\nchecksum = 'md5'")
+        assert res.Size == 1000 and len(res.Checksum) == 32 and res.Sha256 is None
+        assert res.Content is None
+
+
+def test_response_stream(run_request):
+    def script(*checks):
+        return "[scripts]\npost-request = '''\nimport hashlib\n@test_case(\"Body\")\ndef body():\n" + \
+               ''.join(f"    {check}\n" for check in checks) + "'''"
+
+    tests_ok = AppState.TestsOk
+    with HttpbinStub() as stub:
+        # The rest of the body is spooled to a temporary file, JSON is never decoded from it
+        res = run_request("spool.toml", f"{stub.Url}bytes/300000", "stream = true\nmax_buffer = 1000\n" + script(
+            "expect(res.Body.InMemory).to.equal(False)",
+            "expect(res.Body.Complete).to.equal(True)",
+            "body = b''.join(res.Body)",
+            "expect(len(body)).to.equal(300000)",
+            "expect(hashlib.sha256(body).hexdigest()).to.equal(res.Sha256)",
+            "expect(res.Json).to.equal(None)"))
+        assert res.Status == 200 and res.Size == 300000 and len(res.Sha256) == 64 and res.TestsFailed == 0
+
+        # Without spooling only the buffer is kept, the size and the checksum are still of the whole body
+        stream = "stream = true\nmax_buffer = 1000\nspool = false\n"
+        res = run_request("buffer.toml", f"{stub.Url}bytes/300000", stream +
+                          script("expect(res.Body.Complete).to.equal(False)",
+                                 "expect(len(res.Body.read())).to.equal(1000)"))
+        assert res.Size == 300000 and len(res.Sha256) == 64 and res.TestsFailed == 0
+
+        # Even a JSON body isn't decoded, if it doesn't fit into the buffer
+        res = run_request("large.toml", f"{stub.Url}get", "stream = true\nmax_buffer = 10\n" + script(
+            "expect(res.Body.InMemory).to.equal(False)",
+            "expect(res.Json).to.equal(None)"))
+        assert res.TestsFailed == 0
+
+        res = run_request("small.toml", f"{stub.Url}get", "stream = true\n" + script(
+            "expect(res.Body.InMemory).to.equal(True)",
+            "expect(res.Json[\"url\"]).to.equal(\"/get\")"))
+        assert res.TestsFailed == 0
+    assert AppState.TestsOk - tests_ok == 4
+
+
+def test_response_json():
+    decoded = []
+
+    def decoder(content):
+        decoded.append(content)
+        return json.loads(content)
+
+    default = HttpResponse.JsonDecoder
+    try:
+        HttpResponse.register_json_decoder(decoder)
+        res = HttpResponse()
+        res.Headers = {"Content-Type": "application/problem+json"}
+        res.Content = b'{"id": 1}'
+        # Decoded only on the first access
+        assert decoded == [] and "json" not in res.Timings
+        assert res.Json == {"id": 1} and res.Json == {"id": 1}
+        assert len(decoded) == 1 and "json" in res.Timings
+
+        res = HttpResponse()
+        res.Headers = {"Content-Type": "text/html"}
+        res.Content = b'{"id": 1}'
+        assert res.Json is None and len(decoded) == 1
+        # Without Content-Type the body is tried anyway
+        res = HttpResponse()
+        res.Content = b'[1, 2]'
+        assert res.Json == [1, 2]
+
+        # The standard library decodes what the registered decoder rejects
+        HttpResponse.register_json_decoder(lambda content: 1 / 0)
+        res = HttpResponse()
+        res.Content = b'{"big": 1e400}'
+        assert res.Json == {"big": float("inf")}
+        res = HttpResponse()
+        res.Content = b'not json'
+        assert res.Json is None
+
+        assert HttpResponse.use_json_library("json") and HttpResponse.JsonDecoder is json.loads
+        assert not HttpResponse.use_json_library("no_such_json_library")
+        assert HttpResponse.JsonDecoder is json.loads
+        assert HttpResponse.use_json_library("auto")
+    finally:
+        HttpResponse.register_json_decoder(default)
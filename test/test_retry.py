@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from httpbin_stub import HttpbinStub
+from pyapitester.helpers import AppState, Environment
+from pyapitester.httprequest import HttpRequest
+from pyapitester.retry import RetryPolicy
+from pyapitester.runner import Runner
+
+
+def test_retry_policy():
+    policy = RetryPolicy({"attempts": 5, "backoff": 100, "max_backoff": 300, "jitter": False}, {"attempts": 3})
+    assert policy.Attempts == 3
+    assert [policy.delay(attempt) for attempt in (1, 2, 3)] == [0.1, 0.2, 0.3]
+    assert policy.retryable(503) and policy.retryable("ConnectionError") and not policy.retryable(404)
+    assert 0 <= RetryPolicy({"backoff": 100}).delay(1) <= 0.1
+    with pytest.raises(ValueError):
+        RetryPolicy({"attempts": 0})
+
+
+def test_retry_and_hedge(run_request):
+    AppState.reset()
+    with HttpbinStub() as stub:
+        res = run_request("retry.toml", f"{stub.Url}status/503", "[request.retry]\nattempts = 3\nbackoff = 10")
+        assert res.Status == 503 and res.Attempts == 3
+        assert res.Wasted > 0
+
+        res = run_request("ok.toml", f"{stub.Url}status/404", "[request.retry]\nattempts = 3")
+        assert res.Status == 404 and res.Attempts == 1
+
+        res = run_request("hedge.toml", f"{stub.Url}delay/0.2", "[request.retry]\nhedge = 20")
+        assert res.Status == 200 and res.Hedged and res.Timings["ttfb"] > 0
+    assert AppState.Retries == 2 and AppState.Hedges == 1
+
+
+def test_hedge_workers(write_request):
+    with HttpbinStub() as stub:
+        runner = Runner(Environment(None))
+        for index in range(3):
+            runner.add_request(HttpRequest(write_request(f"{index}.toml", f"{stub.Url}delay/0.1",
+                                                         "[request.retry]\nhedge = 20")))
+        workers = set()
+        run_request = runner.run_request
+
+        def run_and_collect(*args, **kwargs):
+            res = run_request(*args, **kwargs)
+            assert res.Hedged
+            workers.update(t for t in threading.enumerate() if t.name.startswith("hedge"))
+            return res
+
+        runner.run_request = run_and_collect
+        runner.run()
+    # All hedged requests share two workers, they are stopped at the end of the run
+    assert 0 < len(workers) <= 2
+    assert not any(worker.is_alive() for worker in workers)
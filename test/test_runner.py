@@ -0,0 +1,53 @@
+import logging
+import os
+import time
+
+from httpbin_stub import HttpbinStub
+from pyapitester.helpers import Environment
+from pyapitester.httprequest import HttpRequest
+from pyapitester.runner import Runner
+
+
+def test_jobs(write_request, caplog):
+    # Every script logs two lines with a pause, the output of other requests could get in between
+    script = "[scripts]\npost-request = '''\nimport time\nAppLogger.log(req.Path + ' begins')\n" + \
+             "time.sleep(0.1)\nAppLogger.log(req.Path + ' ends')\n'''"
+    with HttpbinStub() as stub:
+        files = [
+            ("a/01.toml", f"{stub.Url}delay/0.3", script),
+            ("b/01.toml", f"{stub.Url}delay/0.3", script),
+            # Requests of a session folder are executed one by one, on the same session
+            ("c/01.toml", f"{stub.Url}cookies/set?step=1", f"session = true\n{script}"),
+            ("c/02.toml", f"{stub.Url}cookies", f"session = true\n{script}"),
+        ]
+        runner = Runner(Environment(None), jobs=3)
+        for name, url, extra in files:
+            runner.add_request(HttpRequest(write_request(name, url, extra)))
+
+        intervals = {}
+        run_request = runner.run_request
+
+        def timed_run_request(req, *args):
+            start = time.perf_counter()
+            res = run_request(req, *args)
+            intervals[os.path.relpath(req.Path, os.path.dirname(os.path.dirname(req.Path)))] = \
+                (start, time.perf_counter(), res)
+            return res
+
+        runner.run_request = timed_run_request
+        with caplog.at_level(logging.INFO):
+            runner.run()
+
+    # Independent folders run at the same time
+    (a_start, a_end, _), (b_start, b_end, _) = intervals["a/01.toml"], intervals["b/01.toml"]
+    assert a_start < b_end and b_start < a_end
+    assert intervals["c/01.toml"][1] <= intervals["c/02.toml"][0]
+    assert intervals["c/02.toml"][2].Json == {"cookies": {"step": "1"}}
+
+    # The output of every request is printed at once
+    owners = []
+    for message in caplog.messages:
+        owner = next((name for name, _, _ in files if name in message), None)
+        if owner is not None and (not owners or owners[-1] != owner):
+            owners.append(owner)
+    assert sorted(owners) == sorted(name for name, _, _ in files)
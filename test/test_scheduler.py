@@ -0,0 +1,55 @@
+from httpbin_stub import HttpbinStub
+from pyapitester.helpers import AppState, Environment
+from pyapitester.httprequest import HttpRequest
+from pyapitester.runner import Runner
+from pyapitester.scheduler import RequestGraph
+
+
+def make_requests(write_request, files, url='http://localhost'):
+    return [HttpRequest(write_request(name, url, extra)) for name, extra in files]
+
+
+def test_graph_edges(write_request):
+    requests = make_requests(write_request, [
+        ("a/01_login.toml", 'produces = ["token"]'),
+        ("b/01_profile.toml", 'consumes = ["token"]'),
+        ("b/02_update.toml", 'depends_on = ["01_profile"]'),
+        ("c/01_first.toml", 'session = true'),
+        ("c/02_second.toml", ''),
+    ])
+    graph = RequestGraph(requests)
+    assert graph.Declared and graph.Error is None
+    assert graph.Parents[1] == {0} and graph.Parents[2] == {1}
+    # Session folders keep their order, but don't require the previous request to pass
+    assert graph.Parents[4] == {3} and graph.Required[4] == set()
+    assert graph.order() == [0, 1, 2, 3, 4]
+
+    total, path = graph.critical_path({0: 10.0, 1: 5.0, 2: 1.0, 3: 12.0, 4: 1.0})
+    assert total == 16.0 and path == [0, 1, 2]
+
+
+def test_graph_cycle(write_request):
+    requests = make_requests(write_request, [
+        ("a/01.toml", 'depends_on = ["02"]'),
+        ("a/02.toml", 'depends_on = ["01.toml"]'),
+        ("a/03.toml", ''),
+    ])
+    graph = RequestGraph(requests)
+    assert graph.Error is not None and graph.order() is None
+    assert not RequestGraph(requests[2:]).Declared
+
+
+def test_graph_failed_tests(write_request):
+    files = [
+        ("a/01_login.toml", "[scripts]\npost-request = \'\'\'\n" +
+         "@test_case(\"Created\")\ndef created():\n    expect(res.Status).to.equal(201)\n\'\'\'"),
+        ("b/01_profile.toml", 'depends_on = ["../a/01_login"]'),
+    ]
+    with HttpbinStub() as stub:
+        runner = Runner(Environment(None), jobs=2)
+        for req in make_requests(write_request, files, f"{stub.Url}get"):
+            runner.add_request(req)
+        AppState.reset()
+        runner.run()
+    # The request itself has passed, but its test hasn't
+    assert AppState.RequestsOk == 1 and AppState.TestsFailed == 1 and AppState.RequestsSkipped == 1
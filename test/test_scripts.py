@@ -0,0 +1,66 @@
+import importlib.util
+import logging
+import marshal
+import os
+import traceback
+
+import pytest
+
+from httpbin_stub import HttpbinStub
+from pyapitester.helpers import AppCache
+from pyapitester.scripts import ScriptCache
+
+
+def test_script_line_numbers(run_request, caplog):
+    script = "[scripts]\npost-request = '''\n" + \
+             "@test_case(\"Status\")\ndef status():\n    value = res.Status\n    raise ValueError(value)\n'''"
+    with HttpbinStub() as stub:
+        with caplog.at_level(logging.INFO):
+            res = run_request("request.toml", f"{stub.Url}get", script)
+    assert res.TestsFailed == 1
+    assert 'Failed with "ValueError" at line 4: ' in caplog.text
+
+    # Scripts raising outside of test cases show the same line in the traceback
+    with pytest.raises(KeyError) as error:
+        exec(ScriptCache.compile("value = 1\n\nraise KeyError(value)\n", "request.toml [post-request]"), {})
+    frame = traceback.extract_tb(error.value.__traceback__)[-1]
+    assert frame.filename == "request.toml [post-request]" and frame.lineno == 3
+
+
+def test_script_cache(tmp_path, monkeypatch):
+    AppCache.Dir = str(tmp_path)
+    source, filename = "result = 6 * 7\n", "cached.toml [post-request]"
+    try:
+        ScriptCache.clear()
+        code = ScriptCache.compile(source, filename)
+        cache_files = os.listdir(tmp_path / "scripts")
+        assert len(cache_files) == 1
+        cache_file = str(tmp_path / "scripts" / cache_files[0])
+
+        def compile_script(*args):
+            compiled.append(args)
+            return compile(*args)
+
+        # Read from the disk, nothing is compiled
+        compiled = []
+        monkeypatch.setattr("pyapitester.scripts.compile", compile_script, raising=False)
+        ScriptCache.clear()
+        namespace = {}
+        exec(ScriptCache.compile(source, filename), namespace)
+        assert namespace["result"] == 42 and compiled == []
+        assert ScriptCache.compile(source, filename).co_code == code.co_code
+
+        # Files of another Python version and broken files are compiled again and replaced
+        for data in (b"\0\0\0\0" + b"stale", importlib.util.MAGIC_NUMBER + b"\xff broken"):
+            with open(cache_file, "wb") as f:
+                f.write(data)
+            ScriptCache.clear()
+            namespace = {}
+            exec(ScriptCache.compile(source, filename), namespace)
+            assert namespace["result"] == 42 and len(compiled) == 1
+            compiled.clear()
+            with open(cache_file, "rb") as f:
+                assert marshal.loads(f.read()[len(importlib.util.MAGIC_NUMBER):]).co_code == code.co_code
+    finally:
+        AppCache.Dir = None
+        ScriptCache.clear()
@@ -0,0 +1,46 @@
+import json
+import os
+
+from pyapitester.helpers import AppState
+from pyapitester.httprequest import HttpRequest
+from pyapitester.reporters import ResultsReporter
+from pyapitester.shards import Shards
+
+
+def test_partition(tmp_path, write_request):
+    root = str(tmp_path)
+
+    def make_request(name, extra=''):
+        return HttpRequest(write_request(name, 'http://localhost', extra))
+
+    requests = [make_request(f"a/{index}.toml") for index in range(3)] + \
+               [make_request(f"b/{index}.toml") for index in range(2)] + \
+               [make_request("c/0.toml"), make_request("c/1.toml")]
+    shards = Shards.partition(requests, 2)
+    assert [[os.path.relpath(req.Path, root) for req in shard] for shard in shards] == \
+           [["a/0.toml", "a/1.toml", "a/2.toml"], ["b/0.toml", "b/1.toml", "c/0.toml", "c/1.toml"]]
+    assert Shards.parse("2/3") == (1, 3)
+
+    # Folders connected by dependencies stay together
+    requests.append(make_request("d/0.toml", 'depends_on = ["../a/0"]'))
+    shards = Shards.partition(requests, 2)
+    assert os.path.relpath(shards[0][-1].Path, root) == "d/0.toml"
+
+
+def test_merge(tmp_path):
+    files = []
+    for index, passed in enumerate([True, False]):
+        state = {"RequestsTotal": 1, "RequestsOk": int(passed), "RequestsFailed": int(not passed),
+                 "Timings": {"total": 10.0}}
+        events = [{"event": "run_start", "time": "2024-01-01T00:00:00+00:00"},
+                  {"event": "request", "path": f"{index}/00.toml", "passed": passed, "result": 200,
+                   "details": None},
+                  {"event": "run_end", "duration": 1.0, "state": state}]
+        files.append(str(tmp_path / f"{index}.json"))
+        with open(files[-1], "w") as f:
+            json.dump({"version": ResultsReporter.VERSION, "events": events}, f)
+
+    total, failed = AppState.RequestsTotal, AppState.RequestsFailed
+    Shards.merge(files)
+    assert AppState.RequestsTotal - total == 2
+    assert AppState.RequestsFailed - failed == 1
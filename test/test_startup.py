@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+from httpbin_stub import HttpbinStub
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_lazy_imports():
+    # The HTTP library and the assertion library are imported when they are needed, not with the runner
+    code = "import sys, pyapitester.runner\nprint(sorted({'requests', 'grappa'} & set(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+
+def test_timing_startup(tmp_path, write_request):
+    with HttpbinStub() as stub:
+        write_request("collection/get.toml", f"{stub.Url}get")
+        output = subprocess.run([sys.executable, os.path.join(ROOT, "main.py"), "run", str(tmp_path / "collection"),
+                                 "--timing-startup", "--no-cache"], cwd=ROOT, capture_output=True, text=True)
+    assert output.returncode == 0, output.stdout + output.stderr
+    text = output.stdout + output.stderr
+    assert "Startup timing:" in text
+    for phase in ("Imports and arguments", "Environment", "Discovery", "Runner", "Request files", "First response"):
+        assert f"{phase}: +" in text
+    assert "Modules loaded: " in text
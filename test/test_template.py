@@ -0,0 +1,84 @@
+import pytest
+
+from pyapitester.helpers import EnvVars
+from pyapitester.httprequest import HttpRequest
+from pyapitester.template import Template, ParsedTemplate, tomllib
+
+
+def test_render():
+    template = Template('{{base_url}}post?value={{test_int}}&missing={{missing}}&escaped={{{{x}}')
+    values = {"base_url": "http://localhost/", "test_int": 42}
+    assert template.render(values) == 'http://localhost/post?value=42&missing={{missing}}&escaped={{x}}'
+    assert template.Variables == {"base_url", "test_int", "missing"}
+
+
+def test_invalid_placeholders_are_kept():
+    template = Template('{{ spaced }} {{1st}} {x}} {{ok}}')
+    assert template.render({"ok": "yes"}) == '{{ spaced }} {{1st}} {x}} yes'
+    assert template.Variables == {"ok"}
+
+
+def test_key():
+    template = Template('{{a}} {{b}} {{a}}')
+    assert template.key({"a": 1, "b": 2}) == template.key({"a": 1, "b": 2, "c": 3})
+    assert template.key({"a": 1, "b": 2}) != template.key({"a": 1})
+
+
+def test_parsed_template():
+    source = '''
+[request]
+url = '{{base_url}}post'
+timeout = {{base_timeout}}
+expected_status = [{{status}}]
+
+[headers]
+# Comments with {{placeholders}} are ignored
+Content-Type = "text/plain"
+'''
+    parsed = ParsedTemplate(Template(source))
+    assert parsed.Valid
+
+    values = {"base_url": "http://localhost/", "base_timeout": "3500", "status": 200}
+    data = parsed.render(values)
+    assert data == tomllib.loads(Template(source).render(values))
+    assert data["request"]["timeout"] == 3500
+
+    # Tables without changed variables are not rebuilt
+    values["base_url"] = "http://127.0.0.1/"
+    updated = parsed.render(values)
+    assert updated["request"]["url"] == "http://127.0.0.1/post"
+    assert updated["headers"] is data["headers"]
+
+
+def test_parsed_template_fallback():
+    parsed = ParsedTemplate(Template('[request]\ntimeout = {{base_timeout}}000\n'))
+    assert not parsed.Valid
+
+
+def test_cached_body_is_copied(tmp_path):
+    path = tmp_path / "post.toml"
+    path.write_text("[request]\nmethod = 'POST'\nurl = '{{base_url}}post'\n" +
+                    "[body]\ntype = 'multipart'\n[multipart-1]\nname = 'field'\ndata = 'original'\n")
+    req = HttpRequest(str(path), parse_once=True)
+    env_vars = EnvVars({"base_url": "http://localhost/"})
+    req.prepare(env_vars)
+    # A pre-request script changes the body in place
+    req.Body.Multipart[0].Data = "changed"
+    req.Headers["X-Added"] = "1"
+    req.prepare(env_vars)
+    assert req.Body.Multipart[0].Data == "original" and "X-Added" not in req.Headers
+
+
+def test_request_table():
+    source = '[request]\ndataset = "data\\\\rows.csv"\ndepends_on = ["a]b", "login"]\nname = "a\\"b"\n' + \
+        'retry.attempts = 3\nauth = { user = "{{user}}" }\ntimeout = {{timeout}}\n' + \
+        '[scripts]\npost-request = """\n[request]\nsession = true\n"""\n'
+    table = HttpRequest.read_request_table(Template(source))
+    assert table == {"dataset": "data\\rows.csv", "depends_on": ["a]b", "login"], "name": 'a"b',
+                     "retry": {"attempts": 3}, "auth": {"user": "{{user}}"}, "timeout": "{{timeout}}"}
+
+    # A placeholder in a bare value can't be kept
+    assert HttpRequest.read_request_table(Template('[request]\ntimeout = 1{{ms}}\nsession = true\n')) == \
+        {"timeout": 10, "session": True}
+    with pytest.raises(ValueError):
+        HttpRequest.read_request_table(Template('[request]\ntags = ["a", \n'))
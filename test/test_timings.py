@@ -0,0 +1,29 @@
+import csv
+
+from pyapitester.timings import Timings, TimingsExport
+
+
+def test_timings():
+    timings = {}
+    Timings.start(timings)
+    Timings.add("ttfb", 0.002)
+    Timings.add("ttfb", 0.001)
+    Timings.stop()
+    # Nothing is recorded without a timeline
+    Timings.add("ttfb", 1.0)
+    assert round(timings["ttfb"], 6) == 3.0
+
+
+def test_timings_export(tmp_path):
+    filename = str(tmp_path / "timings.csv")
+    export = TimingsExport(filename)
+    export.write("folder/request.toml", True, "200", {"prepare": 0.5, "total": 2.25})
+    export.close()
+
+    with open(filename, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]["path"] == "folder/request.toml"
+    assert rows[0]["result"] == "passed"
+    assert rows[0]["prepare"] == "0.500"
+    assert rows[0]["dns"] == ""
+    assert rows[0]["total"] == "2.250"
@@ -0,0 +1,139 @@
+import logging
+import socket
+
+import pytest
+
+from httpbin_stub import HttpbinStub
+from pyapitester.helpers import AppLogger, AppState, Environment
+from pyapitester.httprequest import HttpRequest
+from pyapitester.runner import Runner
+from pyapitester.transport import ConnectTimeout, DnsCache, Transport, TransportConnectionError
+
+
+@pytest.mark.parametrize("transport", Transport.NAMES)
+def test_transport(run_request, transport):
+    runner = Runner(Environment(None), transport=transport)
+    try:
+        with HttpbinStub() as stub:
+            res = run_request("post.toml", f"{stub.Url}post", "[body]\ntype = 'text'\ntext = 'Grüße'\nchunked = true",
+                              "POST", runner)
+            assert res.Status == 200 and res.Json["data"] == "Grüße"
+            assert res.Headers["Content-Type"] == "application/json" and res.Size == len(res.Content)
+
+            res = run_request("redirect.toml", f"{stub.Url}redirect/3", runner=runner)
+            assert res.Status == 200 and res.Json["url"] == "/get"
+
+            res = run_request("limit.toml", f"{stub.Url}redirect/3", "max_redirects = 2", runner=runner)
+            assert res.Exception == "TooManyRedirects"
+
+            res = run_request("cookies.toml", f"{stub.Url}cookies/set?token=abc", runner=runner)
+            assert res.Json == {"cookies": {"token": "abc"}}
+
+            res = run_request("digest.toml", f"{stub.Url}digest-auth/auth/user/pass",
+                              "[auth]\ndigest.username = 'user'\ndigest.password = 'pass'", runner=runner)
+            assert res.Status == 200
+
+        # Kept-alive connections outlive the server
+        runner.transport.close()
+        res = run_request("refused.toml", f"{stub.Url}get", runner=runner)
+        assert res.Exception == "ConnectionError"
+    finally:
+        runner.transport.close()
+
+
+def test_exception_name():
+    from pyapitester import cassette, transport_httpclient
+    # The builtin ConnectionError is not shadowed, the result name is the same as in requests
+    assert "ConnectionError" not in vars(transport_httpclient) and "ConnectionError" not in vars(cassette)
+    assert Transport.exception_name(TransportConnectionError()) == "ConnectionError"
+    assert Transport.exception_name(ConnectTimeout()) == "ConnectTimeout"
+    assert cassette.ReplayTransport.EXCEPTIONS["ConnectionError"] is TransportConnectionError
+
+
+@pytest.mark.parametrize("transport", Transport.NAMES)
+def test_warmup(write_request, transport):
+    DnsCache.clear()
+    runner = Runner(Environment(None), transport=transport)
+    try:
+        with HttpbinStub() as stub:
+            runner.add_request(HttpRequest(write_request("get.toml", f"{stub.Url}get")))
+            opened = AppState.ConnectionsOpened
+            runner.warmup(connections=2)
+            assert AppState.ConnectionsOpened == opened + 2
+            assert DnsCache.get("127.0.0.1", int(stub.Url.rstrip("/").rsplit(":", 1)[1])) == ["127.0.0.1"]
+
+            # Warm connections are reused, nothing new is opened
+            runner.warmup(connections=2)
+            runner.run_request(runner.requests[0], {})
+            assert AppState.ConnectionsOpened == opened + 2
+    finally:
+        runner.transport.close()
+        DnsCache.clear()
+
+
+def test_connect_fallback(monkeypatch):
+    from pyapitester.transport_httpclient import _connect
+    create_connection = socket.create_connection
+
+    def connect(address, timeout=None):
+        if address[0] != "127.0.0.1":
+            raise socket.timeout("timed out")
+        return create_connection(address, timeout)
+
+    monkeypatch.setattr(socket, "create_connection", connect)
+    try:
+        with HttpbinStub() as stub:
+            port = int(stub.Url.rstrip("/").rsplit(":", 1)[1])
+            # A timed out address is skipped, the next one is tried
+            DnsCache.put("fallback.test", port, ["192.0.2.1", "127.0.0.1"])
+            _connect("fallback.test", port, 1).close()
+            DnsCache.put("fallback.test", port, ["192.0.2.1", "192.0.2.2"])
+            with pytest.raises(ConnectTimeout):
+                _connect("fallback.test", port, 1)
+    finally:
+        DnsCache.clear()
+
+
+@pytest.mark.parametrize("transport", Transport.NAMES)
+def test_session_closed_on_failure(run_request, transport):
+    runner = Runner(Environment(None), transport=transport)
+    closed = []
+    create = runner.transport.session
+
+    def session():
+        rq = create()
+        close = rq.close
+
+        def tracked_close():
+            closed.append(rq)
+            close()
+
+        rq.close = tracked_close
+        return rq
+
+    runner.transport.session = session
+    try:
+        with HttpbinStub() as stub:
+            url = stub.Url
+        res = run_request("refused.toml", f"{url}get", runner=runner)
+        assert res.Exception == "ConnectionError" and len(closed) == 1
+    finally:
+        runner.transport.close()
+
+
+@pytest.mark.parametrize("transport", Transport.NAMES)
+def test_connection_pool(run_request, transport, caplog):
+    runner = Runner(Environment(None), transport=transport)
+    try:
+        with HttpbinStub() as stub:
+            AppState.reset()
+            # Requests without a session still share the pooled connection
+            for name in ("first.toml", "second.toml"):
+                assert run_request(name, f"{stub.Url}get", runner=runner).Status == 200
+        assert AppState.ConnectionRequests == 2 and AppState.ConnectionsOpened == 1
+    finally:
+        runner.transport.close()
+
+    with caplog.at_level(logging.INFO):
+        AppLogger.log_summary()
+    assert "Connections: 2 requests, reused: 1, opened: 1, TLS handshakes: 0" in caplog.text
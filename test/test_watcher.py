@@ -0,0 +1,34 @@
+import os
+
+from httpbin_stub import HttpbinStub
+from pyapitester.helpers import AppState, Environment
+from pyapitester.runner import Runner
+from pyapitester.watcher import Watcher
+
+
+def test_watcher(tmp_path, write, write_request):
+    root = str(tmp_path)
+    with HttpbinStub() as stub:
+        url = f"{stub.Url}get"
+        write_request(os.path.join(root, "a", "00.toml"), url)
+        write_request(os.path.join(root, "a", "01.toml"), url)
+        write_request(os.path.join(root, "b", "00.toml"), url, "session = true")
+        write_request(os.path.join(root, "b", "01.toml"), url)
+
+        watcher = Watcher(Runner(Environment(None, root=root)), root, root=root)
+        assert watcher.iterate() == 4
+        assert watcher.iterate() == 0
+
+        # Only the changed request is executed again
+        os.utime(os.path.join(root, "a", "01.toml"), ns=(0, 0))
+        assert watcher.iterate() == 1
+        assert AppState.RequestsTotal == 1
+
+        # Session chains are executed as a whole
+        write_request(os.path.join(root, "b", "01.toml"), url, "# Changed")
+        assert watcher.iterate() == 2
+
+        # Folder variables may be used by any request
+        write(os.path.join(root, "a", "env.toml"), "[vars]\nid = 1\n")
+        assert watcher.iterate() == 4
+        watcher.runner.transport.close()